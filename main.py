@@ -1,169 +1,544 @@
 import argparse
+import asyncio
 import pandas as pd
+import signal
 import time
 import tqdm
 
 from datetime import datetime
-from src.analysis import GPT
-from src.scrapping import IMDb
-from src.utils.db import PostgreSQLDatabase
+from src.analysis import AsyncGPT
+from src.scrapping import IMDb, IMDbHTTP, ReviewPageFetcher
+from src.utils.archive import PageArchive
+from src.utils.browser import get_browser_pool
+from src.utils.checkpoint import Checkpoint
+from src.utils.db import PostgreSQLDatabase, pool_metrics
+from src.utils.jobs import (JOB_BACKOFF, JOB_FAILED_DELAY, JOB_LEASE, JOB_MAX_ATTEMPTS, JOB_MAX_BACKOFF, JOB_SKIP_DELAY,
+                            Heartbeat, LeaseLost, worker_name)
 from src.utils.logger import setup_logging, get_backend_logger
+from src.utils.ratelimit import CircuitOpenError, get_imdb_throttle
+from src.utils.schedule import RECENT_WINDOW, deep_sweep_interval, estimate_rate, next_interval
 
-
-setup_logging()
 logger = get_backend_logger()
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--movie_id", required=True, type=str)
-args = parser.parse_args()
-movie_id = args.movie_id
-
-start_time = time.time()
-
-
-##################################
-###          SCRAPPING         ###
-##################################
-
-logger.info(f"{movie_id} - Beginning scraping")
-
-###   Scrap movie metadata   ###
-
-movie_scrap_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-with IMDb() as scrapper:
-    movie_title, release_date = scrapper.get_movie(movie_id)
-    total_reviews = scrapper.get_number_of_reviews(movie_id)
-
-# Update table (data must be passed as a list of tuples)
-with PostgreSQLDatabase() as db:
-    last_scrapping = db.query_data("movies", condition=f"movie_id = '{(movie_id)}'", movie_id=movie_id)[0][4]
-movie_data = [(movie_id, movie_title, release_date, total_reviews, movie_scrap_time)]
-
-if last_scrapping is None:
-    new_movie = 1
-    with PostgreSQLDatabase() as db:
-        db.remove_data("movies", "movie_id", movie_id, movie_id)
-        db.insert_data("movies", movie_data, movie_id)
-    prompt = "without" if total_reviews == 0 else "with"
-    logger.info(f"{movie_id} - New movie {prompt} reviews to scrap!")
-else:
-    new_movie = 0
-    with PostgreSQLDatabase() as db:
-        db.upsert_movie_data(movie_data, movie_id)
-    
-    # Check if new reviews have been published or if the last scrapping is >24h old
-    with PostgreSQLDatabase() as db:
-        movie_row = db.query_data("movies", condition=f"movie_id = '{movie_id}'", movie_id=movie_id)[0]
-    declared_reviews = int(movie_row[3]) if movie_row[3] is not None else 0
-    new_reviews = total_reviews - declared_reviews
-
-    last_scrapping = movie_row[4]
-    time_since_scrapping = (datetime.now() - last_scrapping).seconds
+DEEP_SWEEP_INTERVAL = 86400  # Maximum time between two full scrapes of a movie not scheduled yet, in seconds
+STREAMING_THRESHOLD = 5000  # Number of reviews above which full scrapes are harvested by batches
+CHECKPOINT_EVERY = 10  # Number of review pages loaded with the browser between two checkpoints
+MAX_RECONCILE_ATTEMPTS = 3  # Number of attempts at finding missing reviews before accepting the gap
+SENTIMENT_BATCH = 50  # Number of reviews claimed, sent to the API concurrently and saved together for sentiment analysis
+REVIEW_LEASE = 600  # Duration of the claim of a worker on a batch of reviews, in seconds
+
+
+def unresolved_reviews(reviews_df):
+    """
+    Return the mask of the reviews still missing their text or their exact votes
+    """
+    missing_text = pd.isnull(reviews_df["text"]) | (reviews_df["text"].str.strip() == "")
+    rounded_votes = reviews_df['upvotes'].astype(str).str.endswith('K') | reviews_df['downvotes'].astype(str).str.endswith('K')
+    return missing_text | rounded_votes
+
+
+def fetch_review_pages(reviews_df, movie_id, archive=None, checkpoint=None, state=None):
+    """
+    Fill in place the text hidden behind spoilers and the exact votes rounded over 999, from the individual review pages
+
+    :param archive: Optional PageArchive in which the review pages are stored
+    :param checkpoint: Optional Checkpoint in which the progress is saved, with the given state
+    """
+    # Fetch individual review pages concurrently, once per review, for spoilers and rounded votes
+    missing_text = pd.isnull(reviews_df["text"]) | (reviews_df["text"].str.strip() == "")
+    rounded_votes = reviews_df['upvotes'].astype(str).str.endswith('K') | reviews_df['downvotes'].astype(str).str.endswith('K')
+    logger.info(f"{movie_id} - Missing text for {missing_text.sum()} reviews, rounded votes for {rounded_votes.sum()} reviews")
+
+    to_resolve = reviews_df[missing_text | rounded_votes]
+    if len(to_resolve) > 0:
+        with ReviewPageFetcher(archive=archive) as fetcher:
+            review_pages = fetcher.fetch(to_resolve["review_id"], movie_id)
+        for index, row in to_resolve.iterrows():
+            review_page = review_pages.get(row["review_id"])
+            if review_page is None:
+                continue
+            text, exact_upvotes, exact_downvotes = review_page
+            if missing_text[index] and text:
+                reviews_df.at[index, "text"] = text
+            if rounded_votes[index] and exact_upvotes is not None:
+                reviews_df.loc[index, 'upvotes'] = exact_upvotes
+                reviews_df.loc[index, 'downvotes'] = exact_downvotes
+        if checkpoint:
+            checkpoint.save(state, reviews_df)
+
+
+def browse_review_pages(reviews_df, scrapper, movie_id, checkpoint=None, state=None):
+    """
+    Fill in place the text and the exact votes the review pages could not give, with the browser
+
+    The browser is taken away from the page it displays: it must not be harvesting the reviews page.
+
+    :param checkpoint: Optional Checkpoint in which the progress is saved, with the given state
+    """
+    # Fall back to the browser for the text hidden behind spoiler markup
+    empty_reviews = reviews_df[pd.isnull(reviews_df["text"]) | (reviews_df["text"].str.strip() == "")]
+
+    if len(empty_reviews) > 0:
+        logger.info(f"{movie_id} - Missing text for {len(empty_reviews)} reviews")
+        logger.info(f"{movie_id} - Getting text behind spoiler markups with the browser")
+
+        for i, (index, row) in enumerate(tqdm.tqdm(empty_reviews.iterrows(), total=len(empty_reviews), desc=f"{movie_id} - Processing empty reviews", miniters=10)):
+            review_id = row["review_id"]
+            spoiler_text = scrapper.get_spoiler(review_id, movie_id)  # Call the function to get the spoiler
+            reviews_df.at[index, "text"] = spoiler_text               # Replace 'text' with the spoiler
+            if checkpoint and (i + 1) % CHECKPOINT_EVERY == 0:
+                checkpoint.save(state, reviews_df)
+
+    # Check again for empty reviews
+    empty_reviews = reviews_df[reviews_df["text"].isna() | reviews_df["text"].str.strip().eq("") |
+                               reviews_df["title"].isna() | reviews_df["title"].str.strip().eq("")].shape[0]
+
+    if empty_reviews > 0:
+        logger.warning(f"{movie_id} - Still missing text or title for {empty_reviews} reviews")
+    else:
+        logger.info(f"{movie_id} - No reviews with missing text or title")
 
-    prompt = "No review" if new_reviews == 0 else f"{new_reviews} new reviews"
-    logger.info(f"{movie_id} - {prompt} published in the last {(time_since_scrapping / 3600):.2F} hours")
+    # Fall back to the browser for exact vote counts for values >999
+    mask = reviews_df['upvotes'].astype(str).str.endswith('K') | reviews_df['downvotes'].astype(str).str.endswith('K')
+    logger.info(f"{movie_id} - Found {len(reviews_df[mask])} reviews with rounded votes")
 
-    # Check if already published reviews have not been scrapped during the previous runs
-    with PostgreSQLDatabase() as db:
-        old_total_reviews = len(db.query_data("reviews_raw", condition=f"movie_id = '{(movie_id)}'", movie_id=movie_id))
-    old_total_reviews = int(old_total_reviews) if old_total_reviews is not None else 0
-    logger.info(f"{movie_id} - {old_total_reviews} reviews already scrapped")
+    for i, (index, row) in enumerate(reviews_df[mask].iterrows()):
+        review_id = row['review_id']
+        exact_upvotes, exact_downvotes = scrapper.get_votes(review_id, movie_id)
+        reviews_df.loc[index, 'upvotes'] = exact_upvotes
+        reviews_df.loc[index, 'downvotes'] = exact_downvotes
+        if checkpoint and (i + 1) % CHECKPOINT_EVERY == 0:
+            checkpoint.save(state, reviews_df)
 
-    reviews_to_scrap = total_reviews - old_total_reviews
-    if reviews_to_scrap == 0:
-        logger.info(f"{movie_id} - No additional review to scrap")
-    else:
-        logger.info(f"{movie_id} - {reviews_to_scrap} reviews to scrap")
+    reviews_df['upvotes'] = reviews_df['upvotes'].astype(int)
+    reviews_df['downvotes'] = reviews_df['downvotes'].astype(int)
 
-###   Scrap reviews   ###
 
-if new_movie == 1 or reviews_to_scrap > 0 or time_since_scrapping > 86400:
-    with IMDb() as scrapper:
-        reviews_df = scrapper.get_reviews(movie_id, total_reviews)
+def complete_reviews(reviews_df, scrapper, movie_id, checkpoint=None, state=None):
+    """
+    Fill in place the text hidden behind spoilers and the exact votes rounded over 999
 
-        # Get the text hidden behind spoiler markup
-        empty_reviews = reviews_df[pd.isnull(reviews_df["text"]) | (reviews_df["text"].str.strip() == "")]
+    :param checkpoint: Optional Checkpoint in which the progress is saved, with the given state
+    """
+    fetch_review_pages(reviews_df, movie_id, scrapper.archive, checkpoint, state)
+    browse_review_pages(reviews_df, scrapper, movie_id, checkpoint, state)
 
-        if len(empty_reviews) > 0:
-            logger.info(f"{movie_id} - Missing text for {len(empty_reviews)} reviews")
-            logger.info(f"{movie_id} - Getting text behind spoiler markups")
 
-            for index, row in tqdm.tqdm(empty_reviews.iterrows(), total=len(empty_reviews), desc=f"{movie_id} - Processing empty reviews", miniters=10):
-                review_id = row["review_id"]
-                spoiler_text = scrapper.get_spoiler(review_id, movie_id)  # Call the function to get the spoiler
-                reviews_df.at[index, "text"] = spoiler_text               # Replace 'text' with the spoiler
+def set_aside_unresolved(reviews_df, movie_id, archive=None):
+    """
+    Complete reviews from their review pages, setting aside those left for the browser
 
-        # Check again for empty reviews
-        empty_reviews = reviews_df[reviews_df["text"].isna() | reviews_df["text"].str.strip().eq("") |
-                                   reviews_df["title"].isna() | reviews_df["title"].str.strip().eq("")].shape[0]
+    Reviews are completed with the browser only once it no longer harvests the reviews page, as loading a review page
+    would end the harvest.
 
-        if empty_reviews > 0:
-            logger.warning(f"{movie_id} - Still missing text or title for {empty_reviews} reviews")
-        else:
-            logger.info(f"{movie_id} - No reviews with missing text or title")
+    :param archive: Optional PageArchive in which the review pages are stored
+    :return: Tuple (completed_df, unresolved_df), the votes of completed_df being exact
+    """
+    fetch_review_pages(reviews_df, movie_id, archive)
+    unresolved = unresolved_reviews(reviews_df)
+    completed_df = reviews_df[~unresolved].reset_index(drop=True)
+    completed_df['upvotes'] = completed_df['upvotes'].astype(int)
+    completed_df['downvotes'] = completed_df['downvotes'].astype(int)
+    return completed_df, reviews_df[unresolved].reset_index(drop=True)
 
-        # Get exact vote counts for values >999
-        logger.info(f"{movie_id} - Updating votes")
-        mask = reviews_df['upvotes'].astype(str).str.endswith('K') | reviews_df['downvotes'].astype(str).str.endswith('K')
-        logger.info(f"{movie_id} - Found {len(reviews_df[mask])} reviews with rounded votes")
 
-        for index, row in reviews_df[mask].iterrows():
-            review_id = row['review_id']
-            exact_upvotes, exact_downvotes = scrapper.get_votes(review_id, movie_id)
-            reviews_df.loc[index, 'upvotes'] = exact_upvotes
-            reviews_df.loc[index, 'downvotes'] = exact_downvotes
+def save_reviews(reviews_df, movie_id, db):
+    """
+    Upsert reviews, flagging them for sentiment analysis
 
-        reviews_df['upvotes'] = reviews_df['upvotes'].astype(int)
-        reviews_df['downvotes'] = reviews_df['downvotes'].astype(int)
+    :return: Tuple (inserted, updated, unchanged), or None if the upsert failed
+    """
+    if len(reviews_df) == 0:
+        return 0, 0, 0
 
-    # Update table
     # Create a variable to identify reviews needing sentiment analysis
     reviews_df['to_process'] = 1
 
-    # Convert data to a list of tuples
-    reviews_list = reviews_df.apply(lambda row: (
-        str(row['movie_id']), str(row['review_id']),
-        str(row['author']), str(row['title']),
-        str(row['text']), row['rating'],
-        str(row['date']), row['upvotes'],
-        row['downvotes'], row['last_update'], row['to_process']
-    ), axis=1).tolist()
-
-    # Replace NaN with None to avoid errors with postgreSQL
-    reviews_list = [tuple(None if pd.isna(x) else x for x in row) for row in reviews_list]
-
-    # Upserting
-    with PostgreSQLDatabase() as db:
-        db.upsert_review_data(reviews_list, movie_id)
+    # Stream reviews to the database and merge them in a single statement
+    return db.bulk_upsert_reviews(reviews_df, movie_id)
+
+
+def reconcile_reviews(movie_id, db, total_reviews, review_gap, deep_sweep, browsers=None, archive=None):
+    """
+    Look for the reviews counted by IMDb but not stored, and record those still missing as a gap
+
+    The reviews missing after MAX_RECONCILE_ATTEMPTS runs are accepted as a known gap, which is no longer looked for.
+
+    :param total_reviews: Number of reviews declared by IMDb
+    :param review_gap: Gap recorded before the run, as returned by get_review_gap
+    :param deep_sweep: Whether all the reviews were just listed, in which case they are not listed again
+    :param browsers: BrowserPool of the run
+    """
+    stored_ids = set(review[0] for review in db.query_data("reviews_raw", columns=["review_id"], condition=f"movie_id = '{(movie_id)}'", movie_id=movie_id))
+    missing = total_reviews - len(stored_ids)
+    attempts, known_gap = (review_gap[1], review_gap[2]) if review_gap else (0, 0)
+
+    if missing > known_gap:
+        logger.info(f"{movie_id} - {missing} reviews counted by IMDb are not stored")
+
+        # Incremental scrapes stop at the first known review: list all of them to find older ones, keeping only those missing
+        if not deep_sweep:
+            with IMDb(pool=browsers, archive=archive) as scrapper:
+                unresolved = []
+                for reviews_df in scrapper.iter_reviews(movie_id, total_reviews):
+                    reviews_df = reviews_df[~reviews_df["review_id"].isin(stored_ids)].reset_index(drop=True)
+                    if len(reviews_df) > 0:
+                        logger.info(f"{movie_id} - Found {len(reviews_df)} missing reviews")
+                        completed_df, unresolved_df = set_aside_unresolved(reviews_df, movie_id, archive)
+                        save_reviews(completed_df, movie_id, db)
+                        if len(unresolved_df) > 0:
+                            unresolved.append(unresolved_df)
+
+                # The browser completes the reviews set aside only once the whole reviews page is harvested
+                if unresolved:
+                    unresolved_df = pd.concat(unresolved, ignore_index=True)
+                    browse_review_pages(unresolved_df, scrapper, movie_id)
+                    save_reviews(unresolved_df, movie_id, db)
+            stored_ids = set(review[0] for review in db.query_data("reviews_raw", columns=["review_id"], condition=f"movie_id = '{(movie_id)}'", movie_id=movie_id))
+            missing = total_reviews - len(stored_ids)
+
+        # Stop looking for the reviews that could not be found after several attempts
+        attempts += 1
+        if missing > known_gap and attempts >= MAX_RECONCILE_ATTEMPTS:
+            logger.warning(f"{movie_id} - Recording {missing} reviews counted by IMDb as missing after {attempts} attempts")
+            known_gap, attempts = missing, 0
+        elif missing <= known_gap:
+            attempts = 0
+        db.record_review_gap(movie_id, missing, attempts, known_gap)
+
+    elif review_gap and missing < known_gap:
+        # Reviews found since, or removed from the count of IMDb
+        db.record_review_gap(movie_id, max(missing, 0), 0, max(missing, 0))
+
+
+def stream_reviews(scrapper, movie_id, total_reviews, db, checkpoint, state, unresolved_df=None, heartbeat=None):
+    """
+    Harvest and save all the reviews batch by batch, from the position of the state
+
+    The reviews left for the browser are set aside, and completed once the whole reviews page is harvested.
+
+    :param checkpoint: Checkpoint in which the position and the reviews set aside are saved after each batch
+    :param state: State of the streaming scrape, with its position in "cursor"
+    :param unresolved_df: Reviews set aside by the interrupted run resumed, if any
+    :param heartbeat: Optional Heartbeat of the job of the movie, checked after each batch
+    """
+    unresolved = [unresolved_df] if unresolved_df is not None else []
+    for reviews_df in scrapper.iter_reviews(movie_id, total_reviews, skip=state["cursor"]):
+        completed_df, unresolved_batch_df = set_aside_unresolved(reviews_df, movie_id, scrapper.archive)
+        save_reviews(completed_df, movie_id, db)
+        if len(unresolved_batch_df) > 0:
+            unresolved.append(unresolved_batch_df)
+        state["cursor"] += len(reviews_df)
+        checkpoint.save(state, pd.concat(unresolved, ignore_index=True) if unresolved else None)
+        if heartbeat:
+            heartbeat.check()
+
+    if unresolved:
+        unresolved_df = pd.concat(unresolved, ignore_index=True)
+        logger.info(f"{movie_id} - Completing {len(unresolved_df)} reviews set aside during the harvest")
+        browse_review_pages(unresolved_df, scrapper, movie_id, checkpoint, state)
+        save_reviews(unresolved_df, movie_id, db)
+
+
+class TimeBudgetExceeded(Exception):
+    """Raised when the pipeline of a movie takes longer than its time budget."""
+
+
+def _time_budget_exceeded(signum, frame):
+    raise TimeBudgetExceeded()
+
+
+def scrape_movie(movie_id, db, force_deep_sweep=False, archive=None, heartbeat=None):
+    """
+    Scrape the metadata and the new or edited reviews of a movie
+
+    :param db: PostgreSQLDatabase session of the run
+    :param force_deep_sweep: Reload all reviews to catch edits, even if the last full scrape is recent
+    :param archive: Optional PageArchive in which the pages scraped are stored
+    :param heartbeat: Optional Heartbeat of the job of the movie, checked between stages to abort once its lease is lost
+    """
+    browsers = get_browser_pool()  # Browsers stay warm between the movies processed by the same worker
+
+    logger.info(f"{movie_id} - Beginning scraping")
+
+    # Scrap movie metadata
+    movie_scrap_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with IMDbHTTP(archive=archive) as fetcher:
+        movie = fetcher.get_movie(movie_id)
+        total_reviews = fetcher.get_number_of_reviews(movie_id)
+
+    # Fall back to the browser only if the server-rendered pages could not be parsed
+    if movie is None or total_reviews is None:
+        logger.info(f"{movie_id} - Falling back to the browser for metadata")
+        with IMDb(pool=browsers, archive=archive) as scrapper:
+            if movie is None:
+                movie = scrapper.get_movie(movie_id)
+            if total_reviews is None:
+                total_reviews = scrapper.get_number_of_reviews(movie_id)
+    movie_title, release_date = movie
+
+    # Update table (data must be passed as a list of tuples)
+    movie_row = db.query_data("movies", condition=f"movie_id = '{(movie_id)}'", movie_id=movie_id)[0]
+    last_scrapping = movie_row[4]
+    movie_data = [(movie_id, movie_title, release_date, total_reviews, movie_scrap_time)]
+
+    if last_scrapping is None:
+        new_movie = 1
+        last_full_scrape = None
+        review_gap = None
+        with db.transaction():
+            db.remove_data("movies", "movie_id", movie_id, movie_id)
+            db.insert_data("movies", movie_data, movie_id)
+        prompt = "without" if total_reviews == 0 else "with"
+        logger.info(f"{movie_id} - New movie {prompt} reviews to scrap!")
+    else:
+        new_movie = 0
+        db.upsert_movie_data(movie_data, movie_id)
 
-logger.info(f"{movie_id} - Finished scrapping")
+        # Check if new reviews have been published or if the last scrapping is >24h old, from the row read before the upsert
+        declared_reviews = int(movie_row[3]) if movie_row[3] is not None else 0
+        new_reviews = total_reviews - declared_reviews
+
+        last_scrapping = movie_row[4]
+        last_full_scrape = movie_row[5]
+        time_since_scrapping = (datetime.now() - last_scrapping).total_seconds()
+
+        prompt = "No review" if new_reviews == 0 else f"{new_reviews} new reviews"
+        logger.info(f"{movie_id} - {prompt} published in the last {(time_since_scrapping / 3600):.2F} hours")
+
+        # Check if already published reviews have not been scrapped during the previous runs
+        known_reviews = db.query_data("reviews_raw", columns=["review_id", "date"], condition=f"movie_id = '{(movie_id)}'", movie_id=movie_id)
+        known_ids = set(review[0] for review in known_reviews)
+        newest_review = max((review[1] for review in known_reviews if review[1] is not None), default=None)
+        old_total_reviews = len(known_reviews)
+        logger.info(f"{movie_id} - {old_total_reviews} reviews already scrapped")
+
+        # Ignore the reviews counted by IMDb but found missing after several attempts
+        review_gap = db.get_review_gap(movie_id)
+        known_gap = review_gap[2] if review_gap else 0
+        if known_gap > 0:
+            logger.info(f"{movie_id} - {known_gap} reviews counted by IMDb are known to be missing")
+
+        reviews_to_scrap = total_reviews - old_total_reviews - known_gap
+        if reviews_to_scrap == 0:
+            logger.info(f"{movie_id} - No additional review to scrap")
+        else:
+            logger.info(f"{movie_id} - {reviews_to_scrap} reviews to scrap")
+
+    # Reload all reviews periodically to catch edits, otherwise only the new ones; movies scraped less often are swept less often
+    schedule = db.get_schedule(movie_id)
+    sweep_interval = deep_sweep_interval(schedule[1]) if schedule and schedule[1] else DEEP_SWEEP_INTERVAL
+    deep_sweep = (new_movie == 1 or force_deep_sweep or last_full_scrape is None
+                  or (datetime.now() - last_full_scrape).total_seconds() > sweep_interval)
+
+    # Resume the scrape interrupted during a previous run, if any
+    checkpoint = Checkpoint(movie_id)
+    state, reviews_df = checkpoint.load(max_age=sweep_interval)
+    if state is not None:
+        deep_sweep, streaming = state["deep_sweep"], state["streaming"]
+        logger.info(f"{movie_id} - Resuming interrupted scrape from checkpoint")
+    else:
+        streaming = deep_sweep and total_reviews > STREAMING_THRESHOLD
+
+    if heartbeat:
+        heartbeat.check()
+    if state is not None or deep_sweep or reviews_to_scrap > 0:
+        with IMDb(pool=browsers, archive=archive) as scrapper:
+            if streaming:
+                # Harvest and save reviews batch by batch, to keep the browser memory constant
+                logger.info(f"{movie_id} - Deep sweep of all reviews, in streaming mode")
+                state = state or {"deep_sweep": True, "streaming": True, "cursor": 0}
+                stream_reviews(scrapper, movie_id, total_reviews, db, checkpoint, state, reviews_df, heartbeat)
+            else:
+                if reviews_df is not None:
+                    logger.info(f"{movie_id} - {len(reviews_df)} reviews loaded from checkpoint")
+                elif deep_sweep:
+                    logger.info(f"{movie_id} - Deep sweep of all reviews")
+                    reviews_df = scrapper.get_reviews(movie_id, total_reviews)
+                else:
+                    reviews_df = scrapper.get_reviews(movie_id, total_reviews, known_ids=known_ids, since=newest_review)
+                state = {"deep_sweep": deep_sweep, "streaming": False}
+                checkpoint.save(state, reviews_df)
+
+                complete_reviews(reviews_df, scrapper, movie_id, checkpoint, state)
+                save_reviews(reviews_df, movie_id, db)
+
+        if deep_sweep:
+            db.update_full_scrape(movie_id, datetime.now())
+        checkpoint.clear()
+
+    # Reconcile missing reviews
+    if heartbeat:
+        heartbeat.check()
+    reconcile_reviews(movie_id, db, total_reviews, review_gap, deep_sweep, browsers, archive)
+
+    # Schedule the next scrape from the arrival rate of the reviews
+    recent_reviews = db.count_recent_reviews(movie_id, RECENT_WINDOW)
+    if schedule and schedule[2] is not None and schedule[3] is not None:
+        reviews_per_day = estimate_rate(recent_reviews, schedule[0], total_reviews - schedule[2],
+                                        (datetime.now() - schedule[3]).total_seconds())
+    else:
+        reviews_per_day = estimate_rate(recent_reviews)
+    interval = next_interval(reviews_per_day, priority=bool(schedule and schedule[4]))
+    db.update_schedule(movie_id, reviews_per_day, interval, total_reviews)
+
+    logger.info(f"{movie_id} - Finished scrapping")
+
+
+def analyze_reviews(movie_id, db, worker=None):
+    """
+    Analyze the sentiment of the reviews flagged as new or edited for a movie
+
+    Reviews are claimed by batches, so that several workers can share the backlog without analyzing
+    a review twice, and the reviews of each batch are sent to the API concurrently; the reviews whose
+    analysis failed are claimed again once their lease expires.
+
+    :param db: PostgreSQLDatabase session of the run
+    :param worker: Identifier of the worker claiming the reviews, by default the current process
+    """
+    worker = worker or worker_name()
+    reviews = db.claim_reviews(worker, SENTIMENT_BATCH, REVIEW_LEASE, movie_id)
+    if not reviews:
+        logger.info(f"{movie_id} - No new reviews to analyze")
+        return
+
+    logger.info(f"{movie_id} - Analyzing new reviews, starting API calls...")
+    analyzed = asyncio.run(_analyze_claimed_reviews(movie_id, db, worker, reviews))
+    logger.info(f"{movie_id} - {analyzed} reviews analyzed")
+
+
+async def _analyze_claimed_reviews(movie_id, db, worker, reviews):
+    analyzed = 0
+    async with AsyncGPT() as analyzer:
+        while reviews:
+            results = await analyzer.analyze(reviews, movie_id)
+            data, text_hashes = [], []
+            for review, GPT_results in zip(reviews, results):
+                if GPT_results is not None:
+                    data.append((review[1], review[2], *GPT_results))
+                    text_hashes.append(review[11])
+
+            # Stop if the whole batch failed, e.g. the API is unavailable; the reviews are released when their lease expires
+            if not data:
+                logger.warning(f"{movie_id} - Analysis failed for a whole batch of {len(reviews)} reviews, stopping")
+                break
+
+            # Save the results of each batch in a single transaction; reviews edited meanwhile stay flagged, to be analyzed again.
+            # If it is rolled back, the analysis stops there, and the reviews are claimed again when their lease expires.
+            with db.transaction():
+                db.update_sentiment_data(data, movie_id)
+                db.complete_reviews(worker, [row[1] for row in data], text_hashes, movie_id)
+            analyzed += len(data)
+            logger.debug(f"{movie_id} - {analyzed} reviews analyzed")
 
+            reviews = db.claim_reviews(worker, SENTIMENT_BATCH, REVIEW_LEASE, movie_id)
+    return analyzed
 
-##################################
-###     SENTIMENT ANALYSIS     ###
-##################################
 
-with PostgreSQLDatabase() as db:
-    reviews_to_process = db.query_data('reviews_raw', condition=f"to_process = 1", movie_id=movie_id)
+def analyze_movie(movie_id):
+    """
+    Sentiment stage, run independently from scraping by the sentiment workers: analyze the reviews flagged for a movie
+    """
+    with PostgreSQLDatabase() as db:
+        analyze_reviews(movie_id, db)
+
+
+def process_movie(movie_id, force_deep_sweep=False, archive=None, time_budget=None, analyze=True, heartbeat=None):
+    """
+    Run the pipeline for a movie: scraping, then sentiment analysis
+
+    :param time_budget: Duration in seconds after which the pipeline is interrupted with TimeBudgetExceeded
+                        (relies on SIGALRM, so only in the main thread of a process)
+    :param analyze: Run the sentiment analysis after scraping; the scheduler leaves it to the sentiment workers
+    :param heartbeat: Optional Heartbeat of the job of the movie, aborting the run with LeaseLost once its lease is lost
+    :return: False if the run was skipped, because IMDb is refusing requests or the movie is being processed elsewhere
+    """
+    start_time = time.time()
+
+    # Skip the run while IMDb is refusing requests, instead of piling up failures
+    if get_imdb_throttle().is_open():
+        logger.warning(f"{movie_id} - Requests to IMDb are paused after repeated failures, skipping this run")
+        return False
+
+    if time_budget:
+        signal.signal(signal.SIGALRM, _time_budget_exceeded)
+        signal.alarm(time_budget)
+    try:
+        # A single database session for the whole run, holding the lock of the movie
+        with PostgreSQLDatabase() as db, db.advisory_lock(movie_id) as acquired:
+            if not acquired:
+                logger.warning(f"{movie_id} - Already being processed by another worker, skipping this run")
+                return False
+            scrape_movie(movie_id, db, force_deep_sweep, archive, heartbeat)
+            if analyze:
+                analyze_reviews(movie_id, db)
+    finally:
+        if time_budget:
+            signal.alarm(0)
+
+    logger.info(f"{movie_id} - Total execution time: {(time.time() - start_time)/60:.2f} minutes, {db.round_trips} database round trips")
+    metrics = pool_metrics()
+    if metrics is not None:
+        logger.debug(f"{movie_id} - Database pool: {metrics['checked_out']}/{metrics['size']} connections checked out, "
+                     f"{metrics['wait_seconds']:.2f}s waited over {metrics['checkouts']} checkouts (max {metrics['max_wait_seconds']:.2f}s)")
+    return True
+
+
+def run_job(movie_id, time_budget=None, worker=None):
+    """
+    Claim the job of a movie from the queue and scrape it, renewing the lease meanwhile;
+    a failed run is queued again with a backoff, a skipped run once the movie can be processed, without counting the attempt
+
+    :param worker: Identifier of the worker holding the lease, by default the current process
+    :return: False if the job was claimed by another worker
+    """
+    worker = worker or worker_name()
+    with PostgreSQLDatabase() as db:
+        attempt = db.claim_job(movie_id, worker, JOB_LEASE)
+    if attempt is None:
+        logger.info(f"{movie_id} - Job already claimed by another worker")
+        return False
 
-if len(reviews_to_process) == 0:
-    logger.info(f"{movie_id} - No new reviews to analyze")
+    def fail(error):
+        try:
+            with PostgreSQLDatabase() as db:
+                db.fail_job(movie_id, worker, error, JOB_BACKOFF, JOB_MAX_BACKOFF, JOB_MAX_ATTEMPTS, JOB_FAILED_DELAY)
+        except Exception as e:
+            # The job is claimed again once its lease expires
+            logger.error(f"{movie_id} - Failed recording job failure: {e}")
+
+    try:
+        with Heartbeat(movie_id, worker) as heartbeat:
+            completed = process_movie(movie_id, time_budget=time_budget, analyze=False, heartbeat=heartbeat)
+    except LeaseLost as e:
+        # The job belongs to the worker which reclaimed it, which records its outcome
+        logger.warning(f"{movie_id} - Run aborted: {e}")
+        return True
+    except CircuitOpenError as e:
+        # IMDb refused too many requests during the run, which resumes from its checkpoint once they are allowed again
+        logger.warning(f"{movie_id} - Run interrupted: {e}")
+        completed = False
+    except BaseException as e:
+        fail(f"{type(e).__name__}: {e}")
+        raise
+    with PostgreSQLDatabase() as db:
+        if completed:
+            db.complete_job(movie_id, worker)
+        else:
+            # Retry once IMDb accepts requests again, or shortly if the movie is locked by another worker
+            open_for = get_imdb_throttle().open_for()
+            reason = "IMDb requests paused" if open_for else "Movie locked by another worker"
+            db.requeue_job(movie_id, worker, open_for or JOB_SKIP_DELAY, f"Run skipped: {reason}")
+    return True
 
-else:
-    unirev = len(reviews_to_process)
-    prompt = "1 review" if unirev == 1 else f"{unirev} reviews"
-    logger.info(f"{movie_id} - {prompt} to analyze, starting API calls...")
 
-    analyzer = GPT()
-    for review in tqdm.tqdm(reviews_to_process, desc=f"{movie_id} - Analyzing reviews sentiment", unit="review", miniters=10):
-        review_id = review[1]
-        author = review[2]
-        GPT_results = analyzer.sentiment(review, movie_id)
-        if GPT_results is not None:
-            data = [(review_id, author, *GPT_results)]
-            with PostgreSQLDatabase() as db:
-                db.update_sentiment_data(data, movie_id)
-                db.reset_indicator(author, movie_id)
+if __name__ == "__main__":
+    setup_logging()
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movie_id", required=True, type=str)
+    parser.add_argument("--deep_sweep", action="store_true", help="Reload all reviews to catch edits, even if the last full scrape is recent")
+    parser.add_argument("--archive", action="store_true", help="Store the raw pages scraped in data/archive/, to parse them again offline")
+    args = parser.parse_args()
 
-logger.info(f"{movie_id} - Total execution time: {(time.time() - start_time)/60:.2f} minutes")
+    process_movie(args.movie_id, args.deep_sweep, PageArchive() if args.archive else None)
@@ -1,59 +1,137 @@
 import multiprocessing
+import os
 import subprocess
 import time
 import threading
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from src.utils.db import PostgreSQLDatabase
+from apscheduler.triggers.interval import IntervalTrigger
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from main import TimeBudgetExceeded, analyze_movie, run_job
+from src.backfill import BATCH_THRESHOLD, poll_batches, submit_backfill
+from src.utils.db import PostgreSQLDatabase, configure_pool
+from src.utils.dispatch import Dispatcher
+from src.utils.jobs import JOB_BACKOFF, JOB_FAILED_DELAY, JOB_MAX_ATTEMPTS, JOB_MAX_BACKOFF, worker_name
 from src.utils.logger import setup_logging, get_backend_logger
 
-setup_logging()
 logger = get_backend_logger()
-logger.info("Launching scheduler for movie processing and backups")
 
-max_concurrent_scripts = 5
-processing_lock = threading.Lock()
-active_processes = set()
-
-
-def run_movie_script(movie_id):
-    """Runs the main script for a single movie."""
-    with processing_lock:
-        if movie_id in active_processes:
-            logger.warning(f"Script already running for movie #{movie_id}. Skipping...")
-            return
-        active_processes.add(movie_id)
 
+def default_scrape_workers(worker_memory=int(os.getenv("SCRAPE_WORKER_MEMORY", 3 * 2**29))):
+    """Returns the number of scrape workers fitting in memory, each running a browser (1.5 GB by default), at most 5."""
     try:
-        command = f"python main.py --movie_id '{movie_id}'"
-        logger.info(f"{movie_id} - Launching main script...")
-        subprocess.run(command, shell=True, check=True)
-        logger.debug(f"{movie_id} - Main script finished")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"{movie_id} - Failed launching main script: {e}")
-    finally:
-        with processing_lock:
-            active_processes.remove(movie_id)
-
-
-def process_movie(movie_id):
-    """Wrapper to call run_movie_script for multiprocessing."""
-    run_movie_script(movie_id)
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 5
+    return max(1, min(5, memory // worker_memory))
+
+
+# Scraping is bound by the memory of the browsers, sentiment analysis by the latency of the API: each stage has its own workers
+max_concurrent_scripts = int(os.getenv("SCRAPE_WORKERS", default_scrape_workers()))
+sentiment_workers = int(os.getenv("SENTIMENT_WORKERS", 4))  # Threads analyzing a movie each, its reviews being sent to the API concurrently
+sentiment_interval = int(os.getenv("SENTIMENT_INTERVAL", 60))  # Time between two checks for reviews to analyze, in seconds
+batch_poll_interval = int(os.getenv("SENTIMENT_BATCH_POLL_INTERVAL", 600))  # Time between two checks of the batches submitted, in seconds
+movies_per_worker = int(os.getenv("MOVIES_PER_WORKER", 50))  # Workers are replaced after this many movies, releasing any leaked memory
+movie_time_budget = int(os.getenv("MOVIE_TIME_BUDGET", 3300))  # Maximum duration of the pipeline for a movie, in seconds
+worker_db_connections = int(os.getenv("DB_POOL_MAX_SIZE", 2))  # Database connections kept open by each worker between movies
+dispatch_interval = int(os.getenv("DISPATCH_INTERVAL", 900))  # Time between two checks for the movies due, by which they should be processed
+
+# Set up by main() only, as the worker processes import this module as well
+worker = None  # Identifier of this scheduler in the job queue, the leases on the jobs it runs being held in its name
+executor = None
+executor_lock = threading.Lock()
+sentiment_executor = None
+dispatcher = None
+sentiment_dispatcher = None
+
+
+def get_executor():
+    """
+    Returns the pool of worker processes, which is kept between runs so that
+    each worker imports the pipeline and launches its browser only once.
+    """
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=max_concurrent_scripts,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=movies_per_worker,
+                initializer=configure_pool,
+                initargs=(1, worker_db_connections))
+        return executor
+
+
+def reset_executor(broken=None):
+    """
+    Discards the pool after a worker crashed; a new one is created for the next movies.
+
+    :param broken: Pool in which the crash happened, ignored if it was already replaced
+    """
+    global executor
+    with executor_lock:
+        if executor is not None and (broken is None or executor is broken):
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = None
+
+
+def launch_movie(movie_id):
+    """Claims the job of a movie and runs its pipeline in a worker process."""
+    logger.info(f"{movie_id} - Launching main script...")
+    pool = get_executor()
+    future = pool.submit(run_job, movie_id, time_budget=movie_time_budget, worker=worker)
+    future.add_done_callback(lambda future: movie_finished(movie_id, future, pool))
+    return future
+
+
+def movie_finished(movie_id, future, pool):
+    """Logs the outcome of the pipeline for a movie; failures are recorded in the job queue by the worker itself."""
+    try:
+        if future.result():
+            logger.debug(f"{movie_id} - Main script finished")
+    except TimeBudgetExceeded:
+        logger.error(f"{movie_id} - Main script interrupted after {movie_time_budget}s")
+    except BrokenProcessPool:
+        logger.error(f"{movie_id} - Worker process crashed")
+        reset_executor(pool)
+        try:
+            with PostgreSQLDatabase() as db:
+                db.fail_job(movie_id, worker, "Worker process crashed", JOB_BACKOFF, JOB_MAX_BACKOFF, JOB_MAX_ATTEMPTS, JOB_FAILED_DELAY)
+        except Exception as e:
+            logger.error(f"{movie_id} - Failed recording job failure: {e}")
+    except Exception as e:
+        logger.error(f"{movie_id} - Main script failed: {e}")
+
+
+def launch_sentiment(movie_id):
+    """Analyzes the reviews flagged for a movie in a sentiment worker."""
+    future = sentiment_executor.submit(analyze_movie, movie_id)
+    future.add_done_callback(lambda future: sentiment_finished(movie_id, future))
+    return future
+
+
+def sentiment_finished(movie_id, future):
+    """Logs the failure of the sentiment analysis of a movie; the reviews stay flagged for the next check."""
+    try:
+        future.result()
+    except Exception as e:
+        logger.error(f"{movie_id} - Sentiment analysis failed: {e}")
 
 
 def process_movies(movies_id):
-    """Manages concurrent execution of movie scripts."""
-    logger.info(f"Processing {len(movies_id)} movies with {max_concurrent_scripts} concurrent workers")
-    with multiprocessing.Pool(processes=max_concurrent_scripts) as pool:
-        pool.map(process_movie, list(movies_id))
-    logger.info("All movie processing completed")
+    """Spreads the jobs of the movies over the dispatch interval, so that they complete before the next check."""
+    queued = dispatcher.plan(movies_id, deadline=time.time() + dispatch_interval)
+    logger.info(f"Dispatching {queued} movies over {dispatch_interval // 60} minutes with {max_concurrent_scripts} concurrent workers")
 
 
 def backup_function():
-    """Runs the backup script."""
+    """Runs the backup script, holding the start of new movies meanwhile."""
     try:
-        subprocess.run("python -m src.backup", shell=True, check=True)
+        with dispatcher.paused():
+            subprocess.run("python -m src.backup", shell=True, check=True)
         logger.info("Backup completed successfully.")
     except subprocess.CalledProcessError as e:
         logger.error(f"Failed running backup: {e}")
@@ -61,18 +139,52 @@ def backup_function():
 
 def schedule_tasks():
     """Schedules the movie processing and backup."""
+    logger.info("Launching scheduler for movie processing and backups")
     scheduler = BackgroundScheduler()
 
     def scheduled_movie_processing():
+        # Queue the movies due, then take the jobs claimable, including retries and jobs of lost workers, from any scheduler
         with PostgreSQLDatabase() as db:
-            movies_id = set(movie[0] for movie in db.query_data('movies'))
-            if movies_id:
-                process_movies(movies_id)
-            else:
-                logger.warning("No movies found in the database to process")
+            db.enqueue_jobs(db.due_movies())
+            movies_id = db.claimable_jobs()
+            jobs = db.job_counts()
+        metrics = dispatcher.metrics()
+        sentiment_metrics = sentiment_dispatcher.metrics()
+        logger.info(f"Dispatch queue: {metrics['queued']} movies queued, {metrics['running']} running, "
+                    f"lag {metrics['lag_seconds']:.0f}s (max {metrics['max_lag_seconds']:.0f}s); "
+                    f"jobs: {', '.join(f'{count} {status}' for status, count in sorted(jobs.items()))}; "
+                    f"sentiment: {sentiment_metrics['queued']} movies queued, {sentiment_metrics['running']} running")
+        if movies_id:
+            process_movies(movies_id)
+        else:
+            logger.debug("No movie due for processing")
+
+    def scheduled_sentiment_analysis():
+        with PostgreSQLDatabase() as db:
+            # Large backlogs (new movies, restored backups) go through the Batch API, cheaper but slower
+            if BATCH_THRESHOLD > 0:
+                for movie_id in db.movies_to_analyze(min_reviews=BATCH_THRESHOLD):
+                    submit_backfill(db, movie_id)
+            movies_id = db.movies_to_analyze()
+        # Started right away, the stage being only limited by its number of workers and the rate limits of the API
+        if movies_id:
+            sentiment_dispatcher.plan(movies_id, deadline=time.time())
+
+    def scheduled_batch_polling():
+        with PostgreSQLDatabase() as db:
+            poll_batches(db)
+
+    # Connections of the sentiment workers, which hold a session while waiting for the API
+    configure_pool(1, sentiment_workers + 2)
 
-    # Schedule movie processing to run at the top of every hour (0th minute)
-    scheduler.add_job(scheduled_movie_processing, CronTrigger(minute=0))
+    # Check regularly for the movies due, each movie being scraped at its own pace
+    dispatcher.start()
+    scheduler.add_job(scheduled_movie_processing, IntervalTrigger(seconds=dispatch_interval), next_run_time=datetime.now())
+
+    # Drain the reviews flagged for sentiment analysis continuously, independently from scraping
+    sentiment_dispatcher.start()
+    scheduler.add_job(scheduled_sentiment_analysis, IntervalTrigger(seconds=sentiment_interval), next_run_time=datetime.now())
+    scheduler.add_job(scheduled_batch_polling, IntervalTrigger(seconds=batch_poll_interval))
 
     # Schedule backup to run every hour at the 50th minute
     scheduler.add_job(backup_function, CronTrigger(minute=50))
@@ -86,7 +198,24 @@ def schedule_tasks():
     except (KeyboardInterrupt, SystemExit):
         logger.info("Shutting down scheduler...")
         scheduler.shutdown()
+        dispatcher.stop()
+        sentiment_dispatcher.stop()
+        reset_executor()
+        sentiment_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    """Sets up the logging, the worker pools and the dispatchers of this scheduler, then runs the scheduled tasks."""
+    global worker, sentiment_executor, dispatcher, sentiment_dispatcher
+    setup_logging()
+    worker = worker_name()
+    sentiment_executor = ThreadPoolExecutor(max_workers=sentiment_workers, thread_name_prefix="sentiment")
+
+    # Movies are started one after the other over the interval, so that browsers, database connections and API calls do not peak together
+    dispatcher = Dispatcher(launch_movie, max_concurrent_scripts)
+    sentiment_dispatcher = Dispatcher(launch_sentiment, sentiment_workers)
+    schedule_tasks()
 
 
 if __name__ == '__main__':
-    schedule_tasks()
+    main()
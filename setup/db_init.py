@@ -13,7 +13,7 @@ logger.info("Initializing databases...")
 
 
 # Drop existing tables for a clean start (in reverse order of dependency)
-for table in ['reviews_sentiments', 'reviews_raw', 'movies']:
+for table in ['sentiment_batches', 'jobs', 'movie_schedule', 'review_gaps', 'reviews_sentiments', 'reviews_raw', 'movies']:
     with PostgreSQLDatabase() as db:
         if db.table_exists(table):
             db.drop_table(table)
@@ -26,7 +26,8 @@ with PostgreSQLDatabase() as db:
         'title': 'VARCHAR(250)',
         'release_date': 'DATE',
         'nb_reviews': 'INTEGER',
-        'scrapping_timestamp': 'TIMESTAMP'})
+        'scrapping_timestamp': 'TIMESTAMP',
+        'last_full_scrape': 'TIMESTAMP'})
 
     db.create_table('reviews_raw', {
         'movie_id': 'VARCHAR(9) REFERENCES movies(movie_id) ON DELETE CASCADE',
@@ -39,7 +40,11 @@ with PostgreSQLDatabase() as db:
         'upvotes': 'INTEGER',
         'downvotes': 'INTEGER',
         'last_update': 'TIMESTAMP',
-        'to_process': 'INTEGER'})
+        'to_process': 'INTEGER',
+        'text_hash': 'CHAR(32)',
+        'votes_hash': 'CHAR(32)',
+        'claimed_by': 'VARCHAR(100)',
+        'claim_expires': 'TIMESTAMP'})
 
     db.create_table('reviews_sentiments', {
         'review_id': 'VARCHAR(10)',
@@ -51,6 +56,43 @@ with PostgreSQLDatabase() as db:
         'values': 'INTEGER',
         'overall': 'INTEGER'})
 
+    db.create_table('review_gaps', {
+        'movie_id': 'VARCHAR(9) PRIMARY KEY REFERENCES movies(movie_id) ON DELETE CASCADE',
+        'missing': 'INTEGER',
+        'attempts': 'INTEGER',
+        'known_gap': 'INTEGER',
+        'last_attempt': 'TIMESTAMP'})
+
+    db.create_table('movie_schedule', {
+        'movie_id': 'VARCHAR(9) PRIMARY KEY REFERENCES movies(movie_id) ON DELETE CASCADE',
+        'next_due': 'TIMESTAMP',
+        'interval_seconds': 'INTEGER',
+        'reviews_per_day': 'REAL',
+        'last_nb_reviews': 'INTEGER',
+        'last_checked': 'TIMESTAMP',
+        'priority': 'BOOLEAN DEFAULT FALSE'})
+
+    db.create_table('jobs', {
+        'movie_id': 'VARCHAR(9) PRIMARY KEY REFERENCES movies(movie_id) ON DELETE CASCADE',
+        'status': "VARCHAR(10) NOT NULL DEFAULT 'queued'",
+        'attempts': 'INTEGER NOT NULL DEFAULT 0',
+        'run_after': 'TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP',
+        'worker': 'VARCHAR(100)',
+        'lease_expires': 'TIMESTAMP',
+        'heartbeat': 'TIMESTAMP',
+        'last_error': 'TEXT',
+        'updated_at': 'TIMESTAMP'})
+
+    db.create_table('sentiment_batches', {
+        'batch_id': 'VARCHAR(100) PRIMARY KEY',
+        'worker': 'VARCHAR(100)',
+        'movie_id': 'VARCHAR(9) REFERENCES movies(movie_id) ON DELETE CASCADE',
+        'nb_reviews': 'INTEGER',
+        'status': 'VARCHAR(20)',
+        'output_file_id': 'VARCHAR(100)',
+        'submitted_at': 'TIMESTAMP',
+        'ingested_at': 'TIMESTAMP'})
+
 
 # Restore covers and data
 s3 = s3()
@@ -90,3 +132,7 @@ for table in ['movies', 'reviews_raw', 'reviews_sentiments']:
         with PostgreSQLDatabase() as db:
             db.insert_data(table, backup_data)
 
+
+# Reviews restored without sentiments are analyzed again, through the Batch API if numerous
+with PostgreSQLDatabase() as db:
+    db.flag_unanalyzed_reviews()
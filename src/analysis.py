@@ -1,6 +1,12 @@
 import ast
+import asyncio
+import json
 import openai
 import os
+import random
+import re
+import threading
+import time
 
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -8,17 +14,14 @@ from src.utils.logger import get_backend_logger
 
 logger = get_backend_logger()
 
+GPT_MODEL = os.getenv('GPT_MODEL', 'gpt-4o-mini')
+GPT_CONCURRENCY = int(os.getenv('GPT_CONCURRENCY', 16))  # Requests sent at the same time by an analyzer
+GPT_MAX_RETRIES = int(os.getenv('GPT_MAX_RETRIES', 5))  # Retries of a request after a rate limit or a server error
+GPT_BACKOFF = float(os.getenv('GPT_BACKOFF', 1))  # Maximum delay before the first retry, doubled at each retry, in seconds
+GPT_MAX_BACKOFF = float(os.getenv('GPT_MAX_BACKOFF', 60))
+ANSWER_TOKENS = 150  # Tokens of an answer, counted with the prompt against the tokens-per-minute limit
 
-class GPT:
-    def __init__(self):
-        load_dotenv()
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.client = OpenAI()
-
-    def sentiment(self, review, movie_id):
-        text = review[3] + f"\n\n" + review[4]
-
-        prompt = f"""
+PROMPT = """
 Instructions:
 Below is a movie review that I want you to analyze.
 For each of the following aspect, you must determine if it is mentioned in the review, and if it is, what is the corresponding sentiment on the following scale: *very negative*, *negative*, *neutral* (including mixed or contradictory sentiments), *positive*, *very positive*.
@@ -36,66 +39,346 @@ Now the review:
 {text}
 """
 
-        try:
-            completion = self.client.chat.completions.create(
-                model = "gpt-4o-mini",
-                messages = [{"role": "user", "content": prompt}]
-            )
-        except Exception as e:
-            logger.info(f"{movie_id} - API call failed for review by {review[2]}: {e}")
-            return None
+# Convert categories into integers
+SENTIMENT_MAPPING = {
+    'very negative': -2,
+    'negative': -1,
+    'neutral': 0,
+    'positive': 1,
+    'very positive': 2,
+    'terrible': -2,
+    'bad despite some qualities': -1,
+    'average': 0,
+    'good despite minor flaws': 1,
+    'excellent': 2,
+    'NA': None}
+
+
+def build_prompt(review):
+    """
+    Return the prompt asking for the sentiments of a review
 
-        # Extract list from API answer
+    :param review: Row of reviews_raw, with the title and the text of the review at index 3 and 4, possibly NULL
+    """
+    text = (review[3] or "") + f"\n\n" + (review[4] or "")
+    return PROMPT.format(text=text)
+
+
+def parse_answer(raw_answer, review, movie_id):
+    """
+    Convert the answer of GPT into the sentiments of the 5 aspects and the overall sentiment, as integers (None if not mentioned)
+
+    :return: List of 6 values, or None if the answer could not be parsed
+    """
+    # Extract list from API answer
+    try:
+        answer = ast.literal_eval(raw_answer)
+    except Exception:
+        # GPT may stray from its intended behavior in at least 2 ways:
         try:
-            raw_answer = completion.choices[0].message.content
-            answer = ast.literal_eval(raw_answer)
+            # Replace fancy quotes signs
+            clean_answer = raw_answer.replace("‘", "'").replace("’", "'").replace("“", '"').replace("”", '"')
+            answer = ast.literal_eval(clean_answer)
         except Exception:
-            # GPT may stray from its intended behavior in at least 2 ways:
             try:
-                # Replace fancy quotes signs
-                clean_answer = raw_answer.replace("‘", "'").replace("’", "'").replace("“", '"').replace("”", '"')
+                # Remove python markup
+                clean_answer = raw_answer.replace("```python", "").replace("```", "")
                 answer = ast.literal_eval(clean_answer)
             except Exception:
-                try:
-                    # Remove python markup
-                    clean_answer = raw_answer.replace("```python", "").replace("```", "")
-                    answer = ast.literal_eval(clean_answer)
-                except Exception:
-                    logger.error(f"{movie_id} - Failed to parse GPT answer for review by {review[2]}")
-                    logger.error(f"{movie_id} - GPT answer: {raw_answer}")
-                    return None
+                logger.error(f"{movie_id} - Failed to parse GPT answer for review by {review[2]}")
+                logger.error(f"{movie_id} - GPT answer: {raw_answer}")
+                return None
 
-        # Convert categories into integers
-        sentiment_mapping = {
-            'very negative': -2,
-            'negative': -1,
-            'neutral': 0,
-            'positive': 1,
-            'very positive': 2,
-            'terrible': -2,
-            'bad despite some qualities': -1,
-            'average': 0,
-            'good despite minor flaws': 1,
-            'excellent': 2,
-            'NA': None}
-        mapped_values = [None] * 6
-
-        # Map aspect-based sentiments
+    mapped_values = [None] * 6
+
+    # Map aspect-based sentiments
+    try:
+        for i, (label, _, sentiment) in enumerate(answer[:5]):
+            if sentiment in SENTIMENT_MAPPING:
+                mapped_values[i] = SENTIMENT_MAPPING[sentiment]
+    except Exception as e:
+        logger.error(f"{movie_id} - Failed to map aspect-based sentiments for review by {review[2]}: {e}")
+        return None
+
+    # Map overall sentiment
+    try:
+        label, sentiment = answer[5]
+        if sentiment in SENTIMENT_MAPPING:
+            mapped_values[5] = SENTIMENT_MAPPING[sentiment]
+    except Exception as e:
+        logger.error(f"{movie_id} - Failed to map overall sentiment for review by {review[2]}: {e}")
+        return None
+
+    return mapped_values
+
+
+class GPT:
+    def __init__(self):
+        load_dotenv()
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        self.client = OpenAI()
+
+    def sentiment(self, review, movie_id):
         try:
-            for i, (label, _, sentiment) in enumerate(answer[:5]):
-                if sentiment in sentiment_mapping:
-                    mapped_values[i] = sentiment_mapping[sentiment]
+            completion = self.client.chat.completions.create(
+                model = GPT_MODEL,
+                messages = [{"role": "user", "content": build_prompt(review)}]
+            )
         except Exception as e:
-            logger.error(f"{movie_id} - Failed to map aspect-based sentiments for review by {review[2]}: {e}")
+            logger.info(f"{movie_id} - API call failed for review by {review[2]}: {e}")
             return None
 
-        # Map overall sentiment
+        return parse_answer(completion.choices[0].message.content, review, movie_id)
+
+
+def _parse_duration(value):
+    """Convert a duration from the rate limit headers of OpenAI (e.g. '6m0s', '20ms', '1.5s') into seconds"""
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value or ""))
+
+
+class RateLimits:
+    def __init__(self):
+        """
+        Requests and tokens left in the current window of the API, as reported by the headers of its responses,
+        shared by the analyzers of a process so that they slow down together before hitting the limits
+        """
+        self._lock = threading.Lock()
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+        self.paused_until = 0.0
+
+
+    def update(self, headers):
+        """
+        Record the limits reported by a response (x-ratelimit-remaining-requests, x-ratelimit-reset-requests...)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if headers.get('x-ratelimit-remaining-requests') is not None:
+                self.remaining_requests = int(headers['x-ratelimit-remaining-requests'])
+                self.requests_reset_at = now + _parse_duration(headers.get('x-ratelimit-reset-requests'))
+            if headers.get('x-ratelimit-remaining-tokens') is not None:
+                self.remaining_tokens = int(headers['x-ratelimit-remaining-tokens'])
+                self.tokens_reset_at = now + _parse_duration(headers.get('x-ratelimit-reset-tokens'))
+
+
+    def pause(self, seconds):
+        """Hold all requests, after the API refused one"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+    def reserve(self, tokens):
+        """
+        Take a request and its tokens from what is left in the window
+
+        :return: Time to wait before trying again, in seconds, or 0 if the request can be sent
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.paused_until > now:
+                return self.paused_until - now
+            if self.remaining_requests is not None and self.requests_reset_at > now:
+                if self.remaining_requests < 1:
+                    return self.requests_reset_at - now
+            if self.remaining_tokens is not None and self.tokens_reset_at > now:
+                if self.remaining_tokens < tokens:
+                    return self.tokens_reset_at - now
+            # Until the next response updates them, the limits are counted down locally
+            if self.remaining_requests is not None:
+                self.remaining_requests -= 1
+            if self.remaining_tokens is not None:
+                self.remaining_tokens -= tokens
+            return 0
+
+
+rate_limits = RateLimits()
+
+
+class AsyncGPT:
+    def __init__(self, max_concurrency=GPT_CONCURRENCY, model=GPT_MODEL, base_url=None, api_key=None,
+                 max_retries=GPT_MAX_RETRIES, backoff=GPT_BACKOFF, max_backoff=GPT_MAX_BACKOFF, limits=rate_limits):
+        """
+        Analyze the sentiment of many reviews concurrently, within the rate limits of the API
+
+        Must be used as an async context manager, which opens and closes the client.
+
+        :param max_concurrency: Maximum number of requests in flight
+        :param base_url: URL of an OpenAI-compatible API, by default OPENAI_BASE_URL or OpenAI
+        :param max_retries: Retries of a request after a rate limit (429), a server error or a timeout
+        :param backoff: Maximum delay before the first retry, in seconds; retries wait a random delay below it, doubled at each retry
+        :param limits: RateLimits updated from the headers of the responses
+        """
+        load_dotenv()
+        self.max_concurrency = max_concurrency
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limits = limits
+        self.client = None
+        self._semaphore = None
+
+
+    async def __aenter__(self):
+        # Retries are handled here, so that they are spread with jitter and shared with the other requests
+        self.client = openai.AsyncOpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=0)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.client.close()
+
+
+    def _retry_delay(self, attempt, error):
+        # Full jitter, so that the requests refused together are not sent again together
+        delay = random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        if headers.get('retry-after-ms'):
+            delay = max(delay, float(headers['retry-after-ms']) / 1000)
+        elif headers.get('retry-after', '').replace('.', '', 1).isdigit():
+            delay = max(delay, float(headers['retry-after']))
+        return delay
+
+
+    async def sentiment(self, review, movie_id):
+        """
+        Return the sentiments of a review, as GPT.sentiment, or None if the request or the parsing failed
+        """
         try:
-            label, sentiment = answer[5]
-            if sentiment in sentiment_mapping:
-                mapped_values[5] = sentiment_mapping[sentiment]
+            prompt = build_prompt(review)
         except Exception as e:
-            logger.error(f"{movie_id} - Failed to map overall sentiment for review by {review[2]}: {e}")
+            logger.error(f"{movie_id} - Failed building the prompt for review by {review[2]}: {e}")
             return None
+        tokens = len(prompt) // 4 + ANSWER_TOKENS
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                while (delay := self.limits.reserve(tokens)) > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    response = await self.client.chat.completions.with_raw_response.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}])
+                    self.limits.update(response.headers)
+                    completion = response.parse()
+                    break
+                except openai.RateLimitError as e:
+                    if getattr(e, 'code', None) == 'insufficient_quota':
+                        logger.error(f"{movie_id} - API quota exhausted: {e}")
+                        return None
+                    error = e
+                    delay = self._retry_delay(attempt, e)
+                    self.limits.pause(delay)  # The other requests wait as well
+                except (openai.APIConnectionError, openai.InternalServerError) as e:
+                    error = e
+                    delay = self._retry_delay(attempt, e)
+                except Exception as e:
+                    logger.info(f"{movie_id} - API call failed for review by {review[2]}: {e}")
+                    return None
+                if attempt < self.max_retries:
+                    logger.debug(f"{movie_id} - API call for review by {review[2]} refused ({type(error).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+            else:
+                logger.info(f"{movie_id} - API call failed for review by {review[2]} after {self.max_retries} retries: {error}")
+                return None
+
+        return parse_answer(completion.choices[0].message.content, review, movie_id)
+
+
+    async def analyze(self, reviews, movie_id):
+        """
+        Analyze reviews concurrently
+
+        :return: Sentiments of each review, in the same order, None for the reviews whose analysis failed
+        """
+        # An unexpected error on one review must not discard the answers of the others
+        results = await asyncio.gather(*(self.sentiment(review, movie_id) for review in reviews), return_exceptions=True)
+        for review, result in zip(reviews, results):
+            if isinstance(result, Exception):
+                logger.error(f"{movie_id} - Analysis failed for review by {review[2]}: {result}")
+        return [None if isinstance(result, Exception) else result for result in results]
+
+
+class BatchGPT:
+    def __init__(self, model=GPT_MODEL, base_url=None, api_key=None, completion_window="24h", directory=os.path.join('data', 'batches')):
+        """
+        Analyze the sentiment of many reviews through the Batch API, which is cheaper than interactive requests
+        but answers within the completion window only
+
+        :param base_url: URL of an OpenAI-compatible API, by default OPENAI_BASE_URL or OpenAI
+        :param directory: Directory in which the JSONL files of the requests are written before being uploaded
+        """
+        load_dotenv()
+        self.model = model
+        self.completion_window = completion_window
+        self.directory = directory
+        self.client = OpenAI(base_url=base_url, api_key=api_key)
+
 
-        return mapped_values
+    def write_requests(self, reviews, name):
+        """
+        Write the requests for reviews to a JSONL file, one line per review identified by its author
+
+        :param name: Name of the file, without extension
+        :return: Path of the file
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            for review in reviews:
+                request = {"custom_id": review[2], "method": "POST", "url": "/v1/chat/completions",
+                           "body": {"model": self.model, "messages": [{"role": "user", "content": build_prompt(review)}]}}
+                f.write(json.dumps(request) + '\n')
+        return path
+
+
+    def submit(self, path):
+        """
+        Upload a JSONL file of requests and create the batch
+
+        :return: Batch object, with its id and status
+        """
+        with open(path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        return self.client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions",
+                                          completion_window=self.completion_window)
+
+
+    def retrieve(self, batch_id):
+        """Return the batch object, with its current status"""
+        return self.client.batches.retrieve(batch_id)
+
+
+    def sentiments(self, batch, reviews, movie_id=None):
+        """
+        Download the answers of a batch and map them as GPT.sentiment
+
+        :param reviews: Reviews of the batch, as submitted
+        :return: Dictionary author -> sentiments, for the reviews whose request succeeded and answer could be parsed
+        """
+        if not batch.output_file_id:
+            return {}
+        reviews = {review[2]: review for review in reviews}
+        results = {}
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            output = json.loads(line)
+            review = reviews.get(output.get('custom_id'))
+            response = output.get('response') or {}
+            if review is None or response.get('status_code') != 200:
+                continue
+            try:
+                raw_answer = response['body']['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                continue
+            sentiments = parse_answer(raw_answer, review, movie_id or review[0])
+            if sentiments is not None:
+                results[review[2]] = sentiments
+        return results
@@ -0,0 +1,129 @@
+import argparse
+import os
+import uuid
+
+from src.analysis import BatchGPT
+from src.utils.db import PostgreSQLDatabase
+from src.utils.logger import setup_logging, get_backend_logger
+
+logger = get_backend_logger()
+
+BATCH_THRESHOLD = int(os.getenv('SENTIMENT_BATCH_THRESHOLD', 500))  # Reviews flagged for a movie above which they are analyzed through the Batch API, 0 to disable
+BATCH_MAX_REQUESTS = int(os.getenv('SENTIMENT_BATCH_MAX_REQUESTS', 50000))  # Maximum number of reviews per batch
+BATCH_LEASE = 25 * 3600  # Claim on the reviews of a batch, longer than the completion window of 24 hours, in seconds
+BATCH_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def submit_backfill(db, movie_id=None, analyzer=None, limit=BATCH_MAX_REQUESTS):
+    """
+    Claim the reviews flagged for sentiment analysis and submit them as a batch
+
+    The reviews stay claimed until the results are ingested, so that the interactive workers skip them.
+
+    :param db: PostgreSQLDatabase session
+    :param movie_id: Movie of the reviews, or None for any movie
+    :param analyzer: BatchGPT, by default a new one
+    :return: Identifier of the batch, or None if there was nothing to submit or the submission failed
+    """
+    worker = f"batch-{uuid.uuid4().hex[:12]}"
+    reviews = db.claim_reviews(worker, limit, BATCH_LEASE, movie_id)
+    if not reviews:
+        logger.info(f"{movie_id} - No new reviews to submit")
+        return None
+
+    # Reviews without text have no sentiment to analyze, so they are not claimed again at each submission
+    empty = [review for review in reviews if not review[4]]
+    if empty:
+        db.complete_reviews(worker, [review[2] for review in empty], [review[11] for review in empty], movie_id)
+        logger.info(f"{movie_id} - Skipped {len(empty)} reviews without text")
+        reviews = [review for review in reviews if review[4]]
+        if not reviews:
+            return None
+
+    analyzer = analyzer or BatchGPT()
+    try:
+        batch = analyzer.submit(analyzer.write_requests(reviews, worker))
+    except Exception as e:
+        logger.error(f"{movie_id} - Failed submitting batch of {len(reviews)} reviews: {e}")
+        db.release_reviews(worker)
+        return None
+    db.record_batch(batch.id, worker, movie_id, len(reviews), batch.status)
+    return batch.id
+
+
+def ingest_batch(db, batch, worker, movie_id, analyzer):
+    """
+    Save the sentiments of a finished batch, then release the reviews it failed to analyze
+
+    :return: Number of reviews analyzed
+    """
+    reviews = db.claimed_reviews(worker)
+    results = analyzer.sentiments(batch, reviews, movie_id)
+    data, text_hashes = [], []
+    for review in reviews:
+        if review[2] in results:
+            data.append((review[1], review[2], *results[review[2]]))
+            text_hashes.append(review[11])
+
+    if data:
+        # Reviews edited since the submission stay flagged, to be analyzed again
+        with db.transaction():
+            db.update_sentiment_data(data, movie_id)
+            db.complete_reviews(worker, [row[1] for row in data], text_hashes, movie_id)
+    released = db.release_reviews(worker)
+    logger.info(f"{movie_id} - Ingested batch {batch.id}: {len(data)} reviews analyzed, {released} released")
+    return len(data)
+
+
+def poll_batches(db, analyzer=None):
+    """
+    Check the batches submitted, and ingest those finished
+
+    :return: Number of batches ingested
+    """
+    ingested = 0
+    for batch_id, worker, movie_id, status in db.pending_batches():
+        analyzer = analyzer or BatchGPT()
+        try:
+            batch = analyzer.retrieve(batch_id)
+        except Exception as e:
+            logger.error(f"{movie_id} - Failed checking batch {batch_id}: {e}")
+            continue
+
+        if batch.status not in BATCH_TERMINAL_STATUSES:
+            if batch.status != status:
+                db.update_batch(batch_id, batch.status)
+                logger.info(f"{movie_id} - Batch {batch_id} {batch.status}")
+            continue
+
+        # Expired or cancelled batches may still hold the answers of part of the requests
+        try:
+            ingest_batch(db, batch, worker, movie_id, analyzer)
+        except Exception as e:
+            logger.error(f"{movie_id} - Failed ingesting batch {batch_id}: {e}")
+            continue
+        db.update_batch(batch_id, batch.status, batch.output_file_id, ingested=True)
+        ingested += 1
+    return ingested
+
+
+if __name__ == "__main__":
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Analyze the sentiment of large backlogs of reviews through the Batch API.")
+    parser.add_argument("--submit", nargs="*", help="Submit the reviews flagged for the given movie IDs, or for all movies if none is given")
+    parser.add_argument("--flag_missing", action="store_true", help="Flag the reviews without sentiments first, e.g. after restoring a backup")
+    parser.add_argument("--poll", action="store_true", help="Check the batches submitted and ingest those finished")
+    args = parser.parse_args()
+
+    if args.submit is None and not args.poll:
+        parser.error("At least one of --submit or --poll argument must be provided.")
+
+    with PostgreSQLDatabase() as db:
+        if args.flag_missing:
+            db.flag_unanalyzed_reviews()
+        if args.submit is not None:
+            for movie_id in args.submit or [None]:
+                submit_backfill(db, movie_id)
+        if args.poll:
+            poll_batches(db)
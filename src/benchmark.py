@@ -0,0 +1,95 @@
+import argparse
+import multiprocessing
+import resource
+import time
+
+from src.scrapping import REVIEW_PARSERS, parse_reviews
+from src.utils.archive import PageArchive
+
+
+REVIEW_TEMPLATE = """
+<article class="sc-d99cd751-1 kzUfxa user-review-item">
+  <div class="ipc-list-card__content">
+    <div class="sc-d99cd751-2 review-rating">{rating}</div>
+    <div class="ipc-title ipc-title--base ipc-title--title"><a class="ipc-title-link-wrapper" href="/review/rw{number:07d}/"><h3 class="ipc-title__text">Review title #{number}</h3></a></div>
+    {content}
+  </div>
+  <div class="ipc-list-card__actions">
+    <ul class="ipc-inline-list ipc-inline-list--show-dividers" role="presentation">
+      <li role="presentation" class="ipc-inline-list__item"><a class="ipc-link ipc-link--base" data-testid="author-link" href="/user/ur{number:08d}/">author_{number}</a></li>
+      <li role="presentation" class="ipc-inline-list__item review-date">{date}</li>
+    </ul>
+    <div class="ipc-voting">
+      <span class="ipc-voting__label__count ipc-voting__label__count--up">{upvotes}</span>
+      <span class="ipc-voting__label__count ipc-voting__label__count--down">{downvotes}</span>
+    </div>
+    <a class="ipc-link ipc-link--base" data-testid="permalink-link" href="/review/rw{number:07d}/?ref_=tturv_perm_{number}">Permalink</a>
+  </div>
+</article>"""
+RATING_TEMPLATE = '<span class="ipc-rating-star ipc-rating-star--base ipc-rating-star--rating"><svg width="24" height="24"></svg><span class="ipc-rating-star--rating">{}</span><span class="ipc-rating-star--maxRating">/10</span></span>'
+CONTENT_TEMPLATE = '<div class="ipc-html-content ipc-html-content--base"><div class="ipc-html-content-inner-div" role="presentation">{}</div></div>'
+SPOILER = '<div class="ipc-signpost">Spoiler</div><button class="ipc-btn review-spoiler-button"><span class="ipc-btn__text">Spoiler</span></button>'
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def synthetic_reviews_page(nb_reviews):
+    """
+    Generate a reviews page mimicking IMDb markup, including spoilers, missing ratings and rounded votes
+    """
+    reviews = []
+    for number in range(1, nb_reviews + 1):
+        paragraphs = "<br/><br/>".join(f"Paragraph {i} of review {number}, with some words about the plot, the acting and the music." for i in range(number % 4 + 1))
+        reviews.append(REVIEW_TEMPLATE.format(
+            number=number,
+            rating="" if number % 5 == 0 else RATING_TEMPLATE.format(number % 10 + 1),
+            content=SPOILER if number % 7 == 0 else CONTENT_TEMPLATE.format(paragraphs),
+            date=f"{MONTHS[number % 12]} {number % 28 + 1}, {2000 + number % 25}",
+            upvotes=f"{number % 9 + 1}.{number % 10}K" if number % 11 == 0 else number % 1000,
+            downvotes=number % 37))
+    return f"""<!DOCTYPE html>
+<html lang="en-US">
+<head><title>User reviews - IMDb</title></head>
+<body><section class="ipc-page-section"><div class="ipc-page-grid__item">{"".join(reviews)}
+</div></section></body>
+</html>"""
+
+
+def measure(backend, html, results):
+    """
+    Parse the page in a fresh process to isolate the peak memory of each backend
+    """
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    reviews_df = parse_reviews(html, "tt0000000", backend=backend)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss  # In kB on Linux
+    results.put((backend, len(reviews_df), elapsed, peak_rss / 2**10))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backends parsing the reviews page.")
+    parser.add_argument("--reviews", type=int, default=10000, help="Number of reviews in the synthetic page")
+    parser.add_argument("--backends", nargs="*", default=list(REVIEW_PARSERS), help="Backends to compare")
+    parser.add_argument("--archive", help="Directory of a page archive, whose largest reviews page is parsed instead of a synthetic one")
+    args = parser.parse_args()
+
+    if args.archive:
+        archive = PageArchive(args.archive)
+        entry = max(archive.entries(kind="reviews_listing"), key=lambda entry: entry["size"], default=None)
+        if entry is None:
+            raise SystemExit(f"No reviews page archived in {args.archive}")
+        html = archive.load(entry)
+        print(f"Archived page: {entry['movie_id']}, {len(html) / 2**20:.1f} MB")
+    else:
+        html = synthetic_reviews_page(args.reviews)
+        print(f"Synthetic page: {args.reviews} reviews, {len(html) / 2**20:.1f} MB")
+    print(f"{'backend':<12} {'reviews':>8} {'seconds':>8} {'peak MB':>8}")
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    for backend in args.backends:
+        process = context.Process(target=measure, args=(backend, html, results))
+        process.start()
+        backend, nb_reviews, elapsed, peak_rss = results.get()
+        process.join()
+        print(f"{backend:<12} {nb_reviews:>8} {elapsed:>8.2f} {peak_rss:>8.1f}")
@@ -1,4 +1,5 @@
 import argparse
+import os
 import sys
 
 from src.utils.db import PostgreSQLDatabase
@@ -14,7 +15,7 @@ def add_movie(movie_id):
         try:
             result = db.query_data("movies", condition=f"movie_id = '{movie_id}'")
             if result:
-                logger.warning(f"Movie_id} already present in the database")
+                logger.warning(f"{movie_id} already present in the database")
             else:
                 db.insert_data("movies", data=[(movie_id, None)])
                 logger.info(f"Added {movie_id} to the database")
@@ -43,6 +44,17 @@ def remove_movie(movie_id):
                 logger.info(f"Removed cover for {movie_id}")
             else:
                 logger.warning(f"Cover not found for {movie_id}")
+        except OSError as e:
+            logger.error(f"Failed to remove the cover of {movie_id}: {e}")
+
+
+def set_priority(movie_id, priority):
+    """Sets or removes the manual override scraping a movie as often as possible"""
+    with PostgreSQLDatabase() as db:
+        if db.query_data("movies", condition=f"movie_id = '{movie_id}'"):
+            db.set_priority(movie_id, priority)
+        else:
+            logger.warning(f"{movie_id} not found in the database")
 
 
 
@@ -50,11 +62,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Add or remove movies by ID.")
     parser.add_argument("--add", nargs="*", help="One or more Movie IDs to add")
     parser.add_argument("--remove", nargs="*", help="One or more Movie IDs to remove")
+    parser.add_argument("--priority", nargs="*", help="One or more Movie IDs to scrape as often as possible")
+    parser.add_argument("--no-priority", nargs="*", help="One or more Movie IDs to scrape again at their own pace")
 
     args = parser.parse_args()
 
-    if not args.add and not args.remove:
-        parser.error("At least one of --add or --remove argument must be provided.")
+    if not args.add and not args.remove and not args.priority and not args.no_priority:
+        parser.error("At least one of --add, --remove, --priority or --no-priority argument must be provided.")
 
     try:
         if args.add:
@@ -65,6 +79,14 @@ if __name__ == "__main__":
             for movie_id in args.remove:
                 remove_movie(movie_id)
 
+        if args.priority:
+            for movie_id in args.priority:
+                set_priority(movie_id, True)
+
+        if args.no_priority:
+            for movie_id in args.no_priority:
+                set_priority(movie_id, False)
+
     except ValueError as e:
         logger.error(f"Command {args} failed: {e}")
         sys.exit(1)
@@ -1,75 +1,444 @@
+import json
 import os
 import pandas as pd
 import re
 import requests
-import shutil
-import tempfile
+import threading
 import time
 
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from selenium import webdriver
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:  # Optional, the slower html.parser backend is used instead
+    lxml = None
+try:
+    from PIL import Image
+except ImportError:  # Optional, covers are saved without thumbnail
+    Image = None
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select, WebDriverWait
+from selenium.webdriver.support.ui import WebDriverWait
+from src.utils.browser import BrowserSession, USER_AGENT
 from src.utils.logger import get_backend_logger
+from src.utils.ratelimit import CircuitOpenError, get_imdb_throttle
+from src.utils.waits import AdaptiveWait
 
 logger = get_backend_logger()
 
+REVIEW_SELECTOR = "article.user-review-item"
+UNHARVESTED_SELECTOR = "article.user-review-item:not([data-harvested])"
+REVIEW_COLUMNS = ["movie_id", "review_id", "author", "title", "text", "rating", "date", "upvotes", "downvotes", "last_update"]
+ALL_BUTTON = '//span[contains(@class, "ipc-see-more")]//button[.//span[contains(text(), "All")]]'
+MORE_BUTTON = '//span[contains(@class, "ipc-see-more")]//button[.//span[contains(text(), "more")]]'
+COVERS_DIR = os.path.join('data', 'covers')
+COVER_MAX_AGE = 7 * 86400  # Time after which an unchanged cover is revalidated, in seconds
+THUMBNAIL_SIZE = (200, 300)
+
+
+def parse_review_date(date_text):
+    """
+    Convert a review date as displayed by IMDb (e.g. 'Jan 5, 2024') to a date
+    """
+    try:
+        return datetime.strptime(date_text.strip(), "%b %d, %Y").date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def _read_cover_metadata(metadata_path):
+    try:
+        with open(metadata_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_thumbnail(cover_path, thumbnail_path, size=THUMBNAIL_SIZE):
+    """
+    Save a downscaled copy of a cover, displayed by the dashboard
+    """
+    if Image is None:
+        logger.debug("Pillow is not installed, skipping thumbnail")
+        return
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    with Image.open(cover_path) as image:
+        image.thumbnail(size)
+        image.convert('RGB').save(thumbnail_path + '.tmp', 'JPEG', quality=85)
+    os.replace(thumbnail_path + '.tmp', thumbnail_path)
+
+
+def download_cover(movie_id, cover_url, directory=COVERS_DIR, max_age=COVER_MAX_AGE):
+    """
+    Save the cover of a movie in data/covers/, with a thumbnail in data/covers/thumbs/
+
+    The URL and the validators of the last download are kept in data/covers/<movie_id>.json:
+    the cover is not requested again while its URL is unchanged, and only revalidated
+    with ETag / If-Modified-Since once max_age seconds have passed.
+
+    :return: Whether a new cover was downloaded
+    """
+    os.makedirs(directory, exist_ok=True)
+    cover_path = os.path.join(directory, f"{movie_id}.jpg")
+    metadata_path = os.path.join(directory, f"{movie_id}.json")
+    thumbnail_path = os.path.join(directory, 'thumbs', f"{movie_id}.jpg")
+
+    metadata = _read_cover_metadata(metadata_path) if os.path.isfile(cover_path) else {}
+    headers = {}
+    if metadata.get('url') == cover_url:
+        if time.time() - metadata.get('checked_at', 0) < max_age:
+            logger.debug(f"{movie_id} - Cover unchanged, skipping download")
+            if not os.path.isfile(thumbnail_path):
+                save_thumbnail(cover_path, thumbnail_path)
+            return False
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+    try:
+        response = requests.get(cover_url, headers=headers, stream=True, timeout=15)
+    except requests.RequestException as e:
+        logger.warning(f"{movie_id} - Failed to download cover: {e}")
+        return False
+
+    if response.status_code == 304:
+        logger.debug(f"{movie_id} - Cover not modified")
+        downloaded = False
+    elif response.status_code == 200:
+        # Write to a temporary file first, so that an interrupted download never replaces the cover
+        with open(cover_path + '.tmp', 'wb') as f:
+            for chunk in response.iter_content(2**16):
+                f.write(chunk)
+        os.replace(cover_path + '.tmp', cover_path)
+        metadata = {'url': cover_url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')}
+        logger.info(f"{movie_id} - Cover successfully downloaded")
+        downloaded = True
+    else:
+        logger.warning(f"{movie_id} - Failed to download cover, status code: {response.status_code}")
+        return False
+
+    try:
+        if downloaded or not os.path.isfile(thumbnail_path):
+            save_thumbnail(cover_path, thumbnail_path)
+    except Exception as e:
+        logger.warning(f"{movie_id} - Failed to save cover thumbnail: {e}")
+
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump({**metadata, 'checked_at': time.time()}, f)
+    return downloaded
+
+
+def _parse_reviews_bs4(html, movie_id, builder="html.parser"):
+    soup = BeautifulSoup(html, builder)
+    reviews = soup.find_all("article", class_="user-review-item")
+    data = []
+    last_update = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for review in reviews:
+        try:
+            # 1. Extract the review identifier
+            permalink_tag = review.find("a", class_="ipc-link ipc-link--base", attrs={"data-testid": "permalink-link"})
+            review_id = None
+            if permalink_tag:
+                identifier_match = re.search(r"/(rw\d+)", permalink_tag["href"])
+                if identifier_match:
+                    review_id = identifier_match.group(1)
+
+            # 2. Extract the review date
+            date_tag = review.find("li", class_="ipc-inline-list__item review-date")
+            review_date = date_tag.get_text(strip=True) if date_tag else None
+
+            # 3. Extract the review author
+            author_tag = review.find("a", class_="ipc-link ipc-link--base", attrs={"data-testid": "author-link"})
+            author_name = author_tag.get_text(strip=True) if author_tag else None
+
+            # 4. Extract the upvotes and downvotes
+            upvotes_tag = review.find("span", class_="ipc-voting__label__count--up")
+            downvotes_tag = review.find("span", class_="ipc-voting__label__count--down")
+            upvotes = upvotes_tag.get_text(strip=True) if upvotes_tag else 0
+            downvotes = downvotes_tag.get_text(strip=True) if downvotes_tag else 0
+
+            # 5. Extract the review text
+            review_tag = review.find("div", class_="ipc-html-content-inner-div")
+            review_text = review_tag.get_text(separator="\n", strip=True) if review_tag else None
+
+            # 6. Extract the review title
+            title_container = review.find("div", class_="ipc-title")
+            review_title = None
+            if title_container:
+                title_tag = title_container.find("h3", class_="ipc-title__text")
+                review_title = title_tag.get_text(strip=True) if title_tag else None
+
+            # 7. Extract the rating
+            rating_tag = review.find("span", class_="ipc-rating-star--maxRating")
+            rating = None
+            if rating_tag and rating_tag.previous_sibling:
+                rating = rating_tag.previous_sibling.get_text(strip=True)
+
+            # 8. Append data to the list
+            data.append({
+                "movie_id": movie_id,
+                "review_id": review_id,
+                "author": author_name,
+                "title": review_title,
+                "text": review_text,
+                "rating": rating,
+                "date": review_date,
+                "upvotes": upvotes,
+                "downvotes": downvotes,
+                "last_update": last_update
+            })
+        except Exception as e:
+            logger.error(f"{movie_id} - Failed to extract data for a review: {e}")
+            continue
+    return data
+
+
+def _has_class(class_name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+if lxml is not None:
+    # Compiled once, as they are evaluated for every review
+    REVIEW_XPATHS = {name: lxml.etree.XPath(path) for name, path in {
+        "reviews": f"//article[{_has_class('user-review-item')}]",
+        "permalink": './/a[@class="ipc-link ipc-link--base"][@data-testid="permalink-link"]',
+        "date": './/li[@class="ipc-inline-list__item review-date"]',
+        "author": './/a[@class="ipc-link ipc-link--base"][@data-testid="author-link"]',
+        "upvotes": f".//span[{_has_class('ipc-voting__label__count--up')}]",
+        "downvotes": f".//span[{_has_class('ipc-voting__label__count--down')}]",
+        "text": f".//div[{_has_class('ipc-html-content-inner-div')}]",
+        "title": f".//div[{_has_class('ipc-title')}]//h3[{_has_class('ipc-title__text')}]",
+        "rating": f".//span[{_has_class('ipc-rating-star--maxRating')}]",
+    }.items()}
+
+
+def _text(element, separator=""):
+    return separator.join(text.strip() for text in element.itertext() if text.strip())
+
+
+def _parse_reviews_lxml(html, movie_id):
+    tree = lxml.html.fromstring(html)
+    reviews = REVIEW_XPATHS["reviews"](tree)
+    data = []
+    last_update = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for review in reviews:
+        try:
+            # 1. Extract the review identifier
+            permalink_tag = REVIEW_XPATHS["permalink"](review)
+            review_id = None
+            if permalink_tag:
+                identifier_match = re.search(r"/(rw\d+)", permalink_tag[0].get("href"))
+                if identifier_match:
+                    review_id = identifier_match.group(1)
+
+            # 2. Extract the review date
+            date_tag = REVIEW_XPATHS["date"](review)
+            review_date = _text(date_tag[0]) if date_tag else None
+
+            # 3. Extract the review author
+            author_tag = REVIEW_XPATHS["author"](review)
+            author_name = _text(author_tag[0]) if author_tag else None
+
+            # 4. Extract the upvotes and downvotes
+            upvotes_tag = REVIEW_XPATHS["upvotes"](review)
+            downvotes_tag = REVIEW_XPATHS["downvotes"](review)
+            upvotes = _text(upvotes_tag[0]) if upvotes_tag else 0
+            downvotes = _text(downvotes_tag[0]) if downvotes_tag else 0
+
+            # 5. Extract the review text
+            review_tag = REVIEW_XPATHS["text"](review)
+            review_text = _text(review_tag[0], separator="\n") if review_tag else None
+
+            # 6. Extract the review title
+            title_tag = REVIEW_XPATHS["title"](review)
+            review_title = _text(title_tag[0]) if title_tag else None
+
+            # 7. Extract the rating, from the node preceding the maximum rating
+            rating_tag = REVIEW_XPATHS["rating"](review)
+            rating = None
+            if rating_tag:
+                previous_tag = rating_tag[0].getprevious()
+                if previous_tag is not None:
+                    rating = previous_tag.tail.strip() if previous_tag.tail else _text(previous_tag)
+                elif rating_tag[0].getparent().text:
+                    rating = rating_tag[0].getparent().text.strip()
+
+            # 8. Append data to the list
+            data.append({
+                "movie_id": movie_id,
+                "review_id": review_id,
+                "author": author_name,
+                "title": review_title,
+                "text": review_text,
+                "rating": rating,
+                "date": review_date,
+                "upvotes": upvotes,
+                "downvotes": downvotes,
+                "last_update": last_update
+            })
+        except Exception as e:
+            logger.error(f"{movie_id} - Failed to extract data for a review: {e}")
+            continue
+    return data
+
+
+REVIEW_PARSERS = {
+    "html.parser": _parse_reviews_bs4,
+    "bs4-lxml": lambda html, movie_id: _parse_reviews_bs4(html, movie_id, builder="lxml"),
+    "lxml": _parse_reviews_lxml,
+}
+DEFAULT_PARSER = "lxml" if lxml is not None else "html.parser"
+
+
+def parse_reviews(html, movie_id, backend=DEFAULT_PARSER):
+    """
+    Extract the reviews displayed on a reviews page
+
+    :param html: Source of the reviews page
+    :param backend: Parser to use, among REVIEW_PARSERS
+    :return: DataFrame with one row per review
+    """
+    data = REVIEW_PARSERS[backend](html, movie_id)
+    return pd.DataFrame(data, columns=REVIEW_COLUMNS)
+
+
+def keep_new_reviews(reviews_df, movie_id, known_ids=None, since=None):
+    """
+    Keep only the reviews not already stored, if known reviews are given
+
+    :param known_ids: Identifiers of the reviews already stored
+    :param since: Date of the newest review already stored, used if no identifier is given
+    """
+    if not known_ids and since is None:
+        logger.info(f"{movie_id} - Extracted {len(reviews_df)} reviews")
+        return reviews_df
+
+    if known_ids:
+        new = ~reviews_df["review_id"].isin(set(known_ids))
+    else:
+        new = reviews_df["date"].map(lambda date_text: (parse_review_date(date_text) or since) >= since)
+    reviews_df = reviews_df[new].reset_index(drop=True)
+    logger.info(f"{movie_id} - Extracted {len(reviews_df)} new reviews")
+    return reviews_df
+
+
+def archive_page(archive, html, movie_id, kind, review_id=None):
+    """
+    Store a page, if an archive is set; failures never interrupt the scrape
+    """
+    if archive is None:
+        return
+    try:
+        archive.store(html, movie_id, kind, review_id)
+    except Exception as e:
+        logger.warning(f"{movie_id} - Failed archiving {kind} page: {e}")
+
 
 class IMDb:
-    def __init__(self):
-        self.temp_profile_dir = None
+    def __init__(self, pool=None, wait_timeout=10, scroll_timeout=5, settle_time=1.0, parser=DEFAULT_PARSER, throttle=None, archive=None):
+        """
+        :param pool: Optional BrowserPool to lease a warm browser from, instead of launching a new one
+        :param throttle: SharedThrottle applied to page loads (default: the one shared by all IMDb scrapers)
+        :param archive: Optional PageArchive in which the pages scraped are stored
+        :param parser: Backend used to parse the reviews page, among REVIEW_PARSERS
+        :param wait_timeout: Maximum duration of a wait for a page or an element, in seconds
+        :param scroll_timeout: Maximum duration of a wait for new reviews after scrolling, in seconds
+        :param settle_time: Duration without change after which the page is considered loaded, in seconds
+        """
+        self.pool = pool
+        self.wait_timeout = wait_timeout
+        self.scroll_timeout = scroll_timeout
+        self.settle_time = settle_time
+        self.parser = parser
+        self.throttle = throttle or get_imdb_throttle()
+        self.archive = archive
+        self.session = None
         self.driver = None
         self.wait = None
+        self.waiter = None
 
 
     def __enter__(self):
         """
-        Initialize the Chrome WebDriver with a temporary profile directory.
+        Lease a browser from the pool, or launch one with a temporary profile directory.
         """
-        self.temp_profile_dir = tempfile.mkdtemp()
-        os.chmod(self.temp_profile_dir, 0o777)
-        logger.debug(f"Chrome user-data-dir: {self.temp_profile_dir}")
-
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.51 Safari/537.36")
-        chrome_options.add_argument(f"--user-data-dir={self.temp_profile_dir}")
-
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.wait = WebDriverWait(self.driver, 10)
-        logger.debug("Launching browser")
+        self.session = self.pool.lease() if self.pool else BrowserSession()
+        self._pages, self._bytes, self._blocked = self.session.pages, self.session.transferred_bytes, self.session.blocked_requests
+        self.driver = self.session.driver
+        self.wait = WebDriverWait(self.driver, self.wait_timeout)
+        self.waiter = AdaptiveWait(self.driver, timeout=self.wait_timeout, settle=self.settle_time)
         return self
 
 
     def __exit__(self, exc_type, exc_value, traceback):
         """
-        Clean up by closing the browser and removing the temporary profile directory.
+        Give the browser back to the pool, or close it and remove its profile directory.
         """
-        if self.driver:
-            self.driver.quit()
-            logger.debug("Browser closed")
-        
-        if self.temp_profile_dir:
-            shutil.rmtree(self.temp_profile_dir, ignore_errors=True)
-            logger.debug(f"Temp directory ({self.temp_profile_dir}) cleaned up")
-        
+        logger.debug(f"Waited {self.waiter.total():.1f}s in {len(self.waiter.timings)} waits")
+        try:
+            self.session.page_stats()  # Requests sent after the last page load
+        except WebDriverException:
+            pass
+        logger.info(f"Loaded {self.session.pages - self._pages} pages: "
+                    f"{(self.session.transferred_bytes - self._bytes) / 2**20:.1f} MB transferred, "
+                    f"{self.session.blocked_requests - self._blocked} requests blocked")
+
         if exc_type is not None:
+            self.session.failed = True
             logger.error(f"Exception occurred: {exc_type}, {exc_value}")
-        
+
+        if self.pool:
+            self.pool.release(self.session)
+        else:
+            self.session.close()
+
         return False  # Returning False to propagate any exception, if any occurred
 
 
+    def _load(self, url):
+        """
+        Load a page under the shared IMDb throttle, flagging the browser for recycling if it crashes
+        """
+        self.throttle.acquire()
+        try:
+            self.driver.get(url)
+        except WebDriverException:
+            self.session.failed = True
+            self.throttle.failure()
+            raise
+        self.session.pages += 1
+
+        try:
+            load_time, transferred_bytes, blocked_requests = self.session.page_stats()
+            load_prompt = f"{load_time:.2f}s" if load_time is not None else "unknown time"
+            logger.debug(f"Loaded {url} in {load_prompt}: {transferred_bytes / 2**10:.0f} kB transferred, {blocked_requests} requests blocked")
+        except WebDriverException as e:
+            logger.debug(f"Failed measuring page load for {url}: {e}")
+
+
+    def _archive_page(self, movie_id, kind, review_id=None):
+        """
+        Store the page currently displayed, if an archive is set
+        """
+        if self.archive is not None:
+            archive_page(self.archive, self.driver.page_source, movie_id, kind, review_id)
+
+
+    def _count_reviews(self):
+        return self.driver.execute_script("return document.querySelectorAll(arguments[0]).length;", REVIEW_SELECTOR)
+
+
     def get_movie(self, movie_id):
         try:
             # Load main page
-            self.driver.get(f"https://www.imdb.com/title/{movie_id}")
+            self._load(f"https://www.imdb.com/title/{movie_id}")
             logger.info(f"{movie_id} - Scrapping metadata")
 
             # Wait for and extract title
@@ -91,19 +460,10 @@ class IMDb:
                 EC.presence_of_element_located((By.CSS_SELECTOR, 'div.ipc-poster__poster-image img.ipc-image'))
             )
             cover_url = cover_element.get_attribute('src')
+            self._archive_page(movie_id, "title")
 
-            os.makedirs('data/covers', exist_ok=True)
-            cover_path = f"data/covers/{movie_id}.jpg"
+            download_cover(movie_id, cover_url)
 
-            response = requests.get(cover_url, stream=True)
-            if response.status_code == 200:
-                with open(cover_path, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                logger.info(f"{movie_id} - Cover successfully downloaded")
-            else:
-                logger.warning(f"{movie_id} - Failed to download cover, status code: {response.status_code}")
-            
             return movie_title, release_date
 
         except Exception as e:
@@ -114,13 +474,14 @@ class IMDb:
     def get_number_of_reviews(self, movie_id):
         try:
             # Load review page
-            self.driver.get(f"https://www.imdb.com/title/{movie_id}/reviews")
+            self._load(f"https://www.imdb.com/title/{movie_id}/reviews")
 
             # Wait for, extract and parse the number of reviews
             reviews_element = self.wait.until(
                 EC.presence_of_element_located((By.XPATH, '//div[@data-testid="tturv-total-reviews"]'))
             )
             reviews_text = reviews_element.text.strip()
+            self._archive_page(movie_id, "reviews_count")
             if "reviews" in reviews_text:
                 total_reviews = reviews_text.split(" reviews")[0]    # Remove the unit
                 total_reviews = total_reviews.replace(",", "")       # Remove the comma for numbers >999
@@ -135,31 +496,200 @@ class IMDb:
             return None
 
 
-    def get_reviews(self, movie_id, total_reviews):
-        # Load reviews page
-        self.driver.get(f"https://www.imdb.com/title/{movie_id}/reviews")
+    def _loaded_reviews(self):
+        """
+        Return the identifier and the date of the reviews currently displayed
+        """
+        return self.driver.execute_script("""
+            return Array.from(document.querySelectorAll(arguments[0])).map(article => {
+                const link = article.querySelector('a[data-testid="permalink-link"]');
+                const date = article.querySelector('li.review-date');
+                const match = link ? link.getAttribute('href').match(/rw\\d+/) : null;
+                return [match ? match[0] : null, date ? date.textContent.trim() : null];
+            });
+        """, REVIEW_SELECTOR)
+
+
+    def _load_until_known(self, movie_id, known_ids, since):
+        """
+        Display more reviews, from the newest, until a review already stored is reached
+        """
+        checked = 0
+        while True:
+            loaded = self._loaded_reviews()
+            for review_id, date_text in loaded[checked:]:
+                review_date = parse_review_date(date_text)
+                if review_id in known_ids or (since is not None and review_date is not None and review_date < since):
+                    logger.info(f"{movie_id} - Reached known reviews after loading {len(loaded)} reviews")
+                    return
+            checked = len(loaded)
+
+            more_button = self.waiter.for_element(By.XPATH, MORE_BUTTON, "more button", timeout=self.scroll_timeout)
+            if more_button is None:
+                logger.info(f"{movie_id} - All {len(loaded)} reviews loaded without reaching known reviews")
+                return
+            self.driver.execute_script("arguments[0].click();", more_button)
+            logger.debug(f"{movie_id} - Loading more reviews ({len(loaded)} reviews loaded)...")
+            if self.waiter.for_count_stable(REVIEW_SELECTOR, "more reviews", above=len(loaded)) is None:
+                logger.warning(f"{movie_id} - No more reviews loaded after {len(loaded)} reviews")
+                return
+
+
+    def _open_reviews(self, movie_id, total_reviews):
+        """
+        Load the reviews page, displaying last published reviews first
+
+        :return: Whether reviews could be sorted by submission date
+        """
+        self._load(f"https://www.imdb.com/title/{movie_id}/reviews")
         logger.info(f"{movie_id} - Scrapping reviews")
-        time.sleep(10)
+        self.waiter.for_network_idle("reviews page load")
+        if total_reviews > 0:
+            self.waiter.for_count_stable(REVIEW_SELECTOR, "first reviews")
+
+        if total_reviews <= 25:
+            return False
+        try:
+            sort_selector = self.wait.until(
+                EC.presence_of_element_located((By.ID, "sort-by-selector"))
+            )
+            self.driver.execute_script("""
+                const select = arguments[0];
+                select.value = 'SUBMISSION_DATE';
+                select.dispatchEvent(new Event('change', { bubbles: true }));
+            """, sort_selector)
+            self.waiter.for_network_idle("sorted reviews")
+            logger.info(f"{movie_id} - Sorted reviews by submission date")
+            return True
+        except Exception as e:
+            logger.warning(f"{movie_id} - Failed to sort reviews by submission date: {e}")
+            return False
+
+
+    def _harvest_loaded_reviews(self, movie_id):
+        """
+        Extract the reviews displayed and not harvested yet, then empty them to free the browser memory
+        """
+        rows = self.driver.execute_script("""
+            // Same extraction as parse_reviews: text nodes stripped and joined
+            const texts = (element, separator) => {
+                if (!element) { return null; }
+                const walker = document.createTreeWalker(element, NodeFilter.SHOW_TEXT);
+                const parts = [];
+                while (walker.nextNode()) {
+                    const text = walker.currentNode.textContent.trim();
+                    if (text) { parts.push(text); }
+                }
+                return parts.join(separator);
+            };
+            const rows = [];
+            document.querySelectorAll(arguments[0]).forEach(article => {
+                const permalink = article.querySelector('a.ipc-link.ipc-link--base[data-testid="permalink-link"]');
+                const match = permalink ? permalink.getAttribute('href').match(/\\/(rw\\d+)/) : null;
+                const title = article.querySelector('div.ipc-title h3.ipc-title__text');
+                const text = article.querySelector('div.ipc-html-content-inner-div');
+                const upvotes = article.querySelector('span.ipc-voting__label__count--up');
+                const downvotes = article.querySelector('span.ipc-voting__label__count--down');
+                const maxRating = article.querySelector('span.ipc-rating-star--maxRating');
+                const previous = maxRating ? maxRating.previousSibling : null;
+                const rating = !previous ? null : previous.nodeType === Node.TEXT_NODE ? previous.textContent.trim() : texts(previous, '');
+                rows.push([
+                    match ? match[1] : null,
+                    texts(article.querySelector('a.ipc-link.ipc-link--base[data-testid="author-link"]'), ''),
+                    texts(title, ''),
+                    texts(text, '\\n'),
+                    rating,
+                    texts(article.querySelector('li.review-date'), ''),
+                    upvotes ? texts(upvotes, '') : 0,
+                    downvotes ? texts(downvotes, '') : 0,
+                ]);
+                article.setAttribute('data-harvested', 'true');
+                article.replaceChildren();
+            });
+            return rows;
+        """, UNHARVESTED_SELECTOR)
+
+        last_update = datetime.now().strftime("%Y%m%d_%H%M%S")
+        data = [[movie_id, *row, last_update] for row in rows]
+        return pd.DataFrame(data, columns=REVIEW_COLUMNS)
+
+
+    def iter_reviews(self, movie_id, total_reviews, skip=0):
+        """
+        Scrape all the reviews of a movie by batches, as they are loaded by scrolling.
+        Harvested reviews are emptied from the page, so that the browser memory stays constant.
+
+        :param skip: Number of reviews already harvested by a previous run, which are not returned again
+        :return: Generator of DataFrames with the same columns as get_reviews
+        """
+        # Reviews are emptied as they are harvested, so the pages loaded are not archived in this mode
+        self._open_reviews(movie_id, total_reviews)
 
         if total_reviews > 25:
-            # Display last published reviews first
+            # Click the button to display all reviews, using JavaScript to avoid interception issues
             try:
-                sort_selector = self.wait.until(
-                    EC.presence_of_element_located((By.ID, "sort-by-selector"))
+                all_button = self.wait.until(
+                    EC.element_to_be_clickable((By.XPATH, ALL_BUTTON))
                 )
-                self.driver.execute_script("""
-                    const select = arguments[0];
-                    select.value = 'SUBMISSION_DATE';
-                    select.dispatchEvent(new Event('change', { bubbles: true }));
-                """, sort_selector)
-                logger.info(f"{movie_id} - Sorted reviews by submission date")
+                self.driver.execute_script("arguments[0].click();", all_button)
+                logger.info(f"{movie_id} - Clicking the button to display all reviews")
             except Exception as e:
-                logger.warning(f"{movie_id} - Failed to sort reviews by submission date: {e}")
-            
+                logger.warning(f"{movie_id} - Button for displaying all reviews not found or not clickable: {e}")
+
+        harvested = 0
+        more_clicked = False
+        while True:
+            reviews_df = self._harvest_loaded_reviews(movie_id)
+            if skip > 0:
+                skipped = min(skip, len(reviews_df))
+                reviews_df = reviews_df.iloc[skipped:].reset_index(drop=True)
+                harvested += skipped
+                skip -= skipped
+            if len(reviews_df) > 0:
+                harvested += len(reviews_df)
+                logger.info(f"{movie_id} - Harvested {harvested} reviews")
+                yield reviews_df
+
+            # Scroll down to load the next batch
+            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            if self.waiter.for_count_stable(UNHARVESTED_SELECTOR, "reviews after scrolling", timeout=self.scroll_timeout) is not None:
+                continue
+
+            # Click the button to display remaining reviews, once scrolling loads nothing more
+            more_button = None if more_clicked else self.waiter.for_element(By.XPATH, MORE_BUTTON, "more button", timeout=self.scroll_timeout)
+            if more_button is None:
+                break
+            self.driver.execute_script("arguments[0].click();", more_button)
+            more_clicked = True
+            logger.info(f"{movie_id} - Clicking the button to display last reviews")
+            self.waiter.for_count_stable(UNHARVESTED_SELECTOR, "last reviews")
+
+        logger.info(f"{movie_id} - Extracted {harvested} reviews")
+
+
+    def get_reviews(self, movie_id, total_reviews, known_ids=None, since=None):
+        """
+        Scrape the reviews of a movie
+
+        :param known_ids: Identifiers of the reviews already stored; if provided, only new reviews are loaded and returned
+        :param since: Date of the newest review already stored, used as well to stop loading
+        """
+        incremental = bool(known_ids) or since is not None
+        known_ids = set(known_ids or [])
+        sorted_by_date = self._open_reviews(movie_id, total_reviews)
+
+        if total_reviews > 25 and incremental and sorted_by_date:
+            # Only display reviews published since the last scrape
+            self._load_until_known(movie_id, known_ids, since)
+
+        elif total_reviews > 25:
+            if incremental:
+                logger.warning(f"{movie_id} - Reviews not sorted by date, loading all of them")
+
             # Click the button to display all reviews, using JavaScript to avoid interception issues
             try:
                 all_button = self.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, '//span[contains(@class, "ipc-see-more")]//button[.//span[contains(text(), "All")]]'))
+                    EC.element_to_be_clickable((By.XPATH, ALL_BUTTON))
                 )
                 self.driver.execute_script("arguments[0].click();", all_button)
                 logger.info(f"{movie_id} - Clicking the button to display all reviews")
@@ -167,108 +697,48 @@ class IMDb:
                 logger.warning(f"{movie_id} - Button for displaying all reviews not found or not clickable: {e}")
 
             # Scroll down to compensate for lazy loading
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
+            loaded = self._count_reviews()
             while True:
                 self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                logger.debug(f"{movie_id} - Scrolling down...")
-                time.sleep(2)  # Give time for new reviews to load
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
+                logger.debug(f"{movie_id} - Scrolling down ({loaded} reviews loaded)...")
+                new_loaded = self.waiter.for_count_stable(REVIEW_SELECTOR, "reviews after scrolling", above=loaded, timeout=self.scroll_timeout)
+                if new_loaded is None:
                     break  # Stop when no new content loads
-                last_height = new_height
+                loaded = new_loaded
 
             # Click the button to display remaining reviews
             try:
                 all_button = self.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, '//span[contains(@class, "ipc-see-more")]//button[.//span[contains(text(), "more")]]'))
+                    EC.element_to_be_clickable((By.XPATH, MORE_BUTTON))
                 )
                 self.driver.execute_script("arguments[0].click();", all_button)
                 logger.info(f"{movie_id} - Clicking the button to display last reviews")
-                time.sleep(5)  # Give time for last reviews to load
+                self.waiter.for_count_stable(REVIEW_SELECTOR, "last reviews", above=self._count_reviews())
             except Exception:
                 logger.warning(f"{movie_id} - Button for displaying last reviews not found or not clickable")
         
-        # Loop through each review and extract information
-        soup = BeautifulSoup(self.driver.page_source, "html.parser")
-        reviews = soup.find_all("article", class_="user-review-item")
-        data = []
-        for review in reviews:
-            try:
-                # 1. Extract the review identifier
-                permalink_tag = review.find("a", class_="ipc-link ipc-link--base", attrs={"data-testid": "permalink-link"})
-                review_id = None
-                if permalink_tag:
-                    identifier_match = re.search(r"/(rw\d+)", permalink_tag["href"])
-                    if identifier_match:
-                        review_id = identifier_match.group(1)
-
-                # 2. Extract the review date
-                date_tag = review.find("li", class_="ipc-inline-list__item review-date")
-                review_date = date_tag.get_text(strip=True) if date_tag else None
-
-                # 3. Extract the review author
-                author_tag = review.find("a", class_="ipc-link ipc-link--base", attrs={"data-testid": "author-link"})
-                author_name = author_tag.get_text(strip=True) if author_tag else None
-
-                # 4. Extract the upvotes and downvotes
-                upvotes_tag = review.find("span", class_="ipc-voting__label__count--up")
-                downvotes_tag = review.find("span", class_="ipc-voting__label__count--down")
-                upvotes = upvotes_tag.get_text(strip=True) if upvotes_tag else 0
-                downvotes = downvotes_tag.get_text(strip=True) if downvotes_tag else 0
-
-                # 5. Extract the review text
-                review_tag = review.find("div", class_="ipc-html-content-inner-div")
-                review_text = review_tag.get_text(separator="\n", strip=True) if review_tag else None
-
-                # 6. Extract the review title
-                title_container = review.find("div", class_="ipc-title")
-                review_title = None
-                if title_container:
-                    title_tag = title_container.find("h3", class_="ipc-title__text")
-                    review_title = title_tag.get_text(strip=True) if title_tag else None
-
-                # 7. Extract the rating
-                rating_tag = review.find("span", class_="ipc-rating-star--maxRating")
-                rating = None
-                if rating_tag and rating_tag.previous_sibling:
-                    rating = rating_tag.previous_sibling.get_text(strip=True)
-
-                # 8. Append data to the list
-                data.append({
-                    "movie_id": movie_id,
-                    "review_id": review_id,
-                    "author": author_name,
-                    "title": review_title,
-                    "text": review_text,
-                    "rating": rating,
-                    "date": review_date,
-                    "upvotes": upvotes,
-                    "downvotes": downvotes,
-                    "last_update": datetime.now().strftime("%Y%m%d_%H%M%S")
-                })
-            except Exception as e:
-                logger.error(f"{movie_id} - Failed to extract data for a review: {e}")
-                continue
-
-        # Create a dataframe from the collected data
-        reviews_df = pd.DataFrame(data)
-        logger.info(f"{movie_id} - Extracted {len(reviews_df)} reviews")
-        return reviews_df
+        # Extract information from each review
+        html = self.driver.page_source
+        archive_page(self.archive, html, movie_id, "reviews_listing")
+        reviews_df = parse_reviews(html, movie_id, backend=self.parser)
+        return keep_new_reviews(reviews_df, movie_id, known_ids, since)
 
 
     def get_spoiler(self, review_id, movie_id):
         # Load review page
-        self.driver.get(f"https://www.imdb.com/review/{review_id}/")
-        time.sleep(2)  # Allow page to load
+        self._load(f"https://www.imdb.com/review/{review_id}/")
 
         try:
             # Locate the spoiler button and click it
-            spoiler_button = self.driver.find_element(By.XPATH, '//div[@class="expander-icon-wrapper spoiler-warning__control"]')
+            spoiler_button = self.waiter.for_element(By.XPATH, '//div[@class="expander-icon-wrapper spoiler-warning__control"]', "spoiler button")
+            if spoiler_button is None:
+                raise LookupError("spoiler button not found")
             self.driver.execute_script("arguments[0].click();", spoiler_button)
             # Wait for the text to become visible after clicking the spoiler button
-            time.sleep(1)
-            text_element = self.driver.find_element(By.XPATH, '//div[@class="text show-more__control"]')
-            text = text_element.text.strip()
+            text = self.waiter.until(
+                lambda driver: driver.find_element(By.XPATH, '//div[@class="text show-more__control"]').text.strip(),
+                "spoiler text")
+            self._archive_page(movie_id, "review", review_id)
             return text
         except Exception as e:
             logger.error(f"{movie_id} - Failed to unspoil review {review_id}: {e}")
@@ -277,14 +747,16 @@ class IMDb:
 
     def get_votes(self, review_id, movie_id):
         # Load review page
-        self.driver.get(f"https://www.imdb.com/review/{review_id}/")
-        time.sleep(2)  # Allow page to load
+        self._load(f"https://www.imdb.com/review/{review_id}/")
         logger.debug(f"{movie_id} - Getting exact votes for review #{review_id}")
 
         # Extract votes
         try:
-            votes_element = self.driver.find_element(By.XPATH, '//div[@class="actions text-muted"]')
+            votes_element = self.waiter.for_element(By.XPATH, '//div[@class="actions text-muted"]', "votes")
+            if votes_element is None:
+                raise LookupError("votes not found")
             votes_text = votes_element.text.strip()
+            self._archive_page(movie_id, "review", review_id)
             votes_match = re.search(r'([\d,]+) out of ([\d,]+)', votes_text)
             if votes_match:
                 upvotes = int(votes_match.group(1).replace(',', ''))
@@ -295,3 +767,372 @@ class IMDb:
         except Exception as e:
             logger.error(f"{movie_id} - Failed to get exact votes for review {review_id}: {e}")
             return None
+
+
+def is_throttling(response):
+    """
+    Check whether a failed response means that IMDb is slowing down or blocking requests
+    """
+    return response.status_code in (403, 429) or response.status_code >= 500
+
+
+def _next_data(soup):
+    """
+    Load the JSON payload embedded by IMDb in server-rendered pages
+    """
+    script = soup.find("script", id="__NEXT_DATA__")
+    if script is None or not script.string:
+        return None
+    try:
+        return json.loads(script.string)
+    except ValueError:
+        return None
+
+
+def _find_key(payload, key):
+    """
+    Return the first value stored under a given key in a nested JSON payload
+    """
+    if isinstance(payload, dict):
+        if key in payload:
+            return payload[key]
+        values = payload.values()
+    elif isinstance(payload, list):
+        values = payload
+    else:
+        return None
+    for value in values:
+        found = _find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+def parse_movie(html):
+    """
+    Extract title, release date and cover URL from the main page of a movie
+
+    :param html: Source of https://www.imdb.com/title/<movie_id>
+    :return: Tuple (title, release_date, cover_url), or None if the page cannot be parsed
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Server-rendered markup, with the same selectors as the browser
+    title_tag = soup.find("span", attrs={"data-testid": "hero__primary-text"})
+    movie_title = title_tag.get_text(strip=True) if title_tag else None
+
+    release_date = None
+    release_item = soup.find("li", attrs={"data-testid": "title-details-releasedate"})
+    if release_item:
+        release_tag = release_item.find("a", class_="ipc-metadata-list-item__list-content-item--link")
+        if release_tag:
+            release_date = release_tag.get_text(strip=True).split(" (")[0].strip()
+
+    cover_url = None
+    cover_container = soup.find("div", class_="ipc-poster__poster-image")
+    if cover_container:
+        cover_tag = cover_container.find("img", class_="ipc-image")
+        cover_url = cover_tag.get("src") if cover_tag else None
+
+    # Embedded JSON for whatever the markup did not provide
+    if movie_title is None or release_date is None or cover_url is None:
+        payload = _next_data(soup)
+        if payload is not None:
+            if movie_title is None:
+                title_text = _find_key(payload, "titleText")
+                if isinstance(title_text, dict):
+                    movie_title = title_text.get("text")
+            if release_date is None:
+                date = _find_key(payload, "releaseDate")
+                if isinstance(date, dict) and date.get("year") and date.get("month") and date.get("day"):
+                    release = datetime(date["year"], date["month"], date["day"])
+                    release_date = f"{release:%B} {release.day}, {release.year}"
+            if cover_url is None:
+                image = _find_key(payload, "primaryImage")
+                if isinstance(image, dict):
+                    cover_url = image.get("url")
+
+    if not movie_title or not release_date:
+        return None
+    return movie_title, release_date, cover_url
+
+
+def parse_number_of_reviews(html):
+    """
+    Extract the total number of reviews from the reviews page of a movie
+
+    :param html: Source of https://www.imdb.com/title/<movie_id>/reviews
+    :return: Number of reviews, or None if the page cannot be parsed
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    reviews_tag = soup.find("div", attrs={"data-testid": "tturv-total-reviews"})
+    if reviews_tag:
+        reviews_match = re.search(r"([\d,]+) reviews?", reviews_tag.get_text(" ", strip=True))
+        if reviews_match:
+            return int(reviews_match.group(1).replace(",", ""))
+
+    payload = _next_data(soup)
+    if payload is not None:
+        reviews = _find_key(payload, "reviews")
+        if isinstance(reviews, dict) and isinstance(reviews.get("total"), int):
+            return reviews["total"]
+
+    return None
+
+
+class IMDbHTTP:
+    """
+    Browserless scraper for the data available in the server-rendered pages.
+    Methods return the same values as their IMDb counterparts, or None when
+    fetching (including while requests to IMDb are paused) or parsing fails,
+    so that the caller can fall back to the browser.
+    """
+    def __init__(self, base_url="https://www.imdb.com", timeout=15, throttle=None, archive=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.throttle = throttle or get_imdb_throttle()
+        self.archive = archive
+        self.session = None
+
+
+    def __enter__(self):
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept-Language": "en-US,en;q=0.9"})
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.session:
+            self.session.close()
+        return False
+
+
+    def _fetch(self, path, movie_id, kind):
+        try:
+            self.throttle.acquire()
+            response = self.session.get(f"{self.base_url}{path}", timeout=self.timeout)
+            if response.status_code != 200:
+                logger.warning(f"{movie_id} - Failed to fetch {path}, status code: {response.status_code}")
+                if is_throttling(response):
+                    self.throttle.failure()
+                return None
+            archive_page(self.archive, response.text, movie_id, kind)
+            return response.text
+        except CircuitOpenError as e:
+            logger.warning(f"{movie_id} - Not fetching {path}: {e}")
+            return None
+        except requests.RequestException as e:
+            logger.warning(f"{movie_id} - Failed to fetch {path}: {e}")
+            self.throttle.failure()
+            return None
+
+
+    def get_movie(self, movie_id):
+        html = self._fetch(f"/title/{movie_id}/", movie_id, "title")
+        if html is None:
+            return None
+
+        movie = parse_movie(html)
+        if movie is None:
+            logger.warning(f"{movie_id} - Could not parse metadata from the main page")
+            return None
+
+        movie_title, release_date, cover_url = movie
+        logger.info(f"{movie_id} - Movie title: {movie_title}")
+        logger.info(f"{movie_id} - Release date: {release_date}")
+        if cover_url:
+            download_cover(movie_id, cover_url)
+        else:
+            logger.warning(f"{movie_id} - Cover not found on the main page")
+        return movie_title, release_date
+
+
+    def get_number_of_reviews(self, movie_id):
+        html = self._fetch(f"/title/{movie_id}/reviews/", movie_id, "reviews_count")
+        if html is None:
+            return None
+
+        total_reviews = parse_number_of_reviews(html)
+        if total_reviews is None:
+            logger.warning(f"{movie_id} - Could not parse review count from the reviews page")
+            return None
+        logger.info(f"{movie_id} - Reviews: {total_reviews}")
+        return total_reviews
+
+
+def parse_review_page(html):
+    """
+    Extract the full text and the exact votes from an individual review page
+
+    :param html: Source of https://www.imdb.com/review/<review_id>/
+    :return: Tuple (text, upvotes, downvotes), with None for values that cannot be parsed
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    # The text is in the markup even when hidden behind a spoiler warning
+    text_tag = soup.find("div", class_="show-more__control") or soup.find("div", class_="ipc-html-content-inner-div")
+    text = text_tag.get_text(separator="\n", strip=True) if text_tag else None
+
+    upvotes, downvotes = None, None
+    votes_tag = soup.find("div", class_="actions")
+    votes_match = re.search(r"([\d,]+) out of ([\d,]+)", votes_tag.get_text(" ", strip=True)) if votes_tag else None
+    if votes_match:
+        upvotes = int(votes_match.group(1).replace(",", ""))
+        downvotes = int(votes_match.group(2).replace(",", "")) - upvotes
+    else:
+        upvotes_tag = soup.find("span", class_="ipc-voting__label__count--up")
+        downvotes_tag = soup.find("span", class_="ipc-voting__label__count--down")
+        counts = [tag.get_text(strip=True).replace(",", "") if tag else "0" for tag in (upvotes_tag, downvotes_tag)]
+        if (upvotes_tag or downvotes_tag) and all(count.isdigit() for count in counts):
+            upvotes, downvotes = int(counts[0]), int(counts[1])
+
+    return text or None, upvotes, downvotes
+
+
+class ReviewPageFetcher:
+    """
+    Fetch individual review pages concurrently, without a browser, to get
+    the text hidden behind spoiler warnings and the exact vote counts.
+    """
+    def __init__(self, base_url="https://www.imdb.com", max_workers=4, timeout=15, throttle=None, archive=None):
+        """
+        :param max_workers: Maximum number of pages fetched at the same time
+        :param throttle: SharedThrottle applied to requests (default: the one shared by all IMDb scrapers)
+        :param archive: Optional PageArchive in which the pages fetched are stored
+        """
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.throttle = throttle or get_imdb_throttle()
+        self.archive = archive
+        self.timeout = timeout
+        self._local = threading.local()
+        self._sessions = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for session in self._sessions:
+            session.close()
+        return False
+
+
+    def _session(self):
+        # Sessions are not shared between threads
+        if not hasattr(self._local, "session"):
+            session = requests.Session()
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept-Language": "en-US,en;q=0.9"})
+            self._local.session = session
+            self._sessions.append(session)
+        return self._local.session
+
+
+    def _fetch_one(self, review_id, movie_id):
+        try:
+            self.throttle.acquire()
+            response = self._session().get(f"{self.base_url}/review/{review_id}/", timeout=self.timeout)
+            if response.status_code != 200:
+                logger.warning(f"{movie_id} - Failed to fetch review {review_id}, status code: {response.status_code}")
+                if is_throttling(response):
+                    self.throttle.failure()
+                return None
+            archive_page(self.archive, response.text, movie_id, "review", review_id)
+            return parse_review_page(response.text)
+        except CircuitOpenError as e:
+            logger.debug(f"{movie_id} - Not fetching review {review_id}: {e}")
+            return None
+        except requests.RequestException as e:
+            logger.warning(f"{movie_id} - Failed to fetch review {review_id}: {e}")
+            self.throttle.failure()
+            return None
+
+
+    def fetch(self, review_ids, movie_id):
+        """
+        Fetch each review page once
+
+        :param review_ids: Identifiers of the reviews
+        :return: Dictionary mapping each review identifier to (text, upvotes, downvotes), or None if the page could not be fetched,
+                 e.g. while requests to IMDb are paused
+        """
+        review_ids = list(dict.fromkeys(review_ids))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = list(executor.map(lambda review_id: self._fetch_one(review_id, movie_id), review_ids))
+        resolved = sum(page is not None for page in pages)
+        logger.info(f"{movie_id} - Fetched {resolved}/{len(review_ids)} review pages")
+        return dict(zip(review_ids, pages))
+
+
+class IMDbReplay:
+    """
+    Scraper serving the pages stored in a PageArchive, without browser nor network.
+    Methods return the same values as their IMDb counterparts, so that
+    historical pages can be parsed again, e.g. after a change of IMDb markup.
+    """
+    def __init__(self, archive, parser=DEFAULT_PARSER, before=None):
+        """
+        :param archive: PageArchive to read pages from
+        :param parser: Backend used to parse the reviews page, among REVIEW_PARSERS
+        :param before: Timestamp after which archived pages are ignored, to replay a past scrape
+        """
+        self.archive = archive
+        self.parser = parser
+        self.before = before
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+    def _page(self, movie_id, kind, review_id=None):
+        entry = self.archive.find(movie_id, kind, review_id, before=self.before)
+        if entry is None:
+            logger.warning(f"{movie_id} - No archived {kind} page {review_id or ''}")
+            return None
+        return self.archive.load(entry)
+
+
+    def get_movie(self, movie_id):
+        html = self._page(movie_id, "title")
+        movie = parse_movie(html) if html is not None else None
+        if movie is None:
+            return None
+        movie_title, release_date, _ = movie
+        return movie_title, release_date
+
+
+    def get_number_of_reviews(self, movie_id):
+        html = self._page(movie_id, "reviews_count")
+        return parse_number_of_reviews(html) if html is not None else None
+
+
+    def get_reviews(self, movie_id, total_reviews, known_ids=None, since=None):
+        html = self._page(movie_id, "reviews_listing")
+        if html is None:
+            return pd.DataFrame(columns=REVIEW_COLUMNS)
+        reviews_df = parse_reviews(html, movie_id, backend=self.parser)
+        return keep_new_reviews(reviews_df, movie_id, known_ids, since)
+
+
+    def get_spoiler(self, review_id, movie_id):
+        html = self._page(movie_id, "review", review_id)
+        return parse_review_page(html)[0] if html is not None else None
+
+
+    def get_votes(self, review_id, movie_id):
+        html = self._page(movie_id, "review", review_id)
+        if html is None:
+            return None
+        _, upvotes, downvotes = parse_review_page(html)
+        return (upvotes, downvotes) if upvotes is not None else None
@@ -0,0 +1,122 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:  # Optional, pages are compressed with gzip instead
+    zstandard = None
+
+from src.utils.logger import get_backend_logger
+
+logger = get_backend_logger()
+
+PAGE_KINDS = ("title", "reviews_count", "reviews_listing", "review")
+
+
+class PageArchive:
+    def __init__(self, directory=os.path.join('data', 'archive')):
+        """
+        Store the raw pages fetched from IMDb, so that they can be parsed again without scraping
+
+        Pages are compressed and stored once per content, under their SHA-256 digest.
+        Each fetch is recorded in an index, with the movie, the review and the time.
+
+        :param directory: Directory of the archive
+        """
+        self.directory = directory
+        self.objects_path = os.path.join(directory, 'objects')
+        self.index_path = os.path.join(directory, 'index.jsonl')
+        self._lock = threading.Lock()
+
+
+    def _object_path(self, digest, codec):
+        return os.path.join(self.objects_path, digest[:2], f"{digest}.html.{codec}")
+
+
+    def store(self, html, movie_id, kind, review_id=None):
+        """
+        Archive a page
+
+        :param kind: Type of page, among PAGE_KINDS (movie main page, reviews page loaded for the count only,
+                     reviews page with all the reviews listed, or individual review page)
+        :return: Digest of the page
+        """
+        if kind not in PAGE_KINDS:
+            raise ValueError(f"Unknown page kind: {kind}")
+        content = html.encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        codec = 'zst' if zstandard else 'gz'
+
+        path = self._object_path(digest, codec)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zstandard.ZstdCompressor(level=10).compress(content) if codec == 'zst' else gzip.compress(content)
+            # Write to a temporary file first, so that a page is never read half-written
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+
+        entry = {'digest': digest, 'codec': codec, 'movie_id': movie_id, 'review_id': review_id,
+                 'kind': kind, 'size': len(content), 'archived_at': time.time()}
+        with self._lock, open(self.index_path, 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(json.dumps(entry) + '\n')
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        logger.debug(f"{movie_id} - Archived {kind} page {review_id or ''} ({len(content) / 2**10:.0f} kB)")
+        return digest
+
+
+    def load(self, entry):
+        """
+        Read an archived page
+
+        :param entry: Index entry, as returned by entries() or find()
+        """
+        with open(self._object_path(entry['digest'], entry['codec']), 'rb') as f:
+            compressed = f.read()
+        if entry['codec'] == 'zst':
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this page (pip install zstandard)")
+            content = zstandard.ZstdDecompressor().decompress(compressed)
+        else:
+            content = gzip.decompress(compressed)
+        return content.decode('utf-8')
+
+
+    def entries(self, movie_id=None, kind=None, review_id=None, before=None):
+        """
+        List the archived pages, from the oldest to the newest
+
+        :param before: Timestamp after which pages are ignored, to replay a past state
+        """
+        if not os.path.isfile(self.index_path):
+            return
+        with open(self.index_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Line being written by another process
+                if ((movie_id is None or entry['movie_id'] == movie_id)
+                        and (kind is None or entry['kind'] == kind)
+                        and (review_id is None or entry['review_id'] == review_id)
+                        and (before is None or entry['archived_at'] <= before)):
+                    yield entry
+
+
+    def find(self, movie_id, kind, review_id=None, before=None):
+        """
+        Return the index entry of the last page archived, or None
+        """
+        last = None
+        for last in self.entries(movie_id, kind, review_id, before):
+            pass
+        return last
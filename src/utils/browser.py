@@ -0,0 +1,197 @@
+import atexit
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from src.utils.logger import get_backend_logger
+
+logger = get_backend_logger()
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.51 Safari/537.36"
+
+# Only the DOM text is read, so images, fonts, media, ads and trackers can be dropped
+THIRD_PARTY_DOMAINS = [
+    "*doubleclick.net*", "*googlesyndication.com*", "*googletagmanager.com*", "*google-analytics.com*",
+    "*amazon-adsystem.com*", "*adsrvr.org*", "*scorecardresearch.com*", "*facebook.net*",
+    "*quantserve.com*", "*criteo.com*", "*moatads.com*", "*fls-na.amazon.com*", "*unagi.amazon.com*"]
+MEDIA_PATTERNS = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.ico", "*.mp4", "*.webm", "*.m3u8", "*.woff", "*.woff2", "*.ttf", "*.otf"]
+BLOCKING_PROFILES = {
+    "none": {"images": False, "urls": []},
+    "lean": {"images": True, "urls": MEDIA_PATTERNS + THIRD_PARTY_DOMAINS},
+    "strict": {"images": True, "urls": MEDIA_PATTERNS + THIRD_PARTY_DOMAINS + ["*.css"]},
+}
+
+
+class BrowserSession:
+    def __init__(self, blocking=None):
+        """
+        Launch a headless Chrome with a temporary profile directory
+
+        :param blocking: Name of the profile in BLOCKING_PROFILES used to drop unneeded requests
+        """
+        blocking = blocking or os.getenv("BROWSER_BLOCKING", "lean")
+        profile = BLOCKING_PROFILES[blocking]
+        self.profile_dir = tempfile.mkdtemp()
+        os.chmod(self.profile_dir, 0o777)
+        logger.debug(f"Chrome user-data-dir: {self.profile_dir}")
+
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+        chrome_options.add_argument(f"user-agent={USER_AGENT}")
+        chrome_options.add_argument(f"--user-data-dir={self.profile_dir}")
+        if profile["images"]:
+            chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        # Network events are used to measure transferred bytes and blocked requests
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+        try:
+            self.driver = webdriver.Chrome(options=chrome_options)
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            if profile["urls"]:
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile["urls"]})
+        except Exception:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            raise
+        self.pages = 0
+        self.failed = False
+        self.transferred_bytes = 0
+        self.blocked_requests = 0
+        logger.debug(f"Launching browser (blocking profile: {blocking})")
+
+
+    def page_stats(self):
+        """
+        Return the load time of the current page, and the bytes transferred and requests blocked since the last call
+        """
+        load_time = self.driver.execute_script("""
+            const navigation = performance.getEntriesByType('navigation')[0];
+            return navigation ? navigation.duration / 1000 : null;
+        """)
+        transferred_bytes, blocked_requests = 0, 0
+        for entry in self.driver.get_log("performance"):
+            event = json.loads(entry["message"])["message"]
+            if event["method"] == "Network.loadingFinished":
+                transferred_bytes += event["params"].get("encodedDataLength", 0)
+            elif event["method"] == "Network.loadingFailed" and event["params"].get("blockedReason"):
+                blocked_requests += 1
+        self.transferred_bytes += transferred_bytes
+        self.blocked_requests += blocked_requests
+        return load_time, transferred_bytes, blocked_requests
+
+
+    def is_alive(self):
+        """
+        Check that the browser still answers
+        """
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+
+    def close(self):
+        """
+        Close the browser and remove the temporary profile directory
+        """
+        try:
+            self.driver.quit()
+            logger.debug("Browser closed")
+        except WebDriverException as e:
+            logger.warning(f"Failed closing browser: {e}")
+
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        logger.debug(f"Temp directory ({self.profile_dir}) cleaned up")
+
+
+class BrowserPool:
+    def __init__(self, size=1, max_pages=100, blocking=None):
+        """
+        Keep warm browser sessions to be leased by scrapers
+
+        :param size: Maximum number of sessions leased at the same time
+        :param max_pages: Number of pages loaded before a session is recycled
+        :param blocking: Name of the profile in BLOCKING_PROFILES used by the sessions
+        """
+        self.size = size
+        self.max_pages = max_pages
+        self.blocking = blocking
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+
+    def lease(self):
+        """
+        Return an idle session, or launch a new one if none is available
+        """
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    session = self._idle.get_nowait()
+                except queue.Empty:
+                    return BrowserSession(blocking=self.blocking)
+                if session.is_alive():
+                    logger.debug(f"Reusing browser after {session.pages} pages")
+                    return session
+                logger.warning("Discarding unresponsive browser")
+                session.close()
+        except Exception:
+            self._slots.release()
+            raise
+
+
+    def release(self, session):
+        """
+        Give a session back to the pool, recycling it if it crashed or is worn out
+        """
+        try:
+            if self._closed or session.failed or session.pages >= self.max_pages:
+                reason = "after a failure" if session.failed else f"after {session.pages} pages"
+                logger.debug(f"Recycling browser {reason}")
+                session.close()
+            else:
+                self._idle.put(session)
+        finally:
+            self._slots.release()
+
+
+    def close(self):
+        """
+        Close all idle sessions
+        """
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """
+    Return the pool shared by all scrapers of the current process
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(
+                size=int(os.getenv("BROWSER_POOL_SIZE", 1)),
+                max_pages=int(os.getenv("BROWSER_MAX_PAGES", 100)))
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,75 @@
+import json
+import os
+import pandas as pd
+import shutil
+import time
+
+from src.utils.logger import get_backend_logger
+
+logger = get_backend_logger()
+
+
+class Checkpoint:
+    def __init__(self, movie_id, directory=os.path.join('data', 'checkpoints')):
+        """
+        Save the progress of a scrape on local disk, so that the next run can resume it
+
+        :param movie_id: Movie being scraped
+        :param directory: Directory in which checkpoints are stored, one subdirectory per movie
+        """
+        self.movie_id = movie_id
+        self.path = os.path.join(directory, movie_id)
+        self.state_path = os.path.join(self.path, 'state.json')
+        self.reviews_path = os.path.join(self.path, 'reviews.pkl')
+
+
+    def save(self, state, reviews_df=None):
+        """
+        Save the state of the scrape (e.g. mode and cursor) and, optionally, the reviews harvested so far
+
+        :param state: JSON-serializable dictionary
+        :param reviews_df: DataFrame of reviews, including the spoilers and votes already resolved
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # Write to temporary files first, so that an interruption never leaves a corrupted checkpoint
+            if reviews_df is not None:
+                reviews_df.to_pickle(self.reviews_path + '.tmp')
+                os.replace(self.reviews_path + '.tmp', self.reviews_path)
+            with open(self.state_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({**state, 'saved_at': time.time()}, f)
+            os.replace(self.state_path + '.tmp', self.state_path)
+            logger.debug(f"{self.movie_id} - Checkpoint saved")
+        except Exception as e:
+            logger.warning(f"{self.movie_id} - Failed saving checkpoint: {e}")
+
+
+    def load(self, max_age=None):
+        """
+        Load the last checkpoint
+
+        :param max_age: Age in seconds above which a checkpoint is discarded
+        :return: Tuple (state, reviews_df), with None values if there is no valid checkpoint
+        """
+        if not os.path.isfile(self.state_path):
+            return None, None
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            if max_age is not None and time.time() - state['saved_at'] > max_age:
+                logger.info(f"{self.movie_id} - Discarding outdated checkpoint")
+                self.clear()
+                return None, None
+            reviews_df = pd.read_pickle(self.reviews_path) if os.path.isfile(self.reviews_path) else None
+            return state, reviews_df
+        except Exception as e:
+            logger.warning(f"{self.movie_id} - Failed loading checkpoint: {e}")
+            self.clear()
+            return None, None
+
+
+    def clear(self):
+        """
+        Remove the checkpoint, once the scrape is complete
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
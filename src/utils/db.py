@@ -1,14 +1,108 @@
+import hashlib
 import os
 import pandas as pd
 import psycopg
+import threading
+import time
 
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 from psycopg import sql
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:  # Optional, a new connection is opened for each session instead
+    ConnectionPool = None
 from src.utils.logger import get_backend_logger
 
 logger = get_backend_logger()
 
+_pool = None
+_pool_pid = None
+_pool_settings = None
+_pool_lock = threading.Lock()
+_checkouts = {'count': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+
+REVIEWS_RAW_COLUMNS = ['movie_id', 'review_id', 'author', 'title', 'text', 'rating', 'date', 'upvotes', 'downvotes', 'last_update', 'to_process']
+
+
+class TransactionRolledBack(Exception):
+    """Raised when a statement of a transaction failed, and the whole transaction was rolled back."""
+
+
+def configure_pool(min_size=None, max_size=None, timeout=None, max_idle=None):
+    """
+    Enable the process-wide connection pool used by PostgreSQLDatabase sessions
+
+    Default values are read from the environment: DB_POOL_MIN_SIZE (1), DB_POOL_MAX_SIZE
+    (0, i.e. no pool), DB_POOL_TIMEOUT (30 seconds) and DB_POOL_MAX_IDLE (600 seconds).
+
+    :param max_size: Maximum number of connections, 0 to disable the pool
+    :param timeout: Maximum wait for a connection, in seconds
+    :param max_idle: Duration after which connections above min_size are closed, in seconds
+    """
+    global _pool, _pool_settings
+    load_dotenv()
+    settings = {
+        'min_size': min_size if min_size is not None else int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+        'max_size': max_size if max_size is not None else int(os.getenv('DB_POOL_MAX_SIZE', 0)),
+        'timeout': timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'max_idle': max_idle if max_idle is not None else float(os.getenv('DB_POOL_MAX_IDLE', 600))}
+    settings['min_size'] = min(settings['min_size'], settings['max_size'])
+    if settings['max_size'] > 0 and ConnectionPool is None:
+        logger.warning("psycopg_pool is not installed, database connections are not pooled (pip install psycopg_pool)")
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool, _pool_settings = None, settings
+
+
+def get_pool():
+    """
+    Return the connection pool of the current process, or None if pooling is disabled
+    """
+    global _pool, _pool_pid
+    if _pool_settings is None:
+        configure_pool()
+    if _pool_settings['max_size'] <= 0 or ConnectionPool is None:
+        return None
+    with _pool_lock:
+        # Connections cannot be shared with a parent process
+        if _pool is None or _pool_pid != os.getpid():
+            params = PostgreSQLDatabase().connection_params
+            pool_kwargs = {'check': ConnectionPool.check_connection} if hasattr(ConnectionPool, 'check_connection') else {}
+            _pool = ConnectionPool(
+                kwargs=params,
+                min_size=_pool_settings['min_size'],
+                max_size=_pool_settings['max_size'],
+                timeout=_pool_settings['timeout'],
+                max_idle=_pool_settings['max_idle'],
+                name='imdb',
+                open=True,
+                **pool_kwargs)
+            _pool_pid = os.getpid()
+            logger.debug(f"Opened a pool of {_pool_settings['min_size']} to {_pool_settings['max_size']} database connections")
+        return _pool
+
+
+def pool_metrics():
+    """
+    Return the state of the connection pool and the time spent waiting for connections, or None if pooling is disabled
+    """
+    pool = _pool if _pool_pid == os.getpid() else None
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        'size': stats.get('pool_size', 0),
+        'available': stats.get('pool_available', 0),
+        'checked_out': stats.get('pool_size', 0) - stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'checkouts': _checkouts['count'],
+        'wait_seconds': _checkouts['wait_seconds'],
+        'max_wait_seconds': _checkouts['max_wait_seconds'],
+        'errors': stats.get('connections_errors', 0) + stats.get('requests_errors', 0)}
+
 
 class PostgreSQLDatabase:
     def __init__(self, admin=False):
@@ -23,18 +117,35 @@ class PostgreSQLDatabase:
             'host': os.getenv('DB_HOST'),
             'port': 5432
         }
+        self.admin = admin
+        self.pool = None
         self.connection = None
         self.cursor = None
+        self.round_trips = 0  # Statements and commits sent to the server since the connection was opened
+        self._in_transaction = False
+        self._transaction_failed = False
+        self._sentiment_columns = None
 
 
     def __enter__(self):
         """
-        Establish a connection to the PostgreSQL database
+        Borrow a connection from the pool if enabled (see configure_pool), or establish a new one
         """
         try:
-            self.connection = psycopg.connect(**self.connection_params)
+            self.pool = None if self.admin else get_pool()
+            if self.pool is not None:
+                start = time.perf_counter()
+                self.connection = self.pool.getconn()
+                wait = time.perf_counter() - start
+                with _pool_lock:
+                    _checkouts['count'] += 1
+                    _checkouts['wait_seconds'] += wait
+                    _checkouts['max_wait_seconds'] = max(_checkouts['max_wait_seconds'], wait)
+                logger.debug(f"Borrowed a connection to {self.connection_params['host']} after {wait * 1000:.0f} ms")
+            else:
+                self.connection = psycopg.connect(**self.connection_params)
+                logger.debug(f"Successfully connected to {self.connection_params['host']}")
             self.cursor = self.connection.cursor()
-            logger.debug(f"Successfully connected to {self.connection_params['host']}")
             return self
         except (Exception, psycopg.Error) as error:
             logger.error(f"Failed connecting to {self.connection_params['host']}: {error}")
@@ -43,13 +154,80 @@ class PostgreSQLDatabase:
 
     def __exit__(self, exc_type, exc_value, traceback):
         """
-        Close database connection and cursor
+        Close the cursor, then give the connection back to the pool or close it
         """
         if self.cursor:
             self.cursor.close()
-        if self.connection:
+        if self.connection and self.pool is not None:
+            if self.connection.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+                self.connection.rollback()  # Uncommitted statements are never left to the next session
+            self.pool.putconn(self.connection)
+            logger.debug(f"Database connection returned to the pool after {self.round_trips} round trips")
+        elif self.connection:
             self.connection.close()
-        logger.debug("Database connection closed")
+            logger.debug(f"Database connection closed after {self.round_trips} round trips")
+
+
+    def _execute(self, query, params=None):
+        if self._transaction_failed:
+            raise psycopg.errors.InFailedSqlTransaction("A previous statement of the transaction failed")
+        self.round_trips += 1
+        self.cursor.execute(query, params)
+
+
+    def _executemany(self, query, data):
+        # Rows are pipelined by psycopg, so that the batch costs a single round trip
+        if self._transaction_failed:
+            raise psycopg.errors.InFailedSqlTransaction("A previous statement of the transaction failed")
+        self.round_trips += 1
+        self.cursor.executemany(query, data)
+
+
+    def _commit(self):
+        # Within transaction(), writes are committed together when the block ends
+        if not self._in_transaction:
+            self.round_trips += 1
+            self.connection.commit()
+
+
+    def _rollback(self):
+        if self._in_transaction:
+            self._transaction_failed = True  # The following statements of the transaction are not sent
+        self.round_trips += 1
+        self.connection.rollback()
+
+
+    def _fetch(self, query, params=None, one=False):
+        # Reads end the transaction they opened, so that the connection is not left idle in transaction
+        self._execute(query, params)
+        rows = self.cursor.fetchone() if one else self.cursor.fetchall()
+        self._commit()
+        return rows
+
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group the writes of the block into a single transaction, committed when the block ends.
+        If a statement fails, the following ones are not sent and the whole transaction is rolled back.
+
+        :raises TransactionRolledBack: When the block ends, if a statement failed
+        """
+        self._in_transaction, self._transaction_failed = True, False
+        try:
+            yield self
+        except Exception:
+            self._in_transaction = False
+            self._rollback()
+            raise
+        else:
+            self._in_transaction = False
+            if self._transaction_failed:
+                raise TransactionRolledBack("A statement failed, the transaction was rolled back")
+            else:
+                self._commit()
+        finally:
+            self._in_transaction, self._transaction_failed = False, False
 
 
 ######################################
@@ -68,10 +246,10 @@ class PostgreSQLDatabase:
                     WHERE table_name = %s
                 )
             """)
-            self.cursor.execute(check_query, (table_name,))
-            return self.cursor.fetchone()[0]
+            exists = self._fetch(check_query, (table_name,), one=True)[0]
+            return exists
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             logger.error(f"Failed checking if {table_name} exists: {error}")
             return False
 
@@ -91,11 +269,11 @@ class PostgreSQLDatabase:
                         sql.Identifier(col_name),
                         sql.SQL(col_type)
                     ) for col_name, col_type in columns.items()))
-            self.cursor.execute(create_table_query)
-            self.connection.commit()
+            self._execute(create_table_query)
+            self._commit()
             logger.info(f"Table {table_name} created successfully")
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             logger.error(f"Failed creating table: {error}")
 
 
@@ -106,11 +284,11 @@ class PostgreSQLDatabase:
         try:
             drop_table_query = sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(
                 sql.Identifier(table_name))
-            self.cursor.execute(drop_table_query)
-            self.connection.commit()
+            self._execute(drop_table_query)
+            self._commit()
             logger.info(f"Table {table_name} dropped successfully")
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             logger.error(f"Failed dropping table: {error}")
 
 
@@ -128,7 +306,7 @@ class PostgreSQLDatabase:
             backup_path = os.path.join(backup_dir, backup_filename)
             # Fetch all data from the table
             query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(table_name))
-            self.cursor.execute(query)
+            self._execute(query)
             column_names = [desc[0] for desc in self.cursor.description]
             rows = self.cursor.fetchall()
             df = pd.DataFrame(rows, columns=column_names)
@@ -137,7 +315,7 @@ class PostgreSQLDatabase:
             logger.info(f"Table {table_name} backed up to {backup_path}")
             return None
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             logger.error(f"Failed backing up table {table_name}: {error}")
             return None
 
@@ -158,15 +336,15 @@ class PostgreSQLDatabase:
             insert_query = sql.SQL("INSERT INTO {} VALUES ({})").format(
                 sql.Identifier(table_name),
                 sql.SQL(', ').join(sql.Placeholder() * len(data[0])))
-            self.cursor.executemany(insert_query, data)
-            self.connection.commit()
+            self._executemany(insert_query, data)
+            self._commit()
             prompt = "1 row" if len(data) == 1 else f"{len(data)} rows"
             if movie_id:
                 logger.debug(f"{movie_id} - Inserted {prompt} into {table_name}")
             else:
                 logger.debug(f"Inserted {prompt} into {table_name}")
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             if movie_id:
                 logger.error(f"{movie_id} - Failed inserting data: {error} ({str(error)})")
             else:
@@ -185,16 +363,16 @@ class PostgreSQLDatabase:
             delete_query = sql.SQL("DELETE FROM {} WHERE {} = %s").format(
                 sql.Identifier(table_name),
                 sql.Identifier(condition_column))
-            self.cursor.execute(delete_query, (condition_value,))
+            self._execute(delete_query, (condition_value,))
             row_count = self.cursor.rowcount
-            self.connection.commit()
+            self._commit()
             prompt = "1 row" if row_count == 1 else f"{row_count} rows"
             if movie_id:
                 logger.debug(f"{movie_id} - Deleted {prompt} from {table_name} where {condition_column} = {condition_value}")
             else:
                 logger.debug(f"Deleted {prompt} from {table_name} where {condition_column} = {condition_value}")
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             if movie_id:
                 logger.error(f"{movie_id} - Failed deleting data: {error}")
             else:
@@ -226,12 +404,11 @@ class PostgreSQLDatabase:
             query_string = select_query.as_string(self.connection)
             logger.debug(f"Executing SQL: {query_string}")
         
-            self.cursor.execute(select_query)
-            results = self.cursor.fetchall()
+            results = self._fetch(select_query)
             return results
             
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             if movie_id:
                 logger.error(f"{movie_id} - Failed querying data: {error}")
             else:
@@ -258,44 +435,662 @@ class PostgreSQLDatabase:
                     sql.Identifier('movies'),
                     sql.SQL(', ').join(sql.Placeholder() * len(data[0])),
                     sql.Identifier('movies'))
-            self.cursor.executemany(query, data)
-            self.connection.commit()
+            self._executemany(query, data)
+            self._commit()
             logger.info(f"{movie_id} - Upserted metadata successfully")
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             logger.error(f"{movie_id} - Failed upserting metadata: {error}")
 
 
-    def upsert_review_data(self, data, movie_id):
+    def update_full_scrape(self, movie_id, timestamp):
+        try:
+            query = "UPDATE movies SET last_full_scrape = %s WHERE movie_id = %s"
+            self._execute(query, (timestamp, movie_id))
+            self._commit()
+            logger.debug(f"{movie_id} - Updated timestamp of the last full scrape")
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed updating timestamp of the last full scrape: {error}")
+
+
+    def get_review_gap(self, movie_id):
+        """
+        Return the reviews declared by IMDb but not found, as a tuple (missing, attempts, known_gap), or None
+        """
+        try:
+            review_gap = self._fetch("SELECT missing, attempts, known_gap FROM review_gaps WHERE movie_id = %s", (movie_id,), one=True)
+            return review_gap
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed querying review gap: {error}")
+            return None
+
+
+    def record_review_gap(self, movie_id, missing, attempts, known_gap):
+        """
+        Record the result of an attempt at finding missing reviews
+
+        :param missing: Number of reviews declared by IMDb but not stored
+        :param attempts: Number of attempts since the known gap was last set
+        :param known_gap: Number of missing reviews accepted as not retrievable
+        """
         try:
             query = """
-            INSERT INTO reviews_raw (movie_id, review_id, author, title, text, rating, date, upvotes, downvotes, last_update, to_process)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (author) DO UPDATE
+            INSERT INTO review_gaps (movie_id, missing, attempts, known_gap, last_attempt)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (movie_id) DO UPDATE
             SET
-                title = EXCLUDED.title,
-                text = EXCLUDED.text,
-                upvotes = EXCLUDED.upvotes,
-                downvotes = EXCLUDED.downvotes,
-                last_update = EXCLUDED.last_update,
-                to_process = CASE
-                    WHEN reviews_raw.title IS DISTINCT FROM EXCLUDED.title OR reviews_raw.text IS DISTINCT FROM EXCLUDED.text
-                    THEN 1
-                    ELSE reviews_raw.to_process
-            END;
+                missing = EXCLUDED.missing,
+                attempts = EXCLUDED.attempts,
+                known_gap = EXCLUDED.known_gap,
+                last_attempt = EXCLUDED.last_attempt
             """
-            self.cursor.executemany(query, data)
-            self.connection.commit()
-            logger.info(f"{movie_id} - Upserted reviews successfully")
+            self._execute(query, (movie_id, missing, attempts, known_gap, datetime.now()))
+            self._commit()
+            logger.debug(f"{movie_id} - Recorded review gap")
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed recording review gap: {error}")
+
+
+    def get_schedule(self, movie_id):
+        """
+        Return the scraping schedule of a movie, as a tuple (reviews_per_day, interval_seconds, last_nb_reviews, last_checked, priority), or None
+        """
+        try:
+            schedule = self._fetch("""
+                SELECT reviews_per_day, interval_seconds, last_nb_reviews, last_checked, priority
+                FROM movie_schedule WHERE movie_id = %s
+            """, (movie_id,), one=True)
+            return schedule
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed querying schedule: {error}")
+            return None
+
+
+    def count_recent_reviews(self, movie_id, days):
+        """
+        Count the reviews of a movie published in the last days
+        """
+        try:
+            count = self._fetch("SELECT count(*) FROM reviews_raw WHERE movie_id = %s AND date >= current_date - %s",
+                                (movie_id, days), one=True)[0]
+            return count
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed counting recent reviews: {error}")
+            return 0
+
+
+    def update_schedule(self, movie_id, reviews_per_day, interval, nb_reviews):
+        """
+        Record the arrival rate of the reviews of a movie and set the time of its next scrape
+
+        :param interval: Time until the next scrape, in seconds
+        :param nb_reviews: Number of reviews declared by IMDb
+        """
+        try:
+            now = datetime.now()
+            query = """
+            INSERT INTO movie_schedule (movie_id, next_due, interval_seconds, reviews_per_day, last_nb_reviews, last_checked, priority)
+            VALUES (%s, %s, %s, %s, %s, %s, FALSE)
+            ON CONFLICT (movie_id) DO UPDATE
+            SET
+                next_due = EXCLUDED.next_due,
+                interval_seconds = EXCLUDED.interval_seconds,
+                reviews_per_day = EXCLUDED.reviews_per_day,
+                last_nb_reviews = EXCLUDED.last_nb_reviews,
+                last_checked = EXCLUDED.last_checked
+            """
+            self._execute(query, (movie_id, now + timedelta(seconds=interval), interval, reviews_per_day, nb_reviews, now))
+            self._commit()
+            logger.info(f"{movie_id} - {reviews_per_day:.2f} reviews per day, next scrape in {interval / 3600:.1f} hours")
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed updating schedule: {error}")
+
+
+    def set_priority(self, movie_id, priority):
+        """
+        Set the manual override scraping a movie as often as possible; a movie given priority is due immediately
+        """
+        try:
+            query = """
+            INSERT INTO movie_schedule (movie_id, next_due, priority)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (movie_id) DO UPDATE
+            SET
+                priority = EXCLUDED.priority,
+                next_due = CASE WHEN EXCLUDED.priority THEN EXCLUDED.next_due ELSE movie_schedule.next_due END
+            """
+            self._execute(query, (movie_id, datetime.now(), priority))
+            self._commit()
+            logger.info(f"{movie_id} - Priority {'set' if priority else 'removed'}")
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed setting priority: {error}")
+
+
+    def due_movies(self):
+        """
+        Return the identifiers of the movies due for scraping, movies with priority first, then the most overdue
+        """
+        try:
+            movies_id = [row[0] for row in self._fetch("""
+                SELECT m.movie_id FROM movies m
+                LEFT JOIN movie_schedule s ON s.movie_id = m.movie_id
+                WHERE s.next_due IS NULL OR s.next_due <= %s
+                ORDER BY s.priority DESC NULLS LAST, s.next_due NULLS FIRST
+            """, (datetime.now(),))]
+            return movies_id
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed querying movies due for scraping: {error}")
+            return []
+
+
+    def movies_to_analyze(self, min_reviews=1):
+        """
+        Return the movies with reviews flagged for sentiment analysis and not claimed, the largest backlog first
+
+        :param min_reviews: Minimum number of reviews flagged, e.g. to select the backfills
+        """
+        try:
+            movies_id = [row[0] for row in self._fetch("""
+                SELECT movie_id FROM reviews_raw
+                WHERE to_process = 1 AND (claim_expires IS NULL OR claim_expires < LOCALTIMESTAMP)
+                GROUP BY movie_id HAVING count(*) >= %s ORDER BY count(*) DESC
+            """, (min_reviews,))]
+            return movies_id
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed querying movies to analyze: {error}")
+            return []
+
+
+    def claim_reviews(self, worker, limit, lease, movie_id=None):
+        """
+        Lease a batch of reviews flagged for sentiment analysis, skipping those leased by other workers
+
+        Reviews whose lease expired (worker lost, or analysis failed) can be claimed again.
+
+        :param worker: Identifier of the worker, which must be unique across hosts
+        :param limit: Maximum number of reviews
+        :param lease: Duration of the lease, in seconds
+        :param movie_id: Movie of the reviews, or None for any movie
+        :return: Rows of reviews_raw, from movie_id to text_hash, the oldest first
+        """
+        try:
+            query = """
+            UPDATE reviews_raw r
+            SET claimed_by = %(worker)s, claim_expires = LOCALTIMESTAMP + make_interval(secs => %(lease)s)
+            WHERE r.author IN (
+                SELECT author FROM reviews_raw
+                WHERE to_process = 1
+                    AND (%(movie_id)s::VARCHAR IS NULL OR movie_id = %(movie_id)s)
+                    AND (claim_expires IS NULL OR claim_expires < LOCALTIMESTAMP)
+                ORDER BY last_update
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED)
+            RETURNING r.movie_id, r.review_id, r.author, r.title, r.text, r.rating, r.date, r.upvotes, r.downvotes,
+                r.last_update, r.to_process, r.text_hash
+            """
+            self._execute(query, {'worker': worker, 'lease': lease, 'movie_id': movie_id, 'limit': limit})
+            reviews = sorted(self.cursor.fetchall(), key=lambda review: review[9] or datetime.min)
+            self._commit()
+            logger.debug(f"{movie_id} - Claimed {len(reviews)} reviews for {worker}")
+            return reviews
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed claiming reviews: {error}")
+            return []
+
+
+    def complete_reviews(self, worker, authors, text_hashes, movie_id):
+        """
+        Release the reviews analyzed by a worker in bulk, resetting their indicator unless they were edited meanwhile
+
+        :param text_hashes: Fingerprints of the texts analyzed, as claimed
+        """
+        try:
+            query = """
+            UPDATE reviews_raw r
+            SET to_process = CASE WHEN r.text_hash IS NOT DISTINCT FROM a.text_hash THEN 0 ELSE r.to_process END,
+                claimed_by = NULL, claim_expires = NULL
+            FROM unnest(%s::VARCHAR[], %s::CHAR(32)[]) AS a(author, text_hash)
+            WHERE r.author = a.author AND r.claimed_by = %s
+            """
+            self._execute(query, (list(authors), list(text_hashes), worker))
+            completed = self.cursor.rowcount
+            self._commit()
+            logger.debug(f"{movie_id} - Completed {completed} reviews")
+            return completed
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed completing {len(authors)} reviews: {error}")
+            return 0
+
+
+    def claimed_reviews(self, worker):
+        """
+        Return the reviews claimed by a worker, as claim_reviews
+        """
+        try:
+            reviews = self._fetch("""
+                SELECT movie_id, review_id, author, title, text, rating, date, upvotes, downvotes, last_update, to_process, text_hash
+                FROM reviews_raw WHERE claimed_by = %s
+            """, (worker,))
+            return reviews
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed querying reviews claimed by {worker}: {error}")
+            return []
+
+
+    def release_reviews(self, worker):
+        """
+        Release the reviews still claimed by a worker, e.g. those a batch failed to analyze, so that they can be claimed again
+        """
+        try:
+            self._execute("UPDATE reviews_raw SET claimed_by = NULL, claim_expires = NULL WHERE claimed_by = %s", (worker,))
+            released = self.cursor.rowcount
+            self._commit()
+            return released
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
+            logger.error(f"Failed releasing reviews claimed by {worker}: {error}")
+            return 0
+
+
+    def flag_unanalyzed_reviews(self):
+        """
+        Flag for sentiment analysis the reviews without sentiments, e.g. after a backup was restored without them
+        """
+        try:
+            self._execute("""
+                UPDATE reviews_raw r SET to_process = 1
+                WHERE r.to_process IS DISTINCT FROM 1
+                    AND NOT EXISTS (SELECT 1 FROM reviews_sentiments s WHERE s.author = r.author)
+            """)
+            flagged = self.cursor.rowcount
+            self._commit()
+            logger.info(f"Flagged {flagged} reviews without sentiments for analysis")
+            return flagged
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed flagging reviews without sentiments: {error}")
+            return 0
+
+
+    def record_batch(self, batch_id, worker, movie_id, nb_reviews, status):
+        """
+        Record a batch submitted to the Batch API
+
+        :param worker: Identifier under which the reviews of the batch are claimed
+        """
+        try:
+            query = """
+            INSERT INTO sentiment_batches (batch_id, worker, movie_id, nb_reviews, status, submitted_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """
+            self._execute(query, (batch_id, worker, movie_id, nb_reviews, status, datetime.now()))
+            self._commit()
+            logger.info(f"{movie_id} - Submitted batch {batch_id} of {nb_reviews} reviews")
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed recording batch {batch_id}: {error}")
+
+
+    def pending_batches(self):
+        """
+        Return the batches not ingested yet, as tuples (batch_id, worker, movie_id, status)
+        """
+        try:
+            batches = self._fetch("SELECT batch_id, worker, movie_id, status FROM sentiment_batches WHERE ingested_at IS NULL ORDER BY submitted_at")
+            return batches
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed querying pending batches: {error}")
+            return []
+
+
+    def update_batch(self, batch_id, status, output_file_id=None, ingested=False):
+        """
+        Record the status of a batch, and whether its results were ingested
+        """
+        try:
+            query = """
+            UPDATE sentiment_batches
+            SET status = %s, output_file_id = COALESCE(%s, output_file_id),
+                ingested_at = CASE WHEN %s THEN %s ELSE ingested_at END
+            WHERE batch_id = %s
+            """
+            now = datetime.now()
+            self._execute(query, (status, output_file_id, ingested, now, batch_id))
+            self._commit()
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed updating batch {batch_id}: {error}")
+
+
+    # Times of the job queue are taken from the server (LOCALTIMESTAMP), so that leases do not depend on the clocks of the hosts
+    def enqueue_jobs(self, movies_id):
+        """
+        Queue the pipeline of movies, unless it is already queued, running or failed recently
+
+        A movie has a single job, so that it is never queued twice, whatever the number of schedulers.
+
+        :return: Number of jobs queued
+        """
+        try:
+            query = """
+            INSERT INTO jobs (movie_id, status, attempts, run_after, updated_at)
+            SELECT movie_id, 'queued', 0, LOCALTIMESTAMP, LOCALTIMESTAMP FROM unnest(%s::VARCHAR[]) AS movie_id
+            ON CONFLICT (movie_id) DO UPDATE
+            SET status = 'queued', attempts = 0, run_after = LOCALTIMESTAMP, last_error = NULL, updated_at = LOCALTIMESTAMP
+            WHERE jobs.status = 'done' OR (jobs.status = 'failed' AND jobs.run_after <= LOCALTIMESTAMP)
+            """
+            self._execute(query, (list(movies_id),))
+            queued = self.cursor.rowcount
+            self._commit()
+            return queued
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed queuing {len(movies_id)} jobs: {error}")
+            return 0
+
+
+    def claimable_jobs(self):
+        """
+        Return the movies whose job can be claimed: queued and due, or running with an expired lease (worker lost),
+        movies with priority first
+        """
+        try:
+            movies_id = [row[0] for row in self._fetch("""
+                SELECT j.movie_id FROM jobs j
+                LEFT JOIN movie_schedule s ON s.movie_id = j.movie_id
+                WHERE (j.status = 'queued' AND j.run_after <= LOCALTIMESTAMP)
+                    OR (j.status = 'running' AND j.lease_expires < LOCALTIMESTAMP)
+                ORDER BY s.priority DESC NULLS LAST, j.run_after
+            """)]
+            return movies_id
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed querying claimable jobs: {error}")
+            return []
+
+
+    def claim_job(self, movie_id, worker, lease):
+        """
+        Take the job of a movie, if it is still claimable, for a lease to be renewed with heartbeat_job
+
+        :param worker: Identifier of the worker, which must be unique across hosts
+        :param lease: Duration of the lease, in seconds
+        :return: Number of the attempt, or None if the job was claimed by another worker
+        """
+        try:
+            query = """
+            UPDATE jobs
+            SET status = 'running', worker = %s, attempts = attempts + 1, heartbeat = LOCALTIMESTAMP,
+                lease_expires = LOCALTIMESTAMP + make_interval(secs => %s), updated_at = LOCALTIMESTAMP
+            WHERE movie_id = (
+                SELECT movie_id FROM jobs
+                WHERE movie_id = %s AND ((status = 'queued' AND run_after <= LOCALTIMESTAMP)
+                                         OR (status = 'running' AND lease_expires < LOCALTIMESTAMP))
+                FOR UPDATE SKIP LOCKED)
+            RETURNING attempts
+            """
+            self._execute(query, (worker, lease, movie_id))
+            row = self.cursor.fetchone()
+            self._commit()
+            if row is not None:
+                logger.debug(f"{movie_id} - Job claimed by {worker} (attempt {row[0]})")
+            return row[0] if row else None
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed claiming job: {error}")
+            return None
+
+
+    def heartbeat_job(self, movie_id, worker, lease):
+        """
+        Renew the lease of a running job
+
+        :return: False if the lease was lost, i.e. the job was reclaimed after the lease expired
+        """
+        try:
+            query = """
+            UPDATE jobs SET heartbeat = LOCALTIMESTAMP, lease_expires = LOCALTIMESTAMP + make_interval(secs => %s)
+            WHERE movie_id = %s AND worker = %s AND status = 'running'
+            """
+            self._execute(query, (lease, movie_id, worker))
+            renewed = self.cursor.rowcount == 1
+            self._commit()
+            return renewed
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed renewing job lease: {error}")
+            return True  # The lease is not known to be lost, it is renewed at the next heartbeat
+
+
+    def complete_job(self, movie_id, worker):
+        """
+        Mark the job of a movie as done, if it is still held by the worker
+        """
+        try:
+            query = """
+            UPDATE jobs SET status = 'done', attempts = 0, worker = NULL, lease_expires = NULL, last_error = NULL,
+                updated_at = LOCALTIMESTAMP
+            WHERE movie_id = %s AND worker = %s AND status = 'running'
+            """
+            self._execute(query, (movie_id, worker))
+            self._commit()
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed completing job: {error}")
+
+
+    def fail_job(self, movie_id, worker, error_message, backoff, max_backoff, max_attempts, failed_delay):
+        """
+        Record the failure of the job of a movie, if it is still held by the worker, and queue it again with
+        an exponential backoff; after max_attempts, the job is marked as failed and left aside for failed_delay
+
+        :param backoff: Delay before the first retry, in seconds, doubled at each attempt up to max_backoff
+        """
+        try:
+            query = """
+            UPDATE jobs
+            SET status = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'queued' END,
+                run_after = LOCALTIMESTAMP + make_interval(secs => CASE WHEN attempts >= %(max_attempts)s THEN %(failed_delay)s
+                    ELSE LEAST(%(backoff)s * power(2, attempts - 1), %(max_backoff)s) END),
+                worker = NULL, lease_expires = NULL, last_error = %(error)s, updated_at = LOCALTIMESTAMP
+            WHERE movie_id = %(movie_id)s AND worker = %(worker)s AND status = 'running'
+            RETURNING status, attempts, run_after
+            """
+            self._execute(query, {'max_attempts': max_attempts, 'failed_delay': failed_delay, 'backoff': backoff,
+                                  'max_backoff': max_backoff, 'error': str(error_message)[:1000],
+                                  'movie_id': movie_id, 'worker': worker})
+            row = self.cursor.fetchone()
+            self._commit()
+            if row is None:
+                logger.warning(f"{movie_id} - Job no longer held by {worker}, failure not recorded")
+            elif row[0] == 'failed':
+                logger.error(f"{movie_id} - Job failed after {row[1]} attempts: {error_message}")
+            else:
+                logger.warning(f"{movie_id} - Job attempt {row[1]} failed, retrying after {row[2]:%H:%M:%S}: {error_message}")
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed recording job failure: {error}")
+
+
+    def requeue_job(self, movie_id, worker, delay, reason):
+        """
+        Queue again the job of a movie, if it is still held by the worker, without counting the attempt,
+        e.g. when the run was skipped rather than failed
+
+        :param delay: Delay before the job can be claimed again, in seconds
+        """
+        try:
+            query = """
+            UPDATE jobs
+            SET status = 'queued', attempts = GREATEST(attempts - 1, 0), run_after = LOCALTIMESTAMP + make_interval(secs => %s),
+                worker = NULL, lease_expires = NULL, last_error = %s, updated_at = LOCALTIMESTAMP
+            WHERE movie_id = %s AND worker = %s AND status = 'running'
+            """
+            self._execute(query, (delay, str(reason)[:1000], movie_id, worker))
+            requeued = self.cursor.rowcount == 1
+            self._commit()
+            if requeued:
+                logger.info(f"{movie_id} - Job queued again in {delay:.0f}s: {reason}")
+            return requeued
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"{movie_id} - Failed queuing job again: {error}")
+            return False
+
+
+    def job_counts(self):
+        """
+        Return the number of jobs by status, with the queued jobs split between 'queued' (due) and 'retrying' (backing off)
+        """
+        try:
+            counts = dict(self._fetch("""
+                SELECT CASE WHEN status = 'queued' AND run_after > LOCALTIMESTAMP THEN 'retrying' ELSE status END, count(*)
+                FROM jobs GROUP BY 1
+            """))
+            return counts
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
+            logger.error(f"Failed counting jobs: {error}")
+            return {}
+
+
+    @contextmanager
+    def advisory_lock(self, key):
+        """
+        Hold a lock on a key (e.g. a movie) for the block, so that a stage never runs twice at the same time
+        for the same movie, whatever the process or host; yields False if the lock is held elsewhere
+
+        The lock belongs to the session and is released when the block ends or the connection is lost.
+        """
+        self._execute("SELECT pg_try_advisory_lock(hashtext(%s))", (key,))
+        acquired = self.cursor.fetchone()[0]
+        self._commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                if self.connection.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+                    self.connection.rollback()
+                self._in_transaction, self._transaction_failed = False, False
+                self._execute("SELECT pg_advisory_unlock(hashtext(%s))", (key,))
+                self._commit()
+
+
+    @staticmethod
+    def prepare_reviews(reviews_df):
+        """
+        Convert a DataFrame of reviews to the columns and types of reviews_raw, column by column,
+        adding the fingerprints of the title and text (text_hash) and of the votes (votes_hash)
+        """
+        df = reviews_df.reindex(columns=REVIEWS_RAW_COLUMNS)
+        for col in ['rating', 'upvotes', 'downvotes', 'to_process']:
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+        content = df['title'].fillna('').astype(str) + '\x1f' + df['text'].fillna('').astype(str)
+        votes = df['upvotes'].astype(str) + '\x1f' + df['downvotes'].astype(str)
+        df['text_hash'] = content.map(lambda value: hashlib.md5(value.encode('utf-8')).hexdigest())
+        df['votes_hash'] = votes.map(lambda value: hashlib.md5(value.encode('utf-8')).hexdigest())
+        return df
+
+
+    def bulk_upsert_reviews(self, reviews_df, movie_id):
+        """
+        Upsert the new and changed reviews, by streaming them with COPY into a staging table,
+        then merging them with a single statement
+
+        Reviews whose fingerprints match the stored ones are not sent. Reviews flagged with
+        to_process keep the flag on insert; on update, it is raised only if the title or the text changed.
+
+        :param reviews_df: DataFrame with the columns of reviews_raw
+        :return: Tuple (inserted, updated, unchanged), or None if the upsert failed
+        """
+        try:
+            df = self.prepare_reviews(reviews_df)
+
+            # Keep only the reviews whose content or votes changed
+            self._execute("SELECT author, text_hash, votes_hash FROM reviews_raw WHERE author = ANY(%s)",
+                          (df['author'].dropna().astype(str).tolist(),))
+            stored = {author: (text_hash, votes_hash) for author, text_hash, votes_hash in self.cursor.fetchall()}
+            changed = [stored.get(author) != (text_hash, votes_hash)
+                       for author, text_hash, votes_hash in zip(df['author'], df['text_hash'], df['votes_hash'])]
+            skipped = len(df) - sum(changed)
+            df = df[changed]
+            if len(df) == 0:
+                self._commit()
+                logger.info(f"{movie_id} - No review changed, {skipped} unchanged")
+                return 0, 0, skipped
+
+            rows = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+            self._execute("CREATE TEMP TABLE IF NOT EXISTS reviews_staging (LIKE reviews_raw INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+            self.round_trips += 1
+            with self.cursor.copy(sql.SQL("COPY reviews_staging ({}) FROM STDIN").format(
+                    sql.SQL(', ').join(map(sql.Identifier, REVIEWS_RAW_COLUMNS + ['text_hash', 'votes_hash'])))) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+            # Authors are unique in reviews_raw, so only the last review of each author is kept.
+            # Reviews stored before fingerprints were introduced are compared on their content.
+            query = """
+            WITH source AS (
+                SELECT DISTINCT ON (author) * FROM reviews_staging ORDER BY author, last_update DESC
+            ), upserted AS (
+                INSERT INTO reviews_raw (movie_id, review_id, author, title, text, rating, date, upvotes, downvotes, last_update, to_process, text_hash, votes_hash)
+                SELECT movie_id, review_id, author, title, text, rating, date, upvotes, downvotes, last_update, to_process, text_hash, votes_hash FROM source
+                ON CONFLICT (author) DO UPDATE
+                SET
+                    title = EXCLUDED.title,
+                    text = EXCLUDED.text,
+                    upvotes = EXCLUDED.upvotes,
+                    downvotes = EXCLUDED.downvotes,
+                    last_update = EXCLUDED.last_update,
+                    text_hash = EXCLUDED.text_hash,
+                    votes_hash = EXCLUDED.votes_hash,
+                    to_process = CASE
+                        WHEN reviews_raw.text_hash IS NOT NULL AND reviews_raw.text_hash <> EXCLUDED.text_hash THEN 1
+                        WHEN reviews_raw.text_hash IS NULL
+                            AND (reviews_raw.title IS DISTINCT FROM EXCLUDED.title OR reviews_raw.text IS DISTINCT FROM EXCLUDED.text) THEN 1
+                        ELSE reviews_raw.to_process
+                    END
+                WHERE reviews_raw.text_hash IS DISTINCT FROM EXCLUDED.text_hash
+                    OR reviews_raw.votes_hash IS DISTINCT FROM EXCLUDED.votes_hash
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT
+                count(*) FILTER (WHERE inserted),
+                count(*) FILTER (WHERE NOT inserted),
+                (SELECT count(*) FROM source)
+            FROM upserted
+            """
+            self._execute(query)
+            inserted, updated, total = self.cursor.fetchone()
+            self._commit()
+            unchanged = skipped + total - inserted - updated
+            logger.info(f"{movie_id} - Upserted reviews successfully: {inserted} inserted, {updated} updated, {unchanged} unchanged")
+            return inserted, updated, unchanged
+        except (Exception, psycopg.Error) as error:
+            self._rollback()
             logger.error(f"{movie_id} - Failed upserting reviews: {error}")
+            return None
 
 
     def update_sentiment_data(self, data, movie_id):
         try:
-            self.cursor.execute(sql.SQL("SELECT column_name FROM information_schema.columns WHERE table_name = 'reviews_sentiments' ORDER BY ordinal_position;"))
-            columns = [row[0] for row in self.cursor.fetchall()]
+            if self._sentiment_columns is None:
+                self._execute(sql.SQL("SELECT column_name FROM information_schema.columns WHERE table_name = 'reviews_sentiments' ORDER BY ordinal_position;"))
+                self._sentiment_columns = [row[0] for row in self.cursor.fetchall()]
+            columns = self._sentiment_columns
             update_assignments = sql.SQL(', ').join(
                 sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(col), sql.Identifier(col))
                 for col in columns if col != 'author')  # Exclude primary key from updates
@@ -308,19 +1103,8 @@ class PostgreSQLDatabase:
                 sql.SQL(', ').join(map(sql.Identifier, columns)),
                 sql.SQL(', ').join(sql.Placeholder() * len(columns)),
                 update_assignments)
-            self.cursor.executemany(insert_query, data)
-            self.connection.commit()
+            self._executemany(insert_query, data)
+            self._commit()
         except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
+            self._rollback()
             logger.error(f"{movie_id} - Failed updating sentiment data: {error}")
-
-
-    def reset_indicator(self, author, movie_id):
-        try:
-            query = "UPDATE reviews_raw SET to_process = 0 WHERE author = %s"
-            self.cursor.execute(query, (author,))
-            self.connection.commit()
-            logger.debug(f"{movie_id} - Reseted indicator for review by {author}")
-        except (Exception, psycopg.Error) as error:
-            self.connection.rollback()
-            logger.error(f"{movie_id} - Failed resetting process indicator for review by {author}: {error}")
@@ -0,0 +1,164 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+from contextlib import contextmanager
+from src.utils.logger import get_backend_logger
+
+logger = get_backend_logger()
+
+DISPATCH_JITTER = float(os.getenv('DISPATCH_JITTER', 0.5))  # Share of the slot of each job by which its start is randomly delayed
+DURATION_SMOOTHING = 0.2  # Weight of the last job in the moving average of the duration of the jobs
+
+
+def spread(count, window, jitter=DISPATCH_JITTER, rng=random):
+    """
+    Return start offsets, in seconds, spreading jobs evenly over a window, in their order
+
+    Each job gets a slot of window / count seconds and starts at a random point of the first
+    jitter share of its slot, so that jobs planned together never start in the same second.
+
+    :param jitter: Between 0 (start of each slot) and 1 (anywhere in the slot)
+    """
+    if count == 0:
+        return []
+    slot = max(window, 0) / count
+    return [i * slot + rng.uniform(0, jitter * slot) for i in range(count)]
+
+
+class Dispatcher:
+    def __init__(self, submit, max_concurrent, jitter=DISPATCH_JITTER):
+        """
+        Start jobs spread over time, rather than all at once, with a limit on the jobs running
+
+        :param submit: Function launching the job of a key (e.g. a movie), returning a Future
+        :param max_concurrent: Maximum number of jobs running at the same time
+        :param jitter: Share of the slot of each job by which its start is randomly delayed
+        """
+        self.submit = submit
+        self.max_concurrent = max_concurrent
+        self.jitter = jitter
+        self._queue = []  # Heap of (planned start, sequence, key)
+        self._sequence = itertools.count()
+        self._running = {}  # Key -> start time
+        self._condition = threading.Condition()
+        self._paused = 0
+        self._stopping = False
+        self._thread = None
+        self._average_duration = None
+        self._dispatched = 0
+        self._max_lag = 0.0
+
+
+    def plan(self, keys, deadline):
+        """
+        Queue jobs so that they start one after the other and complete by a deadline
+
+        The starts are spread until the deadline minus the average duration of the jobs.
+        Keys already queued or running are skipped.
+
+        :param keys: Keys of the jobs, in order of priority
+        :param deadline: Timestamp by which the jobs should complete
+        :return: Number of jobs queued
+        """
+        with self._condition:
+            pending = set(self._running) | set(key for _, _, key in self._queue)
+            for key in pending.intersection(keys):
+                logger.debug(f"{key} - Already queued or running. Skipping...")
+            keys = [key for key in dict.fromkeys(keys) if key not in pending]
+
+            now = time.time()
+            window = deadline - now - (self._average_duration or 0)
+            for key, offset in zip(keys, spread(len(keys), window, self.jitter)):
+                heapq.heappush(self._queue, (now + offset, next(self._sequence), key))
+            self._condition.notify_all()
+        return len(keys)
+
+
+    def metrics(self):
+        """
+        Return the state of the queue: jobs queued and running, lag of the most overdue job and largest lag
+        observed when starting a job (in seconds), jobs started and average duration of the jobs
+        """
+        with self._condition:
+            now = time.time()
+            lag = max(now - self._queue[0][0], 0) if self._queue else 0.0
+            return {'queued': len(self._queue), 'running': len(self._running), 'lag_seconds': lag,
+                    'max_lag_seconds': self._max_lag, 'dispatched': self._dispatched,
+                    'average_duration': self._average_duration}
+
+
+    @contextmanager
+    def paused(self):
+        """
+        Hold the starts of the jobs in the block (e.g. during a backup); the jobs running are not affected
+        """
+        with self._condition:
+            self._paused += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._paused -= 1
+                self._condition.notify_all()
+
+
+    def _finished(self, key):
+        with self._condition:
+            duration = time.time() - self._running.pop(key)
+            if self._average_duration is None:
+                self._average_duration = duration
+            else:
+                self._average_duration = DURATION_SMOOTHING * duration + (1 - DURATION_SMOOTHING) * self._average_duration
+            self._condition.notify_all()
+
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    now = time.time()
+                    if self._queue and not self._paused and len(self._running) < self.max_concurrent:
+                        if self._queue[0][0] <= now:
+                            break
+                        self._condition.wait(self._queue[0][0] - now)
+                    else:
+                        self._condition.wait()
+                if self._stopping:
+                    return
+                planned, _, key = heapq.heappop(self._queue)
+                self._running[key] = now
+                self._dispatched += 1
+                self._max_lag = max(self._max_lag, now - planned)
+
+            try:
+                future = self.submit(key)
+            except Exception as e:
+                logger.error(f"{key} - Failed launching job: {e}")
+                with self._condition:
+                    self._running.pop(key)
+                    self._condition.notify_all()
+                continue
+            future.add_done_callback(lambda _, key=key: self._finished(key))
+
+
+    def start(self):
+        """Start dispatching the jobs queued, in a background thread"""
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="dispatcher", daemon=True)
+            self._thread.start()
+
+
+    def stop(self):
+        """Stop dispatching and drop the jobs queued; the jobs running are not affected"""
+        with self._condition:
+            self._stopping = True
+            self._queue.clear()
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,79 @@
+import os
+import socket
+import threading
+import uuid
+
+from src.utils.db import PostgreSQLDatabase
+from src.utils.logger import get_backend_logger
+
+logger = get_backend_logger()
+
+JOB_LEASE = int(os.getenv('JOB_LEASE', 300))  # Duration of the lease of a worker on a job, renewed by heartbeats, in seconds
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))  # Attempts before a job is marked as failed
+JOB_BACKOFF = int(os.getenv('JOB_BACKOFF', 60))  # Delay before retrying a failed job, doubled at each attempt, in seconds
+JOB_MAX_BACKOFF = int(os.getenv('JOB_MAX_BACKOFF', 3600))
+JOB_FAILED_DELAY = int(os.getenv('JOB_FAILED_DELAY', 86400))  # Time during which a failed job is not queued again, in seconds
+JOB_SKIP_DELAY = int(os.getenv('JOB_SKIP_DELAY', 60))  # Delay before running again a job skipped because its movie was locked elsewhere, in seconds
+
+
+class LeaseLost(Exception):
+    """Raised when the job of a worker was reclaimed by another worker after its lease expired."""
+
+
+def worker_name():
+    """Return an identifier of the current process, unique across hosts"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Heartbeat:
+    def __init__(self, movie_id, worker, lease=JOB_LEASE):
+        """
+        Renew the lease on the job of a movie in a background thread, while the job runs
+
+        Each renewal uses its own database session, so that it never waits for the statements of the job.
+
+        :param worker: Identifier of the worker holding the lease
+        :param lease: Duration of the lease, renewed every third of it
+        """
+        self.movie_id = movie_id
+        self.worker = worker
+        self.lease = lease
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+
+    def _run(self):
+        while not self._stop.wait(self.lease / 3):
+            try:
+                with PostgreSQLDatabase() as db:
+                    renewed = db.heartbeat_job(self.movie_id, self.worker, self.lease)
+            except Exception as e:
+                logger.warning(f"{self.movie_id} - Failed renewing job lease: {e}")
+                continue
+            if not renewed:
+                # The job was reclaimed by another worker; the advisory lock still prevents both runs from overlapping
+                logger.error(f"{self.movie_id} - Job lease lost by {self.worker}")
+                self.lost = True
+                return
+
+
+    def check(self):
+        """
+        Abort the job between two stages if its lease was lost, so that it does not run twice
+
+        :raises LeaseLost: If the job was reclaimed by another worker
+        """
+        if self.lost:
+            raise LeaseLost(f"Job of {self.movie_id} reclaimed from {self.worker}")
+
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{self.movie_id}", daemon=True)
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
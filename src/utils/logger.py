@@ -12,6 +12,9 @@ os.makedirs(LOG_DIR, exist_ok=True)
 
 
 def setup_logging():
+    if logging.getLogger('backend').handlers:
+        return  # Already set up, e.g. by the main module of a worker process
+
     console_handler = logging.StreamHandler()
     color_formatter = colorlog.ColoredFormatter(
         "%(log_color)s%(asctime)s - %(levelname)s - %(message)s",
@@ -0,0 +1,132 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from src.utils.logger import get_backend_logger
+
+logger = get_backend_logger()
+
+
+class CircuitOpenError(Exception):
+    """Raised when requests are paused after a burst of failures."""
+
+
+class SharedThrottle:
+    def __init__(self, name, rate=2.0, burst=5, failure_threshold=10, failure_window=60, cooldown=300, directory=None):
+        """
+        Token bucket and circuit breaker shared by all the processes of the host, through a locked state file
+
+        :param name: Name of the throttled service, used for the state file
+        :param rate: Number of requests per second allowed across all processes
+        :param burst: Maximum number of requests sent at once after an idle period
+        :param failure_threshold: Number of failures within the window that opens the circuit
+        :param failure_window: Duration over which failures are counted, in seconds
+        :param cooldown: Duration during which requests are refused once the circuit is open, in seconds
+        :param directory: Directory of the state file (default: system temporary directory)
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.cooldown = cooldown
+        self.path = os.path.join(directory or tempfile.gettempdir(), f"{name}.throttle")
+        self._thread_lock = threading.Lock()
+
+
+    def _update(self, update):
+        """
+        Apply a function to the shared state while holding the lock on the state file
+        """
+        with self._thread_lock, open(self.path, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else {}
+                state.setdefault('tokens', self.burst)
+                state.setdefault('updated', time.time())
+                state.setdefault('failures', [])
+                state.setdefault('open_until', 0)
+                result = update(state, time.time())
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+    def is_open(self):
+        """
+        Check whether requests are currently paused
+        """
+        return self._update(lambda state, now: state['open_until'] > now)
+
+
+    def open_for(self):
+        """
+        Return the time left before requests are allowed again, in seconds, or 0 if they are not paused
+        """
+        return self._update(lambda state, now: max(state['open_until'] - now, 0))
+
+
+    def acquire(self):
+        """
+        Block until a request can be sent
+
+        :raises CircuitOpenError: If requests are paused after a burst of failures
+        """
+        def take_token(state, now):
+            if state['open_until'] > now:
+                raise CircuitOpenError(f"Requests to {self.name} paused for {state['open_until'] - now:.0f}s after repeated failures")
+            state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+            state['updated'] = now
+            if state['tokens'] >= 1:
+                state['tokens'] -= 1
+                return 0
+            return (1 - state['tokens']) / self.rate
+
+        while True:
+            wait = self._update(take_token)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+
+    def failure(self):
+        """
+        Record a failed request, opening the circuit after too many failures within the window
+        """
+        def record(state, now):
+            state['failures'] = [t for t in state['failures'] if now - t < self.failure_window] + [now]
+            if len(state['failures']) >= self.failure_threshold:
+                state['open_until'] = now + self.cooldown
+                state['failures'] = []
+                return True
+            return False
+
+        if self._update(record):
+            logger.warning(f"Pausing requests to {self.name} for {self.cooldown}s after {self.failure_threshold} failures")
+
+
+_throttles = {}
+
+
+def get_imdb_throttle():
+    """
+    Return the throttle applied to every request sent to IMDb by the current process
+    """
+    if 'imdb' not in _throttles:
+        _throttles['imdb'] = SharedThrottle(
+            'imdb',
+            rate=float(os.getenv('IMDB_RATE', 2.0)),
+            burst=int(os.getenv('IMDB_BURST', 5)),
+            failure_threshold=int(os.getenv('IMDB_FAILURE_THRESHOLD', 10)),
+            cooldown=int(os.getenv('IMDB_COOLDOWN', 300)),
+            directory=os.getenv('THROTTLE_DIR'))
+    return _throttles['imdb']
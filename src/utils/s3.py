@@ -1,3 +1,4 @@
+import json
 import os
 import pandas as pd
 import re
@@ -51,12 +52,41 @@ class s3:
 
     
     def upload_covers(self, local_directory='data/covers'):
+        """
+        Upload the covers, thumbnails and cover metadata changed since the last upload
+
+        The size and modification time of the files uploaded are kept in .uploaded.json
+        """
+        manifest_path = os.path.join(local_directory, '.uploaded.json')
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                uploaded = json.load(f)
+        except (OSError, ValueError):
+            uploaded = {}
+
+        s3_target = os.path.join(self.destination, 'covers').replace("\\", "/")
+        changed = 0
         try:
-            s3_target = os.path.join(self.destination, 'covers').replace("\\", "/")
-            self.fs.put(local_directory, s3_target, recursive=True)
-            logger.info(f"Successfully synced covers to s3")
+            for root, _, files in os.walk(local_directory):
+                for file_name in files:
+                    file_path = os.path.join(root, file_name)
+                    relative_path = os.path.relpath(file_path, local_directory).replace("\\", "/")
+                    if file_name.startswith('.') or file_name.endswith('.tmp'):
+                        continue
+                    stat = os.stat(file_path)
+                    signature = [stat.st_size, stat.st_mtime]
+                    if uploaded.get(relative_path) == signature:
+                        continue
+                    self.fs.put(file_path, f"{s3_target}/{relative_path}")
+                    uploaded[relative_path] = signature
+                    changed += 1
+            logger.info(f"Successfully synced covers to s3: {changed} files uploaded")
         except Exception as e:
             logger.error(f"Failed to sync covers to s3: {e}")
+        finally:
+            if os.path.isdir(local_directory):
+                with open(manifest_path, 'w', encoding='utf-8') as f:
+                    json.dump(uploaded, f)
 
 
     def clean_backup_directory(self):
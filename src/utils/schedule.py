@@ -0,0 +1,57 @@
+import os
+
+
+MIN_INTERVAL = int(os.getenv('SCRAPE_MIN_INTERVAL', 3600))  # Shortest time between two scrapes of a movie, in seconds
+MAX_INTERVAL = int(os.getenv('SCRAPE_MAX_INTERVAL', 7 * 86400))  # Longest time between two scrapes of a movie, in seconds
+TARGET_NEW_REVIEWS = 5  # Number of new reviews expected between two scrapes
+RECENT_WINDOW = 30  # Number of days over which the publication dates of the reviews are counted
+RATE_SMOOTHING = 0.3  # Weight of the last observation in the moving average of the arrival rate
+DEEP_SWEEP_RATIO = 24  # Number of scrapes between two full scrapes
+MIN_DEEP_SWEEP_INTERVAL = 86400
+MAX_DEEP_SWEEP_INTERVAL = 30 * 86400
+
+
+def estimate_rate(recent_reviews, previous_rate=None, new_reviews=None, elapsed_seconds=None):
+    """
+    Estimate the number of reviews published per day for a movie
+
+    The rate observed from the publication dates of the reviews stored is compared with a moving
+    average of the growth of the number of reviews declared by IMDb between two scrapes, which
+    reacts faster to a new release; the highest is kept.
+
+    :param recent_reviews: Number of reviews published in the last RECENT_WINDOW days
+    :param previous_rate: Moving average computed after the previous scrape, if any
+    :param new_reviews: Growth of the number of reviews declared by IMDb since the previous scrape
+    :param elapsed_seconds: Time since the previous scrape
+    """
+    dates_rate = recent_reviews / RECENT_WINDOW
+    if new_reviews is None or not elapsed_seconds:
+        return dates_rate
+
+    observed_rate = max(new_reviews, 0) / (elapsed_seconds / 86400)
+    if previous_rate is None:
+        smoothed_rate = observed_rate
+    else:
+        smoothed_rate = RATE_SMOOTHING * observed_rate + (1 - RATE_SMOOTHING) * previous_rate
+    return max(dates_rate, smoothed_rate)
+
+
+def next_interval(reviews_per_day, priority=False, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    """
+    Return the time until the next scrape of a movie, in seconds, so that about TARGET_NEW_REVIEWS reviews are published meanwhile
+
+    :param priority: Manual override, scraping the movie as often as possible
+    """
+    if priority:
+        return min_interval
+    if reviews_per_day <= 0:
+        return max_interval
+    interval = TARGET_NEW_REVIEWS / reviews_per_day * 86400
+    return int(min(max(interval, min_interval), max_interval))
+
+
+def deep_sweep_interval(interval):
+    """
+    Return the maximum time between two full scrapes of a movie scraped every interval seconds
+    """
+    return min(max(interval * DEEP_SWEEP_RATIO, MIN_DEEP_SWEEP_INTERVAL), MAX_DEEP_SWEEP_INTERVAL)
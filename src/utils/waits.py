@@ -0,0 +1,124 @@
+import time
+
+from selenium.common.exceptions import WebDriverException
+from src.utils.logger import get_backend_logger
+
+logger = get_backend_logger()
+
+
+class AdaptiveWait:
+    def __init__(self, driver, timeout=10, settle=1.0, poll=0.25):
+        """
+        Wait on DOM conditions instead of sleeping for fixed durations
+
+        :param driver: Selenium WebDriver
+        :param timeout: Default maximum duration of a wait, in seconds
+        :param settle: Duration during which a value must stay unchanged to be considered stable, in seconds
+        :param poll: Interval between two checks, in seconds
+        """
+        self.driver = driver
+        self.timeout = timeout
+        self.settle = settle
+        self.poll = poll
+        self.timings = []  # (label, seconds, success) for every wait
+
+
+    def _record(self, label, start, success):
+        elapsed = time.monotonic() - start
+        self.timings.append((label, elapsed, success))
+        outcome = "done" if success else "timed out"
+        logger.debug(f"Wait for {label} {outcome} after {elapsed:.2f}s")
+
+
+    def until(self, condition, label, timeout=None):
+        """
+        Poll a condition until it returns a truthy value
+
+        :param condition: Function taking the driver as argument
+        :return: The value returned by the condition, or None on timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        while True:
+            try:
+                result = condition(self.driver)
+            except WebDriverException:
+                result = None
+            if result:
+                self._record(label, start, True)
+                return result
+            if time.monotonic() - start >= timeout:
+                self._record(label, start, False)
+                return None
+            time.sleep(self.poll)
+
+
+    def _stable(self, probe, label, timeout, settle, accept=lambda value: True):
+        timeout = self.timeout if timeout is None else timeout
+        settle = self.settle if settle is None else settle
+        start = time.monotonic()
+        last_value, last_change = None, start
+        while True:
+            try:
+                value = probe()
+            except WebDriverException:
+                value = None
+            now = time.monotonic()
+            if value != last_value:
+                last_value, last_change = value, now
+            elif value is not None and accept(value) and now - last_change >= settle:
+                self._record(label, start, True)
+                return value
+            if now - start >= timeout:
+                self._record(label, start, False)
+                return last_value if last_value is not None and accept(last_value) else None
+            time.sleep(self.poll)
+
+
+    def for_element(self, by, selector, label, timeout=None):
+        """
+        Wait for an element to be present in the DOM
+        """
+        def find(driver):
+            elements = driver.find_elements(by, selector)
+            return elements[0] if elements else None
+        return self.until(find, label, timeout)
+
+
+    def for_count_stable(self, css_selector, label, above=0, timeout=None, settle=None):
+        """
+        Wait for the number of elements matching a selector to exceed a value and then stop changing
+
+        :param above: Count that must be exceeded (e.g. the count before scrolling)
+        :return: The stable count, or None if it never exceeded `above`
+        """
+        probe = lambda: self.driver.execute_script(
+            "return document.querySelectorAll(arguments[0]).length;", css_selector)
+        return self._stable(probe, label, timeout, settle, accept=lambda count: count > above)
+
+
+    def for_network_idle(self, label, timeout=None, settle=None):
+        """
+        Wait for the document to be loaded and for no new resource to be requested
+
+        Resources are counted by an observer installed on the page, as the resource timing buffer
+        stops growing once full (250 entries by default) while requests may still be in flight.
+        """
+        probe = lambda: self.driver.execute_script("""
+            if (document.readyState !== 'complete') { return null; }
+            if (window.__resourceCount === undefined) {
+                window.__resourceCount = performance.getEntriesByType('resource').length;
+                new PerformanceObserver(function (list) {
+                    window.__resourceCount += list.getEntries().length;
+                }).observe({type: 'resource'});
+            }
+            return window.__resourceCount;
+        """)
+        return self._stable(probe, label, timeout, settle) is not None
+
+
+    def total(self):
+        """
+        Return the cumulated duration of all waits, in seconds
+        """
+        return sum(elapsed for _, elapsed, _ in self.timings)
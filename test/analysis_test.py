@@ -0,0 +1,162 @@
+import asyncio
+import json
+import main
+import pytest
+import threading
+import time
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.analysis import AsyncGPT, RateLimits, build_prompt, parse_answer
+from src.utils.db import TransactionRolledBack
+
+ANSWER = ("[('Storytelling', 'mentioned', 'positive'), ('Acting performance', 'mentioned', 'very positive'), "
+          "('Cinematography and visual style', 'not mentioned', 'NA'), ('Music and sound design', 'not mentioned', 'NA'), "
+          "('Theme and values', 'mentioned', 'negative'), ('Overall', 'good despite minor flaws')]")
+
+
+def serve_openai(state):
+    """Local OpenAI-compatible server, refusing the first request with a 429 and counting the requests in flight"""
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            with lock:
+                state["requests"] += 1
+                refused = state["requests"] == 1
+                state["in_flight"] += 1
+                state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            time.sleep(0.05)
+            with lock:
+                state["in_flight"] -= 1
+
+            if refused:
+                body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}).encode()
+                self.send_response(429)
+                self.send_header("retry-after-ms", "50")
+            else:
+                body = json.dumps({"id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+                                   "choices": [{"index": 0, "finish_reason": "stop",
+                                                "message": {"role": "assistant", "content": ANSWER}}]}).encode()
+                self.send_response(200)
+                self.send_header("x-ratelimit-remaining-requests", "499")
+                self.send_header("x-ratelimit-reset-requests", "120ms")
+                self.send_header("x-ratelimit-remaining-tokens", "199000")
+                self.send_header("x-ratelimit-reset-tokens", "6m0s")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_reviews_are_analyzed_concurrently_within_limits():
+    state = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+    server = serve_openai(state)
+    reviews = [("tt0095765", f"rw{i}", f"author_{i}", "Title", "Text") for i in range(12)]
+
+    async def analyze():
+        async with AsyncGPT(max_concurrency=4, base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                            api_key="test", backoff=0.01, limits=limits) as analyzer:
+            return await analyzer.analyze(reviews, "tt0095765")
+
+    try:
+        limits = RateLimits()
+        results = asyncio.run(analyze())
+    finally:
+        server.shutdown()
+
+    # The request refused with a 429 is retried
+    assert results == [[1, 2, None, None, -1, 1]] * 12
+    assert state["requests"] == 13
+    assert 1 < state["max_in_flight"] <= 4
+    assert limits.remaining_tokens == 199000
+
+
+def test_broken_review_does_not_fail_the_batch():
+    state = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+    server = serve_openai(state)
+    reviews = [("tt0095765", f"rw{i}", f"author_{i}", "Title", "Text") for i in range(3)]
+    reviews.insert(1, ("tt0095765", "rw_broken", "author_broken", 1984, "Text"))
+
+    async def analyze():
+        async with AsyncGPT(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                            api_key="test", backoff=0.01, limits=RateLimits()) as analyzer:
+            return await analyzer.analyze(reviews, "tt0095765")
+
+    try:
+        results = asyncio.run(analyze())
+    finally:
+        server.shutdown()
+
+    assert results == [[1, 2, None, None, -1, 1], None, [1, 2, None, None, -1, 1], [1, 2, None, None, -1, 1]]
+    assert state["requests"] == 4  # The 3 valid reviews, one of them retried after the 429
+
+
+def test_rate_limits_hold_requests_until_reset():
+    limits = RateLimits()
+    limits.update({"x-ratelimit-remaining-requests": "1", "x-ratelimit-reset-requests": "1m",
+                   "x-ratelimit-remaining-tokens": "10000", "x-ratelimit-reset-tokens": "1.5s"})
+    assert limits.reserve(500) == 0
+    assert 59 < limits.reserve(500) <= 60
+    limits.update({"x-ratelimit-remaining-requests": "10", "x-ratelimit-reset-requests": "1m",
+                   "x-ratelimit-remaining-tokens": "100", "x-ratelimit-reset-tokens": "1.5s"})
+    assert 1 < limits.reserve(500) <= 1.5
+
+
+def test_answer_with_markup_is_parsed():
+    review = ("tt0095765", "rw1", "author_1", "Title", "Text")
+    assert parse_answer(f"```python\n{ANSWER}\n```", review, "tt0095765") == [1, 2, None, None, -1, 1]
+    assert parse_answer("I cannot answer", review, "tt0095765") is None
+
+
+def test_review_without_title_nor_text_gets_a_prompt():
+    assert build_prompt(("tt0095765", "rw1", "author_1", None, None)).endswith("Now the review:\n\n\n\n")
+    assert build_prompt(("tt0095765", "rw1", "author_1", "Title", None)).endswith("Now the review:\nTitle\n\n\n")
+
+
+def test_analysis_stops_when_the_results_cannot_be_saved(monkeypatch):
+    class Analyzer:
+        calls = 0
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+        async def analyze(self, reviews, movie_id):
+            Analyzer.calls += 1
+            return [[1, 2, None, None, -1, 1]] * len(reviews)
+
+    class Database:
+        claims = 0
+
+        def claim_reviews(self, worker, limit, lease, movie_id):
+            self.claims += 1
+            return [("tt0095765", "rw1", "author_1", "Title", "Text", *[None] * 6, "0" * 32)]
+
+        def update_sentiment_data(self, data, movie_id):
+            pass
+
+        def complete_reviews(self, worker, authors, text_hashes, movie_id):
+            pass
+
+        @contextmanager
+        def transaction(self):
+            yield self
+            raise TransactionRolledBack("A statement failed, the transaction was rolled back")
+
+    monkeypatch.setattr(main, "AsyncGPT", Analyzer)
+    db = Database()
+    with pytest.raises(TransactionRolledBack):
+        main.analyze_reviews("tt0095765", db, worker="worker-1")
+    # No more reviews are claimed nor sent to the API once a batch could not be saved
+    assert db.claims == 1 and Analyzer.calls == 1
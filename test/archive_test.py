@@ -0,0 +1,59 @@
+import os
+import time
+
+from src.benchmark import synthetic_reviews_page
+from src.scrapping import IMDbReplay
+from src.utils.archive import PageArchive
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_DIR, file_name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_pages_are_stored_once_per_content(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    html = read_fixture("title.html")
+    first = archive.store(html, "tt0095765", "title")
+    second = archive.store(html, "tt0095765", "title")
+    assert first == second
+
+    objects = [name for _, _, names in os.walk(tmp_path / "objects") for name in names]
+    assert len(objects) == 1
+    assert len(list(archive.entries("tt0095765"))) == 2
+    assert archive.load(archive.find("tt0095765", "title")) == html
+
+
+def test_find_returns_the_last_page_before_a_time(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.store(synthetic_reviews_page(3), "tt0095765", "reviews_listing")
+    between = time.time()
+    time.sleep(0.01)
+    archive.store(synthetic_reviews_page(5), "tt0095765", "reviews_listing")
+
+    assert "rw0000005" in archive.load(archive.find("tt0095765", "reviews_listing"))
+    assert "rw0000005" not in archive.load(archive.find("tt0095765", "reviews_listing", before=between))
+    assert archive.find("tt0033467", "reviews_listing") is None
+
+
+def test_replay_serves_archived_pages(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.store(read_fixture("title.html"), "tt0095765", "title")
+    archive.store(synthetic_reviews_page(30), "tt0095765", "reviews_listing")
+    # The count page, stored after the listing, must not be replayed as the listing
+    archive.store(read_fixture("reviews_count.html"), "tt0095765", "reviews_count")
+    archive.store(read_fixture("review_votes.html"), "tt0095765", "review", "rw0000011")
+
+    with IMDbReplay(archive) as scrapper:
+        assert scrapper.get_movie("tt0095765") == ("Cinema Paradiso", "February 23, 1990")
+        assert scrapper.get_number_of_reviews("tt0095765") == 1024
+        reviews_df = scrapper.get_reviews("tt0095765", 30)
+        assert len(reviews_df) == 30
+        new_reviews_df = scrapper.get_reviews("tt0095765", 30, known_ids=set(reviews_df["review_id"][:25]))
+        assert len(new_reviews_df) == 5
+        assert scrapper.get_votes("rw0000011", "tt0095765") == (2048, 17)
+        assert scrapper.get_spoiler("rw0000011", "tt0095765") == "Beautiful score by Morricone."
+        assert scrapper.get_votes("rw0000012", "tt0095765") is None
@@ -0,0 +1,151 @@
+import email
+import json
+import threading
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.analysis import BatchGPT
+from src.backfill import poll_batches, submit_backfill
+
+ANSWER = ("[('Storytelling', 'mentioned', 'positive'), ('Acting performance', 'not mentioned', 'NA'), "
+          "('Cinematography and visual style', 'not mentioned', 'NA'), ('Music and sound design', 'not mentioned', 'NA'), "
+          "('Theme and values', 'not mentioned', 'NA'), ('Overall', 'excellent')]")
+
+
+def serve_batch_api():
+    """Local stand-in for the files and batches endpoints, completing each batch at the first check"""
+    files, batches = {}, {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, payload, raw=False):
+            body = payload if raw else json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path == "/v1/files":
+                message = email.message_from_bytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+                content = next(part.get_payload(decode=True) for part in message.get_payload() if part.get_filename())
+                file_id = f"file-{len(files)}"
+                files[file_id] = content
+                self.reply({"id": file_id, "object": "file", "bytes": len(content), "created_at": 0,
+                            "filename": "requests.jsonl", "purpose": "batch", "status": "processed"})
+            elif self.path == "/v1/batches":
+                request = json.loads(body)
+                batch = {"id": f"batch-{len(batches)}", "object": "batch", "endpoint": request["endpoint"],
+                         "completion_window": request["completion_window"], "created_at": 0,
+                         "input_file_id": request["input_file_id"], "status": "validating"}
+                batches[batch["id"]] = batch
+                self.reply(batch)
+
+        def do_GET(self):
+            if self.path.startswith("/v1/batches/"):
+                batch = batches[self.path.rsplit("/", 1)[1]]
+                if batch["status"] == "validating":
+                    # Answer every request but the last one, which fails
+                    requests = [json.loads(line) for line in files[batch["input_file_id"]].splitlines()]
+                    outputs = [{"id": f"req-{i}", "custom_id": request["custom_id"], "error": None,
+                                "response": {"status_code": 200 if i < len(requests) - 1 else 500,
+                                             "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}}]}}}
+                               for i, request in enumerate(requests)]
+                    output_id = f"file-{len(files)}"
+                    files[output_id] = "\n".join(json.dumps(output) for output in outputs).encode()
+                    batch.update(status="completed", output_file_id=output_id)
+                self.reply(batch)
+            elif self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+                self.reply(files[self.path.split("/")[3]], raw=True)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeDatabase:
+    """In-memory stand-in for the claims and batches of PostgreSQLDatabase"""
+    def __init__(self, reviews):
+        self.reviews = {review[2]: review for review in reviews}
+        self.claims, self.batches, self.sentiments, self.completed = {}, {}, {}, []
+
+    def claim_reviews(self, worker, limit, lease, movie_id=None):
+        claimed = [review for author, review in self.reviews.items() if author not in self.claims][:limit]
+        self.claims.update((review[2], worker) for review in claimed)
+        return claimed
+
+    def claimed_reviews(self, worker):
+        return [self.reviews[author] for author, owner in self.claims.items() if owner == worker]
+
+    def release_reviews(self, worker):
+        released = [author for author, owner in self.claims.items() if owner == worker]
+        for author in released:
+            del self.claims[author]
+        return len(released)
+
+    def complete_reviews(self, worker, authors, text_hashes, movie_id):
+        for author in authors:
+            del self.claims[author]
+        self.completed += authors
+
+    def update_sentiment_data(self, data, movie_id):
+        self.sentiments.update((row[1], row[2:]) for row in data)
+
+    def record_batch(self, batch_id, worker, movie_id, nb_reviews, status):
+        self.batches[batch_id] = [worker, movie_id, status, False]
+
+    def pending_batches(self):
+        return [(batch_id, worker, movie_id, status) for batch_id, (worker, movie_id, status, ingested) in self.batches.items() if not ingested]
+
+    def update_batch(self, batch_id, status, output_file_id=None, ingested=False):
+        self.batches[batch_id][2:] = [status, ingested]
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+
+def test_backlog_is_analyzed_through_the_batch_api(tmp_path):
+    server = serve_batch_api()
+    try:
+        analyzer = BatchGPT(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test", directory=str(tmp_path))
+        reviews = [("tt0095765", f"rw{i}", f"author_{i}", "Title", "Text", *[None] * 6, f"{i:032d}") for i in range(3)]
+        db = FakeDatabase(reviews)
+
+        batch_id = submit_backfill(db, "tt0095765", analyzer)
+        assert batch_id is not None and len(db.claims) == 3
+        # Claimed reviews are not submitted twice
+        assert submit_backfill(db, "tt0095765", analyzer) is None
+
+        assert poll_batches(db, analyzer) == 1
+    finally:
+        server.shutdown()
+
+    # Two reviews analyzed; the review whose request failed is released, to be analyzed again
+    assert db.sentiments == {"author_0": (1, None, None, None, None, 2), "author_1": (1, None, None, None, None, 2)}
+    assert db.claims == {}
+    assert db.batches[batch_id][2:] == ["completed", True]
+    assert db.pending_batches() == []
+
+
+def test_reviews_without_text_are_not_submitted(tmp_path):
+    server = serve_batch_api()
+    try:
+        analyzer = BatchGPT(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test", directory=str(tmp_path))
+        reviews = [("tt0095765", f"rw{i}", f"author_{i}", None, "Text" if i else None, *[None] * 6, f"{i:032d}") for i in range(3)]
+        db = FakeDatabase(reviews)
+
+        batch_id = submit_backfill(db, "tt0095765", analyzer)
+    finally:
+        server.shutdown()
+
+    # The review without text is set aside, rather than failing the submission of the others
+    assert db.completed == ["author_0"]
+    assert sorted(db.claims) == ["author_1", "author_2"]
+    with open(tmp_path / f"{db.claims['author_1']}.jsonl") as f:
+        assert [json.loads(line)["custom_id"] for line in f] == ["author_1", "author_2"]
+    assert db.batches[batch_id][2] == "validating"
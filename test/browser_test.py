@@ -0,0 +1,44 @@
+from src.utils import browser
+from src.utils.browser import BrowserPool
+
+
+class FakeSession:
+    launched = 0
+
+    def __init__(self, blocking=None):
+        FakeSession.launched += 1
+        self.pages = 0
+        self.failed = False
+        self.closed = False
+
+    def is_alive(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_and_recycles_sessions(monkeypatch):
+    monkeypatch.setattr(browser, "BrowserSession", FakeSession)
+    FakeSession.launched = 0
+    pool = BrowserPool(size=1, max_pages=2)
+
+    # A healthy session is reused
+    session = pool.lease()
+    session.pages = 1
+    pool.release(session)
+    assert pool.lease() is session
+
+    # A worn out session is recycled
+    session.pages = 2
+    pool.release(session)
+    assert session.closed
+    session = pool.lease()
+    assert FakeSession.launched == 2
+
+    # A crashed session is recycled
+    session.failed = True
+    pool.release(session)
+    assert session.closed
+    pool.lease()
+    assert FakeSession.launched == 3
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from src.utils.checkpoint import Checkpoint
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = Checkpoint("tt0095765", directory=str(tmp_path))
+    assert checkpoint.load() == (None, None)
+
+    # Votes partially resolved, with mixed types
+    reviews_df = pd.DataFrame({"review_id": ["rw1", "rw2"], "upvotes": ["1.2K", 1234], "text": [None, "Great"]})
+    checkpoint.save({"deep_sweep": True, "streaming": False}, reviews_df)
+
+    state, loaded_df = checkpoint.load(max_age=3600)
+    assert state["deep_sweep"] is True and state["streaming"] is False
+    pd.testing.assert_frame_equal(loaded_df, reviews_df)
+
+    checkpoint.clear()
+    assert checkpoint.load() == (None, None)
+
+
+def test_outdated_checkpoint_is_discarded(tmp_path):
+    checkpoint = Checkpoint("tt0095765", directory=str(tmp_path))
+    checkpoint.save({"deep_sweep": True, "streaming": True, "cursor": 500})
+    assert checkpoint.load(max_age=3600)[0]["cursor"] == 500
+    assert checkpoint.load(max_age=-1) == (None, None)
+    assert checkpoint.load() == (None, None)
@@ -0,0 +1,58 @@
+import io
+import os
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from src.scrapping import download_cover
+
+
+def serve_cover(requests_log):
+    buffer = io.BytesIO()
+    Image.new("RGB", (600, 900), "darkred").save(buffer, "JPEG")
+    cover = buffer.getvalue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_log.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(cover)))
+            self.end_headers()
+            self.wfile.write(cover)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_unchanged_covers_are_not_downloaded_again(tmp_path):
+    requests_log = []
+    server = serve_cover(requests_log)
+    try:
+        cover_url = f"http://127.0.0.1:{server.server_address[1]}/cover_V1_.jpg"
+        assert download_cover("tt0095765", cover_url, directory=str(tmp_path))
+        assert os.path.isfile(tmp_path / "tt0095765.jpg")
+        with Image.open(tmp_path / "thumbs" / "tt0095765.jpg") as thumbnail:
+            assert thumbnail.size == (200, 300)
+
+        # Same URL: no request at all
+        assert not download_cover("tt0095765", cover_url, directory=str(tmp_path))
+        assert requests_log == [None]
+
+        # Same URL, once outdated: revalidated with the ETag
+        assert not download_cover("tt0095765", cover_url, directory=str(tmp_path), max_age=0)
+        assert requests_log == [None, '"v1"']
+
+        # New URL: downloaded again
+        assert download_cover("tt0095765", cover_url + "?v=2", directory=str(tmp_path))
+        assert requests_log == [None, '"v1"', None]
+    finally:
+        server.shutdown()
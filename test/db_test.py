@@ -0,0 +1,223 @@
+import pandas as pd
+import psycopg
+import pytest
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from src.utils.db import REVIEWS_RAW_COLUMNS, PostgreSQLDatabase, TransactionRolledBack, configure_pool, get_pool, pool_metrics
+
+
+class FakeCursor:
+    def __init__(self, fail_on=None, rows=None):
+        self.statements = []
+        self.fail_on = fail_on
+        self.rows = rows or []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        if self.fail_on and self.fail_on in str(query):
+            raise RuntimeError("statement failed")
+        self.statements.append(query)
+
+    def executemany(self, query, data):
+        self.execute(query)
+
+    def fetchone(self):
+        return (True,)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+        self.info = SimpleNamespace(transaction_status=psycopg.pq.TransactionStatus.IDLE)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def fake_database(fail_on=None):
+    db = PostgreSQLDatabase()
+    db.connection, db.cursor = FakeConnection(), FakeCursor(fail_on)
+    return db
+
+
+def test_statements_are_committed_individually_outside_transactions():
+    db = fake_database()
+    db.update_full_scrape("tt0095765", None)
+    db.release_reviews("worker-1")
+    assert db.connection.commits == 2
+    assert db.round_trips == 4
+
+
+def test_transaction_commits_once():
+    db = fake_database()
+    with db.transaction():
+        db.update_full_scrape("tt0095765", None)
+        db.release_reviews("worker-1")
+    assert db.connection.commits == 1
+    assert db.round_trips == 3
+
+
+def test_failed_statement_rolls_back_the_whole_transaction():
+    db = fake_database(fail_on="last_full_scrape")
+    with pytest.raises(TransactionRolledBack):
+        with db.transaction():
+            db.update_full_scrape("tt0095765", None)
+            db.release_reviews("worker-1")  # Not sent after the failure
+    assert db.connection.commits == 0
+    assert db.connection.rollbacks >= 1
+    assert db.cursor.statements == []
+
+    # The session can be used again afterwards
+    db.release_reviews("worker-1")
+    assert db.connection.commits == 1
+
+
+def test_exception_in_transaction_rolls_back():
+    db = fake_database()
+    with pytest.raises(ValueError):
+        with db.transaction():
+            db.release_reviews("worker-1")
+            raise ValueError()
+    assert db.connection.commits == 0
+    assert db.connection.rollbacks == 1
+
+
+def test_advisory_lock_is_released_after_failure():
+    db = fake_database()
+    with pytest.raises(ValueError):
+        with db.advisory_lock("tt0095765") as acquired:
+            assert acquired
+            with db.transaction():
+                raise ValueError()
+    assert "pg_advisory_unlock" in db.cursor.statements[-1]
+    assert not db._in_transaction and not db._transaction_failed
+
+
+class FakePool:
+    def __init__(self):
+        self.connection = FakeConnection()
+        self.connection.info = type("Info", (), {"transaction_status": "INTRANS"})()
+        self.returned = []
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, connection):
+        self.returned.append(connection)
+
+
+def test_pool_is_disabled_by_default():
+    configure_pool(max_size=0)
+    assert get_pool() is None
+    assert pool_metrics() is None
+
+
+def test_sessions_borrow_and_return_pooled_connections(monkeypatch):
+    pool = FakePool()
+    pool.connection.cursor = lambda: FakeCursor()
+    monkeypatch.setattr("src.utils.db.get_pool", lambda: pool)
+    with PostgreSQLDatabase() as db:
+        db.release_reviews("worker-1")
+    # Open transactions are rolled back before the connection is returned
+    assert pool.returned == [pool.connection]
+    assert pool.connection.rollbacks == 1
+
+
+class ReviewsCursor(FakeCursor):
+    """Cursor over an in-memory reviews_raw, merging the rows copied to reviews_staging as bulk_upsert_reviews does"""
+    def __init__(self):
+        super().__init__()
+        self.reviews, self.copied, self.result = {}, [], None
+
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        if "SELECT author, text_hash, votes_hash" in str(query):
+            self.rows = [(author, review["text_hash"], review["votes_hash"]) for author, review in self.reviews.items() if author in params[0]]
+        elif "INSERT INTO reviews_raw" in str(query):
+            inserted = updated = 0
+            for row in self.copied:
+                stored = self.reviews.get(row["author"])
+                if stored is None:
+                    self.reviews[row["author"]] = row
+                    inserted += 1
+                elif (stored["text_hash"], stored["votes_hash"]) != (row["text_hash"], row["votes_hash"]):
+                    to_process = 1 if stored["text_hash"] != row["text_hash"] else stored["to_process"]
+                    stored.update(row, to_process=to_process)
+                    updated += 1
+            self.result = (inserted, updated, len(self.copied))
+
+    def fetchone(self):
+        return self.result
+
+    @contextmanager
+    def copy(self, statement):
+        self.copied = []
+        yield SimpleNamespace(write_row=lambda row: self.copied.append(dict(zip(REVIEWS_RAW_COLUMNS + ["text_hash", "votes_hash"], row))))
+
+
+def reviews(*rows):
+    return pd.DataFrame([{"movie_id": "tt0095765", "review_id": f"rw{author[-1]}", "author": author, "title": "Title", "text": text,
+                          "rating": "8", "date": "Jan 5, 2024", "upvotes": upvotes, "downvotes": "1",
+                          "last_update": "20250411_124658", "to_process": 1} for author, text, upvotes in rows])
+
+
+def test_bulk_upsert_sends_only_new_and_changed_reviews():
+    db = fake_database()
+    db.cursor = ReviewsCursor()
+    assert db.bulk_upsert_reviews(reviews(("author_1", "Text", 3), ("author_2", "Text", 3), ("author_3", None, 3)), "tt0095765") == (3, 0, 0)
+    assert all(type(value) in (str, int, type(None)) for row in db.cursor.copied for value in row.values())
+    for review in db.cursor.reviews.values():
+        review["to_process"] = 0  # Analyzed
+
+    # Unchanged, new votes, edited text, new review
+    result = db.bulk_upsert_reviews(reviews(("author_1", "Text", 3), ("author_2", "Text", 2048), ("author_3", "Text", 3),
+                                            ("author_4", "Text", 3)), "tt0095765")
+    assert result == (1, 2, 1)
+    assert [row["author"] for row in db.cursor.copied] == ["author_2", "author_3", "author_4"]
+    assert {author: review["to_process"] for author, review in db.cursor.reviews.items()} == {
+        "author_1": 0, "author_2": 0, "author_3": 1, "author_4": 1}
+    assert db.cursor.reviews["author_2"]["upvotes"] == 2048
+
+
+def test_bulk_upsert_skips_the_merge_when_nothing_changed():
+    db = fake_database()
+    db.cursor = ReviewsCursor()
+    db.bulk_upsert_reviews(reviews(("author_1", "Text", 3)), "tt0095765")
+    statements = len(db.cursor.statements)
+    assert db.bulk_upsert_reviews(reviews(("author_1", "Text", 3)), "tt0095765") == (0, 0, 1)
+    assert len(db.cursor.statements) == statements + 1  # Only the fingerprints are read
+    assert not any("INSERT" in str(statement) for statement in db.cursor.statements[statements:])
+
+
+def test_fingerprints_separate_content_and_votes():
+    reviews_df = pd.DataFrame({
+        "author": ["author_1", "author_2", "author_3"], "title": ["Title", "Title", "Title"],
+        "text": ["Text", "Text", "Other text"], "upvotes": [3, 4, 3], "downvotes": [1, 1, 1]})
+    df = PostgreSQLDatabase.prepare_reviews(reviews_df)
+    assert df.loc[0, "text_hash"] == df.loc[1, "text_hash"] != df.loc[2, "text_hash"]
+    assert df.loc[0, "votes_hash"] == df.loc[2, "votes_hash"] != df.loc[1, "votes_hash"]
+    # Fingerprints do not depend on the run
+    assert df.loc[0, "text_hash"] == PostgreSQLDatabase.prepare_reviews(reviews_df.iloc[:1]).loc[0, "text_hash"]
+
+
+def test_claimed_reviews_are_leased_and_ordered():
+    db = fake_database()
+    old, new = pd.Timestamp("2024-01-01"), pd.Timestamp("2024-06-01")
+    db.cursor.rows = [("tt0095765", "rw2", "author_2", *[None] * 6, new, 1, "b" * 32),
+                      ("tt0095765", "rw1", "author_1", *[None] * 6, old, 1, "a" * 32)]
+    reviews = db.claim_reviews("worker", 10, 600, "tt0095765")
+    assert [review[2] for review in reviews] == ["author_1", "author_2"]
+    assert "FOR UPDATE SKIP LOCKED" in db.cursor.statements[-1]
+    assert db.connection.commits == 1
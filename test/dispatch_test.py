@@ -0,0 +1,60 @@
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.dispatch import Dispatcher, spread
+
+
+def test_spread_is_even_and_ordered():
+    offsets = spread(4, 100, jitter=0.5, rng=random.Random(0))
+    assert offsets == sorted(offsets)
+    for i, offset in enumerate(offsets):
+        assert i * 25 <= offset <= i * 25 + 12.5
+    assert spread(0, 100) == []
+    assert spread(3, -10) == [0, 0, 0]
+
+
+def test_dispatch_respects_concurrency():
+    running, peak, lock = set(), [0], threading.Lock()
+
+    def job(key):
+        with lock:
+            running.add(key)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(key)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        dispatcher = Dispatcher(lambda key: executor.submit(job, key), max_concurrent=2)
+        dispatcher.start()
+        assert dispatcher.plan(["a", "b", "c", "d", "e"], deadline=time.time() + 0.2) == 5
+        # Keys already queued are not queued twice
+        assert dispatcher.plan(["a", "f"], deadline=time.time() + 0.2) == 1
+
+        end = time.time() + 5
+        while (dispatcher.metrics()['dispatched'] < 6 or dispatcher.metrics()['running']) and time.time() < end:
+            time.sleep(0.01)
+        dispatcher.stop()
+
+    metrics = dispatcher.metrics()
+    assert peak[0] <= 2
+    assert metrics['dispatched'] == 6 and metrics['queued'] == 0 and metrics['running'] == 0
+    assert metrics['average_duration'] >= 0.05
+
+
+def test_paused_dispatcher_holds_jobs():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        dispatcher = Dispatcher(lambda key: executor.submit(time.sleep, 0), max_concurrent=2)
+        dispatcher.start()
+        with dispatcher.paused():
+            dispatcher.plan(["a"], deadline=time.time())
+            time.sleep(0.1)
+            metrics = dispatcher.metrics()
+            assert metrics['dispatched'] == 0 and metrics['queued'] == 1 and metrics['lag_seconds'] > 0
+        end = time.time() + 5
+        while dispatcher.metrics()['dispatched'] == 0 and time.time() < end:
+            time.sleep(0.01)
+        dispatcher.stop()
+    assert dispatcher.metrics()['max_lag_seconds'] >= 0.1
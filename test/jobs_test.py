@@ -0,0 +1,110 @@
+import main
+import pytest
+
+from src.utils.jobs import JOB_SKIP_DELAY, Heartbeat, LeaseLost
+from src.utils.ratelimit import SharedThrottle
+
+
+class FakeDatabase:
+    """In-memory stand-in for the job methods of PostgreSQLDatabase, recording the outcome of the job"""
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def claim_job(self, movie_id, worker, lease):
+        return 1
+
+    def complete_job(self, movie_id, worker):
+        self.calls.append(("complete",))
+
+    def fail_job(self, movie_id, worker, error_message, *args):
+        self.calls.append(("fail", error_message))
+
+    def requeue_job(self, movie_id, worker, delay, reason):
+        self.calls.append(("requeue", delay, reason))
+
+
+@pytest.fixture
+def run(monkeypatch, tmp_path):
+    """Run the job of a movie with the given stand-in for process_movie, returning the outcome recorded"""
+    calls = []
+    throttle = SharedThrottle("test", failure_threshold=1, cooldown=600, directory=str(tmp_path))
+    monkeypatch.setattr(main, "PostgreSQLDatabase", lambda: FakeDatabase(calls))
+    monkeypatch.setattr(main, "get_imdb_throttle", lambda: throttle)
+
+    def run(process_movie, circuit_open=False):
+        if circuit_open:
+            throttle.failure()
+        monkeypatch.setattr(main, "process_movie", process_movie)
+        assert main.run_job("tt0095765", worker="worker-1")
+        return calls
+    run.calls = calls
+    return run
+
+
+def test_completed_run_completes_the_job(run):
+    assert run(lambda movie_id, **kwargs: True) == [("complete",)]
+
+
+def test_jobs_leave_the_analysis_to_the_sentiment_workers(run):
+    runs = []
+    run(lambda movie_id, **kwargs: runs.append(kwargs["analyze"]) or True)
+    assert runs == [False]
+
+
+def test_run_skipped_while_imdb_is_paused_is_queued_until_it_resumes(run):
+    [(outcome, delay, reason)] = run(lambda movie_id, **kwargs: False, circuit_open=True)
+    assert outcome == "requeue" and 599 < delay <= 600
+    assert reason == "Run skipped: IMDb requests paused"
+
+
+def test_run_interrupted_by_paused_requests_is_queued_until_they_resume(run):
+    def process_movie(movie_id, **kwargs):
+        throttle = main.get_imdb_throttle()
+        throttle.failure()  # IMDb starts refusing requests during the run
+        throttle.acquire()
+
+    [(outcome, delay, reason)] = run(process_movie)
+    assert outcome == "requeue" and 599 < delay <= 600
+    assert reason == "Run skipped: IMDb requests paused"
+
+
+def test_run_skipped_while_the_movie_is_locked_is_queued_shortly(run):
+    assert run(lambda movie_id, **kwargs: False) == [("requeue", JOB_SKIP_DELAY, "Run skipped: Movie locked by another worker")]
+
+
+def test_run_is_aborted_once_the_lease_is_lost(run):
+    stages = []
+
+    def process_movie(movie_id, heartbeat, **kwargs):
+        for stage in ("metadata", "reviews", "reconciliation"):
+            heartbeat.check()
+            stages.append(stage)
+            heartbeat.lost = stage == "reviews"  # As set by the heartbeat thread
+        return True
+
+    # The job is left to the worker which reclaimed it
+    assert run(process_movie) == []
+    assert stages == ["metadata", "reviews"]
+
+
+def test_failed_run_consumes_an_attempt(run):
+    def process_movie(movie_id, **kwargs):
+        raise RuntimeError("Browser crashed")
+
+    with pytest.raises(RuntimeError):
+        run(process_movie)
+    assert run.calls == [("fail", "RuntimeError: Browser crashed")]
+
+
+def test_heartbeat_check_raises_once_the_lease_is_lost():
+    heartbeat = Heartbeat("tt0095765", "worker-1")
+    heartbeat.check()
+    heartbeat.lost = True
+    with pytest.raises(LeaseLost):
+        heartbeat.check()
@@ -0,0 +1,22 @@
+import pandas as pd
+
+from src.benchmark import synthetic_reviews_page
+from src.scrapping import REVIEW_COLUMNS, REVIEW_PARSERS, parse_reviews
+
+
+def test_backends_return_identical_reviews():
+    html = synthetic_reviews_page(80)
+    reference = parse_reviews(html, "tt0095765", backend="html.parser").drop(columns="last_update")
+    assert list(reference.columns) == [col for col in REVIEW_COLUMNS if col != "last_update"]
+    assert len(reference) == 80
+
+    # Spoilers, missing ratings and rounded votes are kept as such
+    assert pd.isna(reference.loc[6, "text"])
+    assert pd.isna(reference.loc[4, "rating"])
+    assert reference.loc[10, "upvotes"] == "3.1K"
+    assert reference.loc[0, "review_id"] == "rw0000001"
+    assert reference.loc[0, "text"] == "Paragraph 0 of review 1, with some words about the plot, the acting and the music.\nParagraph 1 of review 1, with some words about the plot, the acting and the music."
+
+    for backend in REVIEW_PARSERS:
+        reviews_df = parse_reviews(html, "tt0095765", backend=backend).drop(columns="last_update")
+        pd.testing.assert_frame_equal(reviews_df, reference)
@@ -0,0 +1,106 @@
+import main
+import pandas as pd
+import pytest
+
+
+class FakeDatabase:
+    """In-memory stand-in for the reviews and review gaps of PostgreSQLDatabase"""
+    def __init__(self, review_ids):
+        self.review_ids = list(review_ids)
+        self.texts = {}
+        self.gaps = []
+
+    def query_data(self, table, columns=None, condition=None, movie_id=None):
+        return [(review_id,) for review_id in self.review_ids]
+
+    def bulk_upsert_reviews(self, reviews_df, movie_id):
+        self.review_ids += list(reviews_df["review_id"])
+        self.texts.update(zip(reviews_df["review_id"], reviews_df["text"]))
+        return len(reviews_df), 0, 0
+
+    def record_review_gap(self, movie_id, missing, attempts, known_gap):
+        self.gaps.append((missing, attempts, known_gap))
+
+
+class FakeIMDb:
+    """Browser scraper listing the given reviews by batches of 2, until a review page is loaded in its tab"""
+    listed = []
+    texts = {}  # Text of the reviews hidden behind spoilers, empty in the listing
+
+    def __init__(self, pool=None, archive=None):
+        self.archive = archive
+        self.navigated = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_reviews(self, movie_id, total_reviews):
+        for first in range(0, len(self.listed), 2):
+            if self.navigated:
+                return
+            review_ids = self.listed[first:first + 2]
+            yield pd.DataFrame({"review_id": review_ids, "author": [f"author_{review_id}" for review_id in review_ids],
+                                "title": "Title", "text": [self.texts.get(review_id, "Text") for review_id in review_ids],
+                                "upvotes": "3", "downvotes": "1"}, dtype=object)
+
+    def get_spoiler(self, review_id, movie_id):
+        self.navigated = True
+        return f"Spoiler of {review_id}"
+
+    def get_votes(self, review_id, movie_id):
+        self.navigated = True
+        return 3, 1
+
+
+@pytest.fixture(autouse=True)
+def scraper(monkeypatch):
+    monkeypatch.setattr(main, "IMDb", FakeIMDb)
+    monkeypatch.setattr(main, "fetch_review_pages", lambda reviews_df, movie_id, archive=None: None)
+    FakeIMDb.listed = ["rw1", "rw2", "rw3", "rw4"]
+    FakeIMDb.texts = {}
+
+
+def test_missing_reviews_are_accepted_as_a_gap_after_3_attempts():
+    db = FakeDatabase(["rw1", "rw2", "rw3", "rw4"])
+    review_gap = None
+    for _ in range(main.MAX_RECONCILE_ATTEMPTS):
+        main.reconcile_reviews("tt0095765", db, 5, review_gap, deep_sweep=False)
+        review_gap = (None, *db.gaps[-1][1:])
+    assert db.gaps == [(1, 1, 0), (1, 2, 0), (1, 0, 1)]
+
+    # The known gap is no longer looked for
+    main.reconcile_reviews("tt0095765", db, 5, review_gap, deep_sweep=False)
+    assert len(db.gaps) == 3
+
+
+def test_missing_reviews_found_are_saved():
+    db = FakeDatabase(["rw1", "rw2"])
+    main.reconcile_reviews("tt0095765", db, 4, (2, 1, 0), deep_sweep=False)
+    assert db.review_ids == ["rw1", "rw2", "rw3", "rw4"]
+    assert db.gaps == [(0, 0, 0)]
+
+
+def test_deep_sweep_counts_an_attempt_without_listing_the_reviews_again():
+    FakeIMDb.listed = ["rw1", "rw2", "rw3"]
+    db = FakeDatabase(["rw1", "rw2"])
+    main.reconcile_reviews("tt0095765", db, 3, None, deep_sweep=True)
+    assert db.review_ids == ["rw1", "rw2"]
+    assert db.gaps == [(1, 1, 0)]
+
+
+def test_gap_shrinks_when_reviews_are_found_since():
+    db = FakeDatabase(["rw1", "rw2", "rw3"])
+    main.reconcile_reviews("tt0095765", db, 4, (2, 0, 2), deep_sweep=False)
+    assert db.gaps == [(1, 0, 1)]
+
+
+def test_missing_reviews_are_completed_with_the_browser_once_all_are_listed():
+    FakeIMDb.texts = {"rw2": ""}
+    db = FakeDatabase(["rw1"])
+    main.reconcile_reviews("tt0095765", db, 4, None, deep_sweep=False)
+    assert sorted(db.review_ids) == ["rw1", "rw2", "rw3", "rw4"]
+    assert db.texts["rw2"] == "Spoiler of rw2"
+    assert db.gaps == [(0, 0, 0)]
@@ -0,0 +1,84 @@
+import os
+import threading
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.scrapping import IMDbHTTP, ReviewPageFetcher, parse_review_page
+from src.utils.ratelimit import SharedThrottle
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+REVIEW_PAGES = {
+    "/review/rw0000001/": "review_spoiler.html",
+    "/review/rw0000002/": "review_votes.html",
+}
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_DIR, file_name), encoding="utf-8") as f:
+        return f.read()
+
+
+def serve_fixtures(requests_count):
+    """Starts a local stand-in for IMDb serving the fixture review pages."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_count[self.path] += 1
+            if self.path not in REVIEW_PAGES:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = read_fixture(REVIEW_PAGES[self.path]).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_parse_review_page():
+    assert parse_review_page(read_fixture("review_spoiler.html")) == (
+        "Salvatore comes back to Giancaldo.\nThe kisses reel made me cry.", 1234, 66)
+    assert parse_review_page(read_fixture("review_votes.html")) == ("Beautiful score by Morricone.", 2048, 17)
+
+
+def test_fetcher_resolves_each_review_once(tmp_path):
+    requests_count = Counter()
+    server = serve_fixtures(requests_count)
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        throttle = SharedThrottle("test", rate=50, burst=10, directory=str(tmp_path))
+        with ReviewPageFetcher(base_url=base_url, max_workers=3, throttle=throttle) as fetcher:
+            pages = fetcher.fetch(["rw0000001", "rw0000002", "rw0000001", "rw9999999"], "tt0095765")
+    finally:
+        server.shutdown()
+
+    assert pages["rw0000001"][1:] == (1234, 66)
+    assert pages["rw0000002"] == ("Beautiful score by Morricone.", 2048, 17)
+    assert pages["rw9999999"] is None
+    assert all(count == 1 for count in requests_count.values())
+
+
+def test_pages_are_not_fetched_while_requests_are_paused(tmp_path):
+    requests_count = Counter()
+    server = serve_fixtures(requests_count)
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        throttle = SharedThrottle("test", failure_threshold=1, cooldown=60, directory=str(tmp_path))
+        throttle.failure()
+        # The callers fall back to the browser, instead of being interrupted
+        with ReviewPageFetcher(base_url=base_url, throttle=throttle) as fetcher:
+            assert fetcher.fetch(["rw0000001", "rw0000002"], "tt0095765") == {"rw0000001": None, "rw0000002": None}
+        with IMDbHTTP(base_url=base_url, throttle=throttle) as fetcher:
+            assert fetcher.get_number_of_reviews("tt0095765") is None
+    finally:
+        server.shutdown()
+
+    assert not requests_count
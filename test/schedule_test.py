@@ -0,0 +1,28 @@
+from src.utils.schedule import MAX_DEEP_SWEEP_INTERVAL, MIN_DEEP_SWEEP_INTERVAL, deep_sweep_interval, estimate_rate, next_interval
+
+
+def test_interval_follows_review_rate():
+    # 5 reviews per day: about one new review expected every day
+    assert next_interval(5, min_interval=3600, max_interval=7 * 86400) == 86400
+    # A faster movie is scraped more often, within the bounds
+    assert next_interval(120, min_interval=3600, max_interval=7 * 86400) == 3600
+    assert next_interval(0.1, min_interval=3600, max_interval=7 * 86400) == 7 * 86400
+    assert next_interval(0, min_interval=3600, max_interval=7 * 86400) == 7 * 86400
+
+
+def test_priority_overrides_rate():
+    assert next_interval(0, priority=True, min_interval=3600, max_interval=7 * 86400) == 3600
+
+
+def test_rate_estimate():
+    # From the dates of the reviews only
+    assert estimate_rate(60) == 2
+    # A burst of new reviews declared by IMDb is caught before the dates reflect it
+    assert estimate_rate(60, previous_rate=2, new_reviews=100, elapsed_seconds=86400) > 2
+    # A smaller count (reviews removed) is not a negative rate
+    assert estimate_rate(0, new_reviews=-3, elapsed_seconds=3600) == 0
+
+
+def test_deep_sweep_interval_is_bounded():
+    assert deep_sweep_interval(3600) == MIN_DEEP_SWEEP_INTERVAL
+    assert deep_sweep_interval(7 * 86400) == MAX_DEEP_SWEEP_INTERVAL
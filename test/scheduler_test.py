@@ -0,0 +1,119 @@
+import main
+import os
+import pytest
+import scheduler
+import subprocess
+import sys
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from src.utils.dispatch import Dispatcher
+
+
+class FakeDatabase:
+    """Stand-in for the session of a run, recording the job failures"""
+    failures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    @contextmanager
+    def advisory_lock(self, key):
+        yield True
+
+    def fail_job(self, movie_id, worker, error_message, *args):
+        self.failures.append((movie_id, worker, error_message))
+
+
+def test_import_sets_nothing_up():
+    # Worker processes import the module, which must not configure logging nor create pools
+    code = ("import logging, scheduler; "
+            "assert not logging.getLogger('backend').handlers; "
+            "assert scheduler.worker is scheduler.executor is scheduler.sentiment_executor is scheduler.dispatcher is None")
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)), check=True)
+
+
+def test_scrape_workers_fit_in_memory(monkeypatch):
+    pages = {"SC_PAGE_SIZE": 4096, "SC_PHYS_PAGES": 4 * 2**30 // 4096}
+    monkeypatch.setattr(scheduler.os, "sysconf", pages.get)
+    assert scheduler.default_scrape_workers(3 * 2**29) == 2
+    assert scheduler.default_scrape_workers(2**20) == 5
+    assert scheduler.default_scrape_workers(8 * 2**30) == 1
+
+
+def test_worker_processes_are_reused_then_replaced(monkeypatch):
+    monkeypatch.setattr(scheduler, "max_concurrent_scripts", 1)
+    monkeypatch.setattr(scheduler, "movies_per_worker", 2)
+    try:
+        pids = [scheduler.get_executor().submit(os.getpid).result(timeout=60) for _ in range(3)]
+    finally:
+        scheduler.reset_executor()
+    assert pids[0] == pids[1] != pids[2] != os.getpid()
+
+
+def test_crashed_worker_replaces_the_pool_and_fails_the_job(monkeypatch):
+    class Pool:
+        shutdown_calls = 0
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shutdown_calls += 1
+
+    pool = Pool()
+    monkeypatch.setattr(scheduler, "executor", pool)
+    monkeypatch.setattr(scheduler, "worker", "worker-1")
+    monkeypatch.setattr(scheduler, "PostgreSQLDatabase", FakeDatabase)
+    FakeDatabase.failures = []
+    future = Future()
+    future.set_exception(BrokenProcessPool())
+
+    scheduler.movie_finished("tt0095765", future, pool)
+    assert pool.shutdown_calls == 1 and scheduler.executor is None
+    assert FakeDatabase.failures == [("tt0095765", "worker-1", "Worker process crashed")]
+
+    # A crash reported late, after the pool was replaced, leaves the new pool alone
+    new_pool = Pool()
+    scheduler.executor = new_pool
+    scheduler.movie_finished("tt0095765", future, pool)
+    assert new_pool.shutdown_calls == 0 and scheduler.executor is new_pool
+
+
+def test_pipeline_is_interrupted_after_its_time_budget(monkeypatch):
+    monkeypatch.setattr(main, "get_imdb_throttle", lambda: type("Throttle", (), {"is_open": lambda self: False})())
+    monkeypatch.setattr(main, "PostgreSQLDatabase", FakeDatabase)
+    monkeypatch.setattr(main, "scrape_movie", lambda *args: time.sleep(5))
+    start = time.time()
+    with pytest.raises(main.TimeBudgetExceeded):
+        main.process_movie("tt0095765", time_budget=1, analyze=False)
+    assert time.time() - start < 3
+
+
+def test_sentiment_analysis_runs_in_its_own_workers(monkeypatch):
+    analyzed = {}
+
+    def analyze_movie(movie_id):
+        analyzed[movie_id] = threading.current_thread().name
+        if movie_id == "tt0033467":
+            raise RuntimeError("API unavailable")
+
+    monkeypatch.setattr(scheduler, "analyze_movie", analyze_movie)
+    monkeypatch.setattr(scheduler, "sentiment_executor", ThreadPoolExecutor(max_workers=2, thread_name_prefix="sentiment"))
+    dispatcher = Dispatcher(scheduler.launch_sentiment, 2)
+    dispatcher.plan(["tt0095765", "tt0033467", "tt0111161"], deadline=time.time())
+    dispatcher.start()
+    try:
+        deadline = time.time() + 5
+        while (dispatcher.metrics()["dispatched"] < 3 or dispatcher.metrics()["running"]) and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        dispatcher.stop()
+        scheduler.sentiment_executor.shutdown()
+
+    # A failed movie does not stop the others
+    assert sorted(analyzed) == ["tt0033467", "tt0095765", "tt0111161"]
+    assert all(name.startswith("sentiment") for name in analyzed.values())
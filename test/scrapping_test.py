@@ -0,0 +1,182 @@
+import os
+
+import pandas as pd
+
+from datetime import date
+from src.scrapping import IMDb, keep_new_reviews, parse_movie, parse_number_of_reviews, parse_review_date
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_DIR, file_name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_parse_movie_from_markup():
+    movie_title, release_date, cover_url = parse_movie(read_fixture("title.html"))
+    assert movie_title == "Cinema Paradiso"
+    assert release_date == "February 23, 1990"
+    assert cover_url.startswith("https://m.media-amazon.com/images/")
+
+
+def test_parse_movie_from_embedded_json():
+    movie_title, release_date, cover_url = parse_movie(read_fixture("title_json.html"))
+    assert movie_title == "Cinema Paradiso"
+    assert release_date == "February 23, 1990"
+    assert cover_url.endswith("._V1_.jpg")
+
+
+def test_parse_number_of_reviews():
+    assert parse_number_of_reviews(read_fixture("reviews_count.html")) == 1024
+
+
+def test_parse_failures_return_none():
+    assert parse_movie(read_fixture("broken.html")) is None
+    assert parse_number_of_reviews(read_fixture("broken.html")) is None
+
+
+def test_parse_review_date():
+    assert parse_review_date("Jan 5, 2024") == date(2024, 1, 5)
+    assert parse_review_date(" Dec 31, 1999 ") == date(1999, 12, 31)
+    assert parse_review_date(None) is None
+    assert parse_review_date("yesterday") is None
+
+
+class FakeDriver:
+    """Driver whose page loads the given batches of reviews, one per scroll, then the last one behind the more button"""
+    def __init__(self, batches):
+        self.batches = batches
+        self.loaded = [batches.pop(0)]
+        self.clicks = 0
+
+    def execute_script(self, script, *args):
+        if "data-harvested" in script:
+            rows = [row for batch in self.loaded for row in batch]
+            self.loaded = []
+            return rows
+        if "click()" in script:
+            self.clicks += 1
+            self.loaded.append(self.batches.pop(0))
+        elif "scrollTo" in script and len(self.batches) > 1:
+            self.loaded.append(self.batches.pop(0))
+
+
+class FakeWaiter:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def for_count_stable(self, selector, description, timeout=None):
+        return len(self.driver.loaded) or None
+
+    def for_element(self, by, value, description, timeout=None):
+        return "more button" if self.driver.batches else None
+
+
+def harvest(batches, skip=0):
+    scrapper = IMDb(throttle=object())
+    scrapper.driver = FakeDriver(batches)
+    scrapper.waiter = FakeWaiter(scrapper.driver)
+    scrapper._open_reviews = lambda movie_id, total_reviews: False
+    return list(scrapper.iter_reviews("tt0095765", 25, skip=skip)), scrapper.driver
+
+
+def review_rows(first, count):
+    return [[f"rw{i:07d}", f"author_{i}", "Title", "Text", "8", "January 5, 2024", "3", "1"] for i in range(first, first + count)]
+
+
+def test_reviews_are_harvested_by_batches_while_scrolling():
+    batches, driver = harvest([review_rows(0, 25), review_rows(25, 25), review_rows(50, 10)])
+    assert [len(batch) for batch in batches] == [25, 25, 10]
+    assert list(batches[2]["review_id"]) == [f"rw{i:07d}" for i in range(50, 60)]
+    assert batches[0].loc[0, "movie_id"] == "tt0095765"
+    # The more button is clicked once, when scrolling loads nothing more
+    assert driver.clicks == 1
+
+
+def test_reviews_harvested_by_a_previous_run_are_skipped():
+    batches, _ = harvest([review_rows(0, 25), review_rows(25, 25), review_rows(50, 10)], skip=30)
+    assert [len(batch) for batch in batches] == [20, 10]
+    assert batches[0].loc[0, "review_id"] == "rw0000030"
+
+
+def listed_reviews(dates):
+    rows = [[f"rw{i:07d}", f"author_{i}", "Title", "Text", "8", review_date, "3", "1"] for i, review_date in enumerate(dates)]
+    return pd.DataFrame(rows, columns=["review_id", "author", "title", "text", "rating", "date", "upvotes", "downvotes"])
+
+
+def test_all_reviews_are_kept_when_nothing_is_known():
+    reviews_df = listed_reviews(["Jan 5, 2024", "Jan 4, 2024"])
+    assert keep_new_reviews(reviews_df, "tt0095765") is reviews_df
+
+
+def test_known_reviews_are_dropped():
+    reviews_df = listed_reviews(["Jan 5, 2024", "Jan 4, 2024", "Jan 3, 2024"])
+    kept = keep_new_reviews(reviews_df, "tt0095765", known_ids={"rw0000001"}, since=date(2024, 1, 5))
+    # Identifiers take precedence over the date
+    assert list(kept["review_id"]) == ["rw0000000", "rw0000002"]
+    assert list(kept.index) == [0, 1]
+
+
+def test_reviews_older_than_the_newest_stored_are_dropped():
+    reviews_df = listed_reviews(["Jan 5, 2024", "Jan 4, 2024", "yesterday", "Jan 3, 2024"])
+    kept = keep_new_reviews(reviews_df, "tt0095765", since=date(2024, 1, 4))
+    # Reviews whose date cannot be parsed are kept
+    assert list(kept["review_id"]) == ["rw0000000", "rw0000001", "rw0000002"]
+
+
+class ListingDriver:
+    """Driver whose reviews page displays the given pages of (review_id, date) pairs, one more per click"""
+    def __init__(self, pages):
+        self.pages = pages
+        self.loaded = pages.pop(0)
+        self.clicks = 0
+
+    def execute_script(self, script, *args):
+        if "click()" in script:
+            self.clicks += 1
+            self.loaded = self.loaded + self.pages.pop(0)
+        else:
+            return list(self.loaded)
+
+
+class ListingWaiter:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def for_element(self, by, value, description, timeout=None):
+        return "more button" if self.driver.pages else None
+
+    def for_count_stable(self, selector, description, timeout=None, above=0):
+        return len(self.driver.loaded) if len(self.driver.loaded) > above else None
+
+
+def load_until_known(pages, known_ids=(), since=None):
+    scrapper = IMDb(throttle=object())
+    scrapper.driver = ListingDriver(pages)
+    scrapper.waiter = ListingWaiter(scrapper.driver)
+    scrapper._load_until_known("tt0095765", set(known_ids), since)
+    return scrapper.driver
+
+
+def listing_page(first, count, review_date="Jan 5, 2024"):
+    return [(f"rw{i:07d}", review_date) for i in range(first, first + count)]
+
+
+def test_loading_stops_when_a_known_review_is_displayed():
+    driver = load_until_known([listing_page(0, 25), listing_page(25, 25), listing_page(50, 25)], known_ids={"rw0000030"})
+    assert driver.clicks == 1
+    assert len(driver.loaded) == 50
+
+
+def test_loading_stops_when_a_review_older_than_the_newest_stored_is_displayed():
+    pages = [listing_page(0, 25), listing_page(25, 24) + [("rw0000049", "Jan 3, 2024")], listing_page(50, 25)]
+    driver = load_until_known(pages, since=date(2024, 1, 4))
+    assert driver.clicks == 1
+
+
+def test_all_reviews_are_loaded_when_no_known_review_is_reached():
+    driver = load_until_known([listing_page(0, 25), listing_page(25, 25), listing_page(50, 10)], known_ids={"rw9999999"}, since=date(2023, 1, 1))
+    assert driver.clicks == 2
+    assert len(driver.loaded) == 60
@@ -0,0 +1,107 @@
+import main
+import pandas as pd
+import pytest
+
+from src.utils.checkpoint import Checkpoint
+
+
+COLUMNS = ["review_id", "author", "title", "text", "rating", "date", "upvotes", "downvotes"]
+
+
+class FakeDatabase:
+    """In-memory stand-in for the reviews of PostgreSQLDatabase"""
+    def __init__(self):
+        self.reviews = {}
+
+    def bulk_upsert_reviews(self, reviews_df, movie_id):
+        for row in reviews_df.itertuples():
+            self.reviews[row.review_id] = (row.text, row.upvotes, row.downvotes)
+        return len(reviews_df), 0, 0
+
+
+class FakeIMDb:
+    """Browser scraper harvesting the given batches, until a review page is loaded in its tab"""
+    def __init__(self, batches):
+        self.batches = batches
+        self.archive = None
+        self.navigated = False
+
+    def iter_reviews(self, movie_id, total_reviews, skip=0):
+        for batch in self.batches:
+            if self.navigated:
+                return
+            reviews_df = pd.DataFrame(batch, columns=COLUMNS, dtype=object)
+            skipped = min(skip, len(reviews_df))
+            skip -= skipped
+            if skipped < len(reviews_df):
+                yield reviews_df.iloc[skipped:].reset_index(drop=True)
+
+    def get_spoiler(self, review_id, movie_id):
+        self.navigated = True
+        return f"Spoiler of {review_id}"
+
+    def get_votes(self, review_id, movie_id):
+        self.navigated = True
+        return 1234, 56
+
+
+class FakeReviewPageFetcher:
+    """Review pages that can never be parsed"""
+    def __init__(self, archive=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def fetch(self, review_ids, movie_id):
+        return {}
+
+
+@pytest.fixture(autouse=True)
+def review_pages(monkeypatch):
+    monkeypatch.setattr(main, "ReviewPageFetcher", FakeReviewPageFetcher)
+
+
+def review_row(i, text="Text", upvotes="3"):
+    return [f"rw{i:07d}", f"author_{i}", "Title", text, "8", "January 5, 2024", upvotes, "1"]
+
+
+def test_browser_completes_reviews_once_the_harvest_is_over(tmp_path):
+    batches = [[review_row(0), review_row(1, text="")], [review_row(2, upvotes="1.2K"), review_row(3)], [review_row(4)]]
+    scrapper, db = FakeIMDb(batches), FakeDatabase()
+    checkpoint = Checkpoint("tt0095765", directory=str(tmp_path))
+    state = {"deep_sweep": True, "streaming": True, "cursor": 0}
+
+    main.stream_reviews(scrapper, "tt0095765", 5, db, checkpoint, state)
+    assert state["cursor"] == 5
+    assert sorted(db.reviews) == [f"rw{i:07d}" for i in range(5)]
+    assert db.reviews["rw0000001"] == ("Spoiler of rw0000001", 3, 1)
+    assert db.reviews["rw0000002"] == ("Text", 1234, 56)
+
+
+def test_reviews_set_aside_by_an_interrupted_run_are_completed(tmp_path):
+    scrapper, db = FakeIMDb([[review_row(0), review_row(1, text="")], [review_row(2)]]), FakeDatabase()
+    checkpoint = Checkpoint("tt0095765", directory=str(tmp_path))
+    checkpoint.save({"deep_sweep": True, "streaming": True, "cursor": 0})
+    state, _ = checkpoint.load()
+
+    # The run is interrupted after the first batch, with a review set aside
+    class Interrupted(Exception):
+        pass
+
+    class Heartbeat:
+        def check(self):
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        main.stream_reviews(scrapper, "tt0095765", 3, db, checkpoint, state, heartbeat=Heartbeat())
+    assert sorted(db.reviews) == ["rw0000000"]
+
+    state, unresolved_df = checkpoint.load()
+    assert state["cursor"] == 2 and list(unresolved_df["review_id"]) == ["rw0000001"]
+    main.stream_reviews(FakeIMDb(scrapper.batches), "tt0095765", 3, db, checkpoint, state, unresolved_df)
+    assert sorted(db.reviews) == ["rw0000000", "rw0000001", "rw0000002"]
+    assert db.reviews["rw0000001"][0] == "Spoiler of rw0000001"
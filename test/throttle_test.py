@@ -0,0 +1,52 @@
+import multiprocessing
+import pytest
+import time
+from src.utils.ratelimit import CircuitOpenError, SharedThrottle
+
+
+def acquire_many(directory, count, queue):
+    throttle = SharedThrottle("test", rate=20, burst=1, directory=directory)
+    for _ in range(count):
+        throttle.acquire()
+        queue.put(time.time())
+
+
+def test_rate_is_shared_across_processes(tmp_path):
+    queue = multiprocessing.get_context("spawn").Queue()
+    processes = [multiprocessing.get_context("spawn").Process(target=acquire_many, args=(str(tmp_path), 5, queue))
+                 for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+    timestamps = sorted(queue.get(timeout=5) for _ in range(10))
+    # 10 requests at 20 per second with a burst of 1 take at least 9 intervals of 50 ms
+    assert timestamps[-1] - timestamps[0] >= 0.4
+
+
+def test_circuit_opens_after_repeated_failures(tmp_path):
+    first = SharedThrottle("test", rate=100, failure_threshold=3, cooldown=60, directory=str(tmp_path))
+    second = SharedThrottle("test", rate=100, failure_threshold=3, cooldown=60, directory=str(tmp_path))
+    first.acquire()
+    first.failure()
+    second.failure()
+    assert not second.is_open()
+    first.failure()
+    assert second.is_open()
+    with pytest.raises(CircuitOpenError):
+        second.acquire()
+
+
+def test_old_failures_expire(tmp_path):
+    throttle = SharedThrottle("test", failure_threshold=2, failure_window=0.1, directory=str(tmp_path))
+    throttle.failure()
+    time.sleep(0.2)
+    throttle.failure()
+    assert not throttle.is_open()
+
+
+def test_time_left_before_requests_resume(tmp_path):
+    throttle = SharedThrottle("test", failure_threshold=1, cooldown=60, directory=str(tmp_path))
+    assert throttle.open_for() == 0
+    throttle.failure()
+    assert 59 < throttle.open_for() <= 60
@@ -0,0 +1,39 @@
+from src.utils.waits import AdaptiveWait
+
+
+class FakeDriver:
+    """Returns a growing number of elements until a cap is reached."""
+    def __init__(self, counts):
+        self.counts = iter(counts)
+        self.last = 0
+
+    def execute_script(self, script, *args):
+        self.last = next(self.counts, self.last)
+        return self.last
+
+
+def test_count_stable_returns_once_count_stops_changing():
+    waiter = AdaptiveWait(FakeDriver([5, 10, 15, 15]), timeout=2, settle=0.05, poll=0.01)
+    assert waiter.for_count_stable("article", "reviews", above=5) == 15
+    label, elapsed, success = waiter.timings[-1]
+    assert label == "reviews" and success and elapsed < 2
+
+
+def test_count_stable_times_out_without_new_elements():
+    waiter = AdaptiveWait(FakeDriver([25]), timeout=0.1, settle=0.01, poll=0.01)
+    assert waiter.for_count_stable("article", "reviews", above=25) is None
+    assert waiter.timings[-1][2] is False
+
+
+def test_until_returns_condition_value():
+    waiter = AdaptiveWait(FakeDriver([]), timeout=1, poll=0.01)
+    calls = iter([None, "", "spoiler"])
+    assert waiter.until(lambda driver: next(calls), "spoiler text") == "spoiler"
+    assert waiter.total() > 0
+
+
+def test_network_idle_counts_resources_beyond_the_timing_buffer():
+    driver = FakeDriver([None, 250, 260, 270, 270])
+    waiter = AdaptiveWait(driver, timeout=2, settle=0.05, poll=0.01)
+    assert waiter.for_network_idle("page") is True
+    assert driver.last == 270